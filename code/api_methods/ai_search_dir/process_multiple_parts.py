@@ -1,9 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from .process_single_part import process_part
-def process_parts(response, cwd, e01_path):
-    ret = []
-    for part in response.candidates[0].content.parts:
-        rpart = process_part(part, cwd, e01_path)
-        ret.append(rpart)
+from .result_shaping import TURN_RESULT_BUDGET_BYTES
+
+# Number of function calls of one model turn that are executed at the same time.
+TOOL_CALL_WORKERS = 4
+
+
+def process_parts(response, cwd, e01_path, evidence_id=None):
+    parts = list(response.candidates[0].content.parts)
+    # The results of one turn share TURN_RESULT_BUDGET_BYTES equally.
+    function_calls = sum(1 for part in parts if getattr(part, 'function_call', None))
+    result_budget = TURN_RESULT_BUDGET_BYTES // max(function_calls, 1)
+    # The calls of one turn are independent of each other, so they run
+    # concurrently; the results keep the order of the parts.
+    with ThreadPoolExecutor(max_workers=TOOL_CALL_WORKERS) as executor:
+        ret = list(executor.map(lambda part: process_part(part, cwd, e01_path, result_budget, evidence_id),
+                                   parts))
 
     ret_error = [x for x in ret if x and x.get("status") == "failed"]
     if len(ret_error) > 0:
@@ -1,28 +1,12 @@
-from ..get_usernames_and_rids import method_get_usernames_and_rids
-from ..get_volume_information import method_get_volume_information
-from ..check_partitions import method_get_partitions_with_windows
-from ..get_user_f_value_flags_with_rid import method_get_user_f_value_flags_with_rid
-from ..get_user_f_value_data_with_rid import method_get_user_f_value_data_with_rid
-from ..get_user_v_value_data_with_rid import method_get_user_v_value_data_with_rid
-from ..collect_user_emails import method_get_user_emails
-
-
-selected_tools = [
-    method_get_usernames_and_rids,
-    method_get_volume_information,
-    method_get_partitions_with_windows,
-    method_get_user_f_value_flags_with_rid,
-    method_get_user_f_value_data_with_rid,
-    method_get_user_v_value_data_with_rid,
-    method_get_user_emails
-]
-
-
 import google.generativeai as genai
 
+from .dep import selected_tools
+from .result_shaping import fit_result_to_budget
+from .tool_cache import tool_result_cache
+
 tool_map = {func.__name__: func for func in selected_tools}
 
-def process_part(part, cwd, e01_path):
+def process_part(part, cwd, e01_path, result_budget=None, evidence_id=None):
     if not hasattr(part, 'function_call') or not part.function_call:
         return {"type": "no_function_call", "text": part.text}
 
@@ -49,8 +33,13 @@ def process_part(part, cwd, e01_path):
         if 'e01_path' in func_to_call.__code__.co_varnames and 'e01_path' not in gemini_args:
             gemini_args['e01_path'] = e01_path
 
+        if 'evidence_id' in func_to_call.__code__.co_varnames:
+            gemini_args['evidence_id'] = evidence_id
+
         try:
-            result = func_to_call(**gemini_args)
+            result = tool_result_cache.get_or_call(e01_path, func_to_call, gemini_args)
+            if result_budget:
+                result = fit_result_to_budget(result, result_budget)
             ret = genai.protos.Part(
                 function_response=genai.protos.FunctionResponse(
                     name=function_name,
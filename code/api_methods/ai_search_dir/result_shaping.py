@@ -0,0 +1,225 @@
+import base64
+import json
+from pathlib import Path
+
+from ..common import get_e01_path
+from ..email_index import (
+    ensure_user_emails_indexed, get_indexed_email, get_indexed_emails_page, method_search_user_emails
+)
+from ..known_files import get_known_file_paths
+
+# Serialized size of all tool results sent back to the model in one turn;
+# about 24k tokens at four bytes per token.
+TURN_RESULT_BUDGET_BYTES = 96 * 1024
+
+# Default and largest number of email headers returned per page.
+EMAIL_PAGE_SIZE = 25
+MAX_EMAIL_PAGE_SIZE = 100
+
+# Characters of the body included as a preview with every email header.
+EMAIL_PREVIEW_CHARS = 200
+
+# Characters of an email body returned per call of method_read_user_email.
+EMAIL_BODY_CHUNK_CHARS = 8000
+
+HEADER_FIELDS = ("date", "from_addr", "to_addr", "subject", "source_path")
+
+
+def encode_continuation_token(state):
+    """Packs the position of the next page into an opaque token for the model to pass back."""
+    return base64.urlsafe_b64encode(json.dumps(state).encode("utf-8")).decode("ascii")
+
+
+def decode_continuation_token(token):
+    """Unpacks a continuation token into its positions.
+
+    Only non-negative integer positions are kept, so an empty, malformed or
+    garbled token, or one with a garbled position, starts from the beginning.
+    """
+    if not token or not isinstance(token, str):
+        return {}
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (ValueError, UnicodeError):
+        return {}
+    if not isinstance(state, dict):
+        return {}
+    return {key: value for key, value in state.items()
+            if isinstance(value, int) and not isinstance(value, bool) and value >= 0}
+
+
+def _get_page_size(page_size):
+    try:
+        return min(max(int(page_size), 1), MAX_EMAIL_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return EMAIL_PAGE_SIZE
+
+
+def _to_header(email):
+    header = {field: email.get(field) for field in HEADER_FIELDS}
+    body = email.get("body") or ""
+    header["body_preview"] = body[:EMAIL_PREVIEW_CHARS]
+    header["body_chars"] = len(body)
+    return header
+
+
+def _paged_result(emails, total, next_offset):
+    return {
+        "status": "passed",
+        "total": total,
+        "emails": [_to_header(email) for email in emails],
+        "continuation_token": encode_continuation_token({"offset": next_offset}) if next_offset < total else None,
+    }
+
+
+def method_list_user_email_headers(cwd="", username="", partition_id="", continuation_token="",
+                                   page_size=EMAIL_PAGE_SIZE, evidence_id=None):
+    """Lists one page of a user's emails as headers with a short body preview.
+
+    Returns the date, sender, recipients, subject, source path, the first
+    characters of the body and the body length of each email, in source path
+    order. Call method_read_user_email with a source_path to read a full body.
+
+    Args:
+        cwd (str): The current working directory of the main application.
+        username (str): The username of the target user profile.
+        partition_id (int or str): The identifier of the partition to search.
+        continuation_token (str): The token returned with the previous page;
+            empty for the first page.
+        page_size (int): The number of emails per page, at most 100.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
+
+    Returns:
+        dict: 'total' with the number of emails, 'emails' with the headers of
+              this page and 'continuation_token' for the next page, or None
+              after the last page.
+    """
+    if not Path(get_e01_path(cwd, evidence_id)).exists():
+        return {"status": "failed", "message": "E01 file not found."}
+    ensure_user_emails_indexed(cwd, username, partition_id, evidence_id)
+    offset = decode_continuation_token(continuation_token).get("offset", 0)
+    page = get_indexed_emails_page(cwd, username, partition_id, offset=offset, limit=_get_page_size(page_size),
+                                   evidence_id=evidence_id)
+    if page is None:
+        return {"status": "failed", "message": "The user's emails could not be indexed."}
+    return _paged_result(page["emails"], page["total"], page["next_offset"] or page["total"])
+
+
+def method_search_user_email_headers(cwd="", username="", partition_id="", query="", sender="", date_from="",
+                                     date_to="", continuation_token="", page_size=EMAIL_PAGE_SIZE, evidence_id=None):
+    """Searches a user's emails by keyword, sender and date range and returns headers.
+
+    Works like method_search_user_emails but returns each match as its
+    headers with a short body preview, one page at a time. Pass the same
+    search arguments together with the continuation_token to get the next
+    page, and call method_read_user_email to read a full body.
+
+    Args:
+        cwd (str): The current working directory of the main application.
+        username (str): The username of the target user profile.
+        partition_id (int or str): The identifier of the partition to search.
+        query (str): Words that must all appear in the subject, addresses or
+            body, e.g. "PGP trial software". Empty matches every email.
+        sender (str): Text the From address must contain, e.g. a name or domain.
+        date_from (str): Earliest date to include, as YYYY-MM-DD (UTC).
+        date_to (str): Latest date to include, as YYYY-MM-DD (UTC).
+        continuation_token (str): The token returned with the previous page;
+            empty for the first page.
+        page_size (int): The number of matches per page, at most 100.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
+
+    Returns:
+        dict: 'total' with the number of matching emails, 'emails' with the
+              headers of this page and 'continuation_token' for the next
+              page, or None after the last page.
+    """
+    offset = decode_continuation_token(continuation_token).get("offset", 0)
+    limit = _get_page_size(page_size)
+    found = method_search_user_emails(cwd, username, partition_id, query=query, sender=sender,
+                                      date_from=date_from, date_to=date_to, limit=limit, offset=offset,
+                                      evidence_id=evidence_id)
+    if found.get("status") != "passed":
+        return found
+    return _paged_result(found["emails"], found["total"], offset + limit)
+
+
+def method_read_user_email(cwd="", username="", partition_id="", source_path="", continuation_token="",
+                           evidence_id=None):
+    """Reads one email of a user, returning the body in chunks of 8000 characters.
+
+    Args:
+        cwd (str): The current working directory of the main application.
+        username (str): The username of the target user profile.
+        partition_id (int or str): The identifier of the partition to search.
+        source_path (str): The source_path of the email, as returned by the
+            email listing and search tools.
+        continuation_token (str): The token returned with the previous chunk
+            of the body; empty for the first chunk.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
+
+    Returns:
+        dict: The email's headers, 'body' with this chunk of the body,
+              'body_chars' with the full body length and 'continuation_token'
+              for the next chunk, or None once the body is complete.
+    """
+    if not Path(get_e01_path(cwd, evidence_id)).exists():
+        return {"status": "failed", "message": "E01 file not found."}
+    ensure_user_emails_indexed(cwd, username, partition_id, evidence_id)
+    email = get_indexed_email(cwd, username, partition_id, source_path, evidence_id)
+    if email is None or source_path in get_known_file_paths(cwd, partition_id, evidence_id):
+        return {"status": "failed", "message": f"No email of {username} at {source_path}."}
+
+    body = email["body"] or ""
+    body_offset = decode_continuation_token(continuation_token).get("body_offset", 0)
+    end = body_offset + EMAIL_BODY_CHUNK_CHARS
+    result = {field: email[field] for field in HEADER_FIELDS}
+    result.update({
+        "status": "passed",
+        "body": body[body_offset:end],
+        "body_chars": len(body),
+        "continuation_token": encode_continuation_token({"body_offset": end}) if end < len(body) else None,
+    })
+    return result
+
+
+def get_json_size(value):
+    return len(json.dumps(value, default=str).encode("utf-8"))
+
+
+def _shrink(value, max_string, max_items):
+    if isinstance(value, str) and len(value) > max_string:
+        return value[:max_string] + f"... [{len(value) - max_string} more characters]"
+    if isinstance(value, dict):
+        return {key: _shrink(item, max_string, max_items) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shrunk = [_shrink(item, max_string, max_items) for item in value[:max_items]]
+        if len(value) > max_items:
+            shrunk.append(f"... [{len(value) - max_items} more items]")
+        return shrunk
+    return value
+
+
+def fit_result_to_budget(result, max_bytes):
+    """Shrinks a tool result until its JSON encoding fits max_bytes.
+
+    Long strings are cut and long lists shortened, halving the limits until
+    the result fits, and the result is wrapped with a note telling the model
+    what was left out. Results that already fit are returned unchanged.
+    """
+    if get_json_size(result) <= max_bytes:
+        return result
+    max_string, max_items = 4096, 64
+    while True:
+        shaped = {
+            "truncated": True,
+            "message": "The result was too large and has been shortened. Use paging, continuation tokens or "
+                       "narrower arguments to retrieve the rest.",
+            "data": _shrink(result, max_string, max_items),
+        }
+        if get_json_size(shaped) <= max_bytes or (max_string <= 32 and max_items <= 1):
+            return shaped
+        max_string = max(max_string // 2, 32)
+        max_items = max(max_items // 2, 1)
@@ -0,0 +1,87 @@
+import copy
+import json
+import threading
+from collections import OrderedDict
+
+from ..common import get_derived_data_generation
+from ..evidence_session import get_evidence_session
+
+# Number of tool results kept in memory across agent turns and conversations.
+MAX_CACHED_TOOL_RESULTS = 256
+
+
+class ToolResultCache:
+    """Memoizes agent tool results per evidence image and argument set.
+
+    Keys combine the evidence hash of the image, the generation of derived
+    data (file hashes, email indexes), the tool name and its arguments, so a
+    result is never served for a different upload, nor once a hashing or
+    indexing job has changed what it would be. Concurrent calls with the same
+    key wait for the first one instead of computing the result again. Failed
+    and None results are not cached, and every caller gets its own copy.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_TOOL_RESULTS):
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return True, self._results[key]
+            return False, None
+
+    def get_or_call(self, e01_path, func, kwargs):
+        """Returns func(**kwargs), computing it only if it is not cached for the image."""
+        try:
+            evidence_hash = get_evidence_session(e01_path).get_evidence_hash()
+            key = (evidence_hash, get_derived_data_generation(), func.__name__,
+                   json.dumps(kwargs, sort_keys=True, default=str))
+        except (OSError, TypeError):
+            return func(**kwargs)
+
+        key_lock = self._get_key_lock(key)
+        try:
+            with key_lock:
+                found, result = self._lookup(key)
+                if found:
+                    return copy.deepcopy(result)
+                result = func(**kwargs)
+                with self._lock:
+                    self.misses += 1
+                    if result is not None and not (isinstance(result, dict) and result.get("status") == "failed"):
+                        self._results[key] = copy.deepcopy(result)
+                        while len(self._results) > self.max_entries:
+                            self._results.popitem(last=False)
+                return result
+        finally:
+            with self._lock:
+                if self._key_locks.get(key) is key_lock:
+                    del self._key_locks[key]
+
+    def clear(self):
+        """Forgets every cached result, e.g. when new evidence is uploaded."""
+        with self._lock:
+            self._results.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "cached_results": len(self._results)}
+
+
+tool_result_cache = ToolResultCache()
+
+
+def clear_caches():
+    """Forgets every cached agent tool result."""
+    tool_result_cache.clear()
@@ -1,10 +1,11 @@
 import google.generativeai as genai
 from ..common import get_gemini_api_key
+from ..metrics import llm_request_seconds, timed
 from .dep import selected_tools, sys_instruction
 from .process_multiple_parts import process_parts
 
 
-def method_run_gemini_interaction(cwd, user_prompt, e01_path):
+def method_run_gemini_interaction(cwd, user_prompt, e01_path, evidence_id=None):
     final_answer = ""
     try:
         genai.configure(api_key=get_gemini_api_key(cwd))
@@ -25,7 +26,8 @@ def method_run_gemini_interaction(cwd, user_prompt, e01_path):
     Please use the available tools to answer the user's query based on the provided file path context.
     """
 
-    response = chat.send_message(final_prompt)
+    with timed(llm_request_seconds, stage="llm", operation="agent_prompt"):
+        response = chat.send_message(final_prompt)
 
     max_turns = 10
     turn_count = 0
@@ -34,7 +36,7 @@ def method_run_gemini_interaction(cwd, user_prompt, e01_path):
         turn_count += 1
         print(f"\n--- Turn {turn_count} ---")
 
-        processed_response = process_parts(response, cwd, e01_path)
+        processed_response = process_parts(response, cwd, e01_path, evidence_id)
 
         if processed_response.get("status") == "failed":
             final_answer = processed_response.get("result", "An unspecified error occurred during tool execution.")
@@ -44,7 +46,8 @@ def method_run_gemini_interaction(cwd, user_prompt, e01_path):
             tool_results = processed_response["data"]
 
             print(f"--- Sending {len(tool_results)} tool result(s) back to Gemini... ---")
-            response = chat.send_message(tool_results)
+            with timed(llm_request_seconds, stage="llm", operation="agent_tool_results"):
+                response = chat.send_message(tool_results)
         else:
             print("--- Model has responded with final text. Exiting loop. ---")
             if processed_response["data"]:
@@ -1,44 +1,124 @@
-import dfvfs
-from dfvfs.lib import definitions
-from dfvfs.path import factory as path_spec_factory
-from dfvfs.resolver import resolver
-
-def build_fs_path_spec(e01_path, partition_id):
-    """Builds a dfvfs path specification for a partition within an E01 image."""
-    os_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_OS,
-        location=e01_path
-    )
-
-    ewf_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_EWF,
-        parent=os_path_spec
-    )
-
-    partition_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_TSK_PARTITION,
-        location=f"/p{partition_id}",
-        parent=ewf_path_spec
-    )
-
-    fs_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_TSK,
-        location="/",
-        parent=partition_path_spec
-    )
-
-    return fs_path_spec
-
-def method_get_partitions_with_windows(e01_path: str):
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .evidence_session import get_evidence_session
+
+# Paths whose presence marks a partition as holding a Windows installation.
+# "Documents and Settings" covers XP/2003, "Users" Vista and later, and the
+# registry hive directory catches system volumes with relocated profiles.
+WINDOWS_ARTIFACT_SIGNATURES = (
+    "Documents and Settings",
+    "Users",
+    "Windows/System32/config",
+)
+
+# Results are cached per evidence hash and signature set, so the dashboard and
+# the AI agent only scan each image once.
+_partition_cache = {}
+_partition_cache_lock = threading.Lock()
+
+
+def clear_caches():
+    """Forgets every cached partition scan."""
+    with _partition_cache_lock:
+        _partition_cache.clear()
+
+
+def _inspect_partition(session, partition_id, signatures):
+    """Returns the partition details when a signature matched, otherwise None; raises if it cannot be opened."""
+    with session.partition_lock(partition_id):
+        root_entry = session.get_file_entry(partition_id, "/")
+        names = [e.name for e in root_entry.sub_file_entries]
+        matched_signatures = []
+        for signature in signatures:
+            if "/" not in signature:
+                found = signature in names
+            else:
+                found = session.get_file_entry(partition_id, "/" + signature) is not None
+            if found:
+                matched_signatures.append(signature)
+
+    if not matched_signatures:
+        return None
+
+    print(f"Found Windows partition at /p{partition_id} ({', '.join(matched_signatures)})")
+    return {
+        "partition_id": partition_id,
+        "matched_signatures": matched_signatures,
+        "files_and_directories": names
+    }
+
+
+def _try_inspect_partition(session, partition_id, signatures):
+    """Returns (partition details or None, whether the partition could be inspected)."""
+    try:
+        return _inspect_partition(session, partition_id, signatures), True
+    except Exception as e:
+        print(f"[-] Partition /p{partition_id} could not be opened as a file system: {e}")
+        return None, False
+
+
+def detect_windows_artifacts(session, partition_id, signatures=WINDOWS_ARTIFACT_SIGNATURES):
+    """Checks one partition for the given Windows artifact paths.
+
+    Args:
+        session (EvidenceSession): The session of the image being scanned.
+        partition_id (int): The partition number to check.
+        signatures (iterable): Paths relative to the partition root.
+
+    Returns:
+        dict: The partition details when at least one signature matched,
+              otherwise None, also when the partition cannot be opened.
+    """
+    return _try_inspect_partition(session, partition_id, signatures)[0]
+
+
+def find_windows_partitions(e01_path, signatures=WINDOWS_ARTIFACT_SIGNATURES, max_workers=4):
+    """Enumerates the image's partitions once and checks them concurrently.
+
+    Args:
+        e01_path (str): The full, absolute path to the .E01 evidence file.
+        signatures (iterable): Artifact paths that identify a Windows partition.
+        max_workers (int): Number of partitions checked at the same time.
+
+    Returns:
+        list: One dictionary per matching partition, ordered by partition number.
+              The list is only cached when every partition could be opened,
+              so a transient read error does not hide partitions for good.
+    """
+    session = get_evidence_session(e01_path)
+    signatures = tuple(signatures)
+    cache_key = (session.get_evidence_hash(), signatures)
+    with _partition_cache_lock:
+        if cache_key in _partition_cache:
+            return _partition_cache[cache_key]
+
+    partition_ids = session.list_partition_ids()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(partition_ids) or 1))) as executor:
+        results = list(executor.map(
+            lambda pid: _try_inspect_partition(session, pid, signatures), partition_ids))
+
+    valid_partition_list = [result for result, _ in results if result]
+    if all(inspected for _, inspected in results):
+        with _partition_cache_lock:
+            _partition_cache[cache_key] = valid_partition_list
+    return valid_partition_list
+
+
+def method_get_partitions_with_windows(e01_path: str, signatures=None):
     """Scans an E01 image to identify partitions containing a Windows OS.
 
-    This function iterates through the first 9 potential partition slots of a
-    given E01 evidence file. For each valid partition, it mounts the root
-    directory and checks for the presence of a "Documents and Settings" folder,
-    a heuristic used to identify older Windows installations (e.g., XP/2003).
+    The partitions are enumerated through the TSK volume system, so every
+    allocated partition is considered regardless of its slot number. Each
+    partition is then checked concurrently for the presence of
+    WINDOWS_ARTIFACT_SIGNATURES ("Documents and Settings", "Users" or the
+    "Windows/System32/config" hive directory). Results are cached per
+    evidence hash, so repeated calls do not rescan the image.
 
     Args:
         e01_path (str): The full, absolute path to the .E01 evidence file.
+        signatures (list): Optional artifact paths replacing
+            WINDOWS_ARTIFACT_SIGNATURES for this scan.
 
     Returns:
         dict: A dictionary containing the status of the operation.
@@ -47,27 +127,12 @@ def method_get_partitions_with_windows(e01_path: str):
               each detailing a valid Windows partition found.
               On failure (no valid partitions found), the status is "failed".
     """
-    valid_partition_list = []
-    for pid in range(1, 10):
-        #print(f"\n[*] Checking partition /p{pid}")
-        try:
-            fs_path_spec = build_fs_path_spec(e01_path, pid)
-            # Using capitalized Resolver as confirmed in previous discussions
-            file_entry = resolver.Resolver.OpenFileEntry(fs_path_spec)
-            names = [e.name for e in file_entry.sub_file_entries]
-            #print(f"[+] /p{pid} contains: {names}")
-
-            if "Documents and Settings" in names:
-                print(f"Found Windows XP partition at /p{pid}")
-                partition_info = {
-                    "partition_id": pid,
-                    "files_and_directories": names
-                }
-                valid_partition_list.append(partition_info)
-
-        except Exception as e:
-            #print(f"[!] Partition /p{pid} not valid: {e}")
-            pass
+    try:
+        valid_partition_list = find_windows_partitions(e01_path,
+                                                       signatures=signatures or WINDOWS_ARTIFACT_SIGNATURES)
+    except Exception as e:
+        print(f"[-] Failed to enumerate partitions: {e}")
+        return {"status": "failed", "message": f"Failed to enumerate partitions: {e}"}
 
     if len(valid_partition_list) == 0:
         return {"status": "failed"}
@@ -76,3 +141,8 @@ def method_get_partitions_with_windows(e01_path: str):
             "status": "passed",
             "applicable_partitions": valid_partition_list
         }
+
+
+def method_test_partitions(e01_path, signatures=None):
+    """Backs /api/check_partitions; see method_get_partitions_with_windows."""
+    return method_get_partitions_with_windows(e01_path, signatures=signatures)
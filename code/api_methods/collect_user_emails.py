@@ -1,117 +1,137 @@
 import os
 import json
+import re
 from email import message_from_bytes
+from email.parser import BytesHeaderParser
+import threading
 import traceback
+from collections import OrderedDict
 from pathlib import Path
 
-from dfvfs.lib import definitions
-from dfvfs.path import factory as path_spec_factory
-from dfvfs.resolver import resolver
+from .common import bounded_ordered_map, get_e01_path
+from .evidence_session import get_evidence_session
+from .known_files import get_known_file_paths
+from .metrics import email_parse_seconds, timed
 
-def get_path_spec(e01_path, partition_id, directory_path):
-    """Creates a dfvfs path specification object for a given path."""
-    try:
-        resolved_e01_path = str(Path(e01_path).resolve())
-    except Exception as e:
-        print(f"[-] Could not resolve E01 path: {e01_path}. Error: {e}")
-        return None
-
-    os_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_OS, location=resolved_e01_path)
-
-    ewf_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_EWF, parent=os_path_spec)
-
-    partition_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_TSK_PARTITION,
-        location=f"/p{partition_id}",
-        parent=ewf_path_spec)
-
-    fs_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_TSK,
-        location=directory_path,
-        parent=partition_path_spec)
-
-    return fs_path_spec
-
-
-def read_file_contents(file_path_spec):
+def read_file_contents(session, partition_id, file_path):
     """
-    Reads the full raw byte content of a file given its path specification.
+    Reads the full raw byte content of a file inside a partition of the session's image.
     This function must return bytes for the email parser to work correctly.
     """
     try:
-        # Using capitalized Resolver as confirmed by user testing.
-        file_object = resolver.Resolver.OpenFileObject(file_path_spec)
-        return file_object.read()
+        return session.read_file(partition_id, file_path)
     except Exception as e:
-        print(f"[-] Error reading file {file_path_spec.location}: {e}")
+        print(f"[-] Error reading file {file_path}: {e}")
         return None
 
 
-def get_full_path_from_path_spec(path_spec):
-    """Reconstructs a full string path from a dfvfs path specification."""
-    path_elements = []
+# Emails are read and parsed on this many worker threads.
+EMAIL_WORKERS = 4
+
+# The header block of an email is read in pieces of this size until the blank
+# line ending it is found, and never beyond MAX_HEADER_BLOCK_SIZE.
+EMAIL_HEADER_READ_SIZE = 8 * 1024
+MAX_HEADER_BLOCK_SIZE = 256 * 1024
+
+_HEADER_END_PATTERN = re.compile(rb"\r?\n\r?\n")
 
-    current_spec = path_spec
-    while current_spec:
-        if hasattr(current_spec, "location") and current_spec.location:
-            path_elements.insert(0, current_spec.location)
-        current_spec = current_spec.parent
+MAIL_DIRECTORY_TEMPLATE = "/Users/{username}/AppData/Local/Microsoft/Windows Mail/Local Folders"
 
-    # This normalization logic might need adjustment based on the OS of the image
-    return os.path.normpath(os.path.join(*path_elements)).replace("C:", "").replace("\\","/")
+# Path listings of recently viewed mailboxes, so paging through a mailbox
+# walks its directory tree once instead of once per page.
+MAX_CACHED_PATH_LISTS = 16
+_path_list_cache = OrderedDict()
+_path_list_cache_lock = threading.Lock()
 
 
-eml_files = []
-def get_eml_files_in_directory(path_spec):
-    """Recursively finds all .eml files in a directory and its subdirectories."""
-    # Using capitalized Resolver as confirmed by user testing.
-    file_system = resolver.Resolver.OpenFileSystem(path_spec)
-    directory = file_system.GetFileEntryByPathSpec(path_spec)
-    if directory:
-        if hasattr(directory, "sub_file_entries"):
-            for entry in directory.sub_file_entries:
-                path = get_full_path_from_path_spec(entry.path_spec)
-                if entry.IsDirectory():
-                    get_eml_files_in_directory(entry.path_spec)
-                else:
-                    if entry.name.endswith(".eml"):
-                        eml_files.append(path)
+def clear_caches():
+    """Forgets every cached mailbox path listing."""
+    with _path_list_cache_lock:
+        _path_list_cache.clear()
 
 
-def method_get_user_email_paths(cwd="", username="", partition_id=""):
+def iter_eml_files_in_directory(session, partition_id, directory):
+    """Walks a directory tree iteratively and yields the paths of its .eml files.
+
+    Directory listings are read under the partition lock; the lock is released
+    between directories so readers of the same partition are not starved.
+    """
+    pending = [directory] if directory else []
+    while pending:
+        current = pending.pop()
+        with session.partition_lock(partition_id):
+            children = [(entry, entry.IsDirectory()) for entry in current.sub_file_entries]
+        for entry, is_directory in children:
+            if is_directory:
+                pending.append(entry)
+            elif entry.name.endswith(".eml"):
+                yield entry.path_spec.location
+
+
+def method_get_user_email_paths(cwd="", username="", partition_id="", exclude_known=True, evidence_id=None,
+                                raise_errors=False):
     """Scans a user's profile to find the paths of all .eml email files.
 
     This function targets the common location for Windows Mail artifacts within
-    a user's profile inside an E01 image. It performs a recursive search
-    to compile a comprehensive list of all .eml file paths.
+    a user's profile inside an E01 image. It walks the mail directory tree to
+    compile a comprehensive list of all .eml file paths. The list is sorted, so
+    offsets into it are stable cursors, and cached until the image changes.
+    Files in the known-good hash set are left out once the partition has been
+    hashed (see known_files).
 
     Args:
         cwd (str): The current working directory of the main application.
         username (str): The username of the target user profile.
         partition_id (int or str): The identifier of the partition to search.
+        exclude_known (bool): Leave out files in the known-good hash set.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
+        raise_errors (bool): Raise when the image or the mail directory
+            cannot be opened instead of returning an empty list, for callers
+            that must tell an empty mailbox from one that was not listed.
 
     Returns:
         list: A list of strings, where each string is the full path to a
               discovered .eml file within the evidence image.
     """
-    global eml_files
-    eml_files = []  # Reset the global list for each call
-    directory_to_list = f"/Users/{username}/AppData/Local/Microsoft/Windows Mail/Local Folders"
-    e01_file_path = str(Path(cwd) / "uploads" / "upload.E01")
+    directory_to_list = MAIL_DIRECTORY_TEMPLATE.format(username=username)
+    e01_file_path = get_e01_path(cwd, evidence_id)
     if not Path(e01_file_path).exists():
         print(f"[-] E01 file not found at expected path: {e01_file_path}")
+        if raise_errors:
+            raise FileNotFoundError(f"E01 file not found at {e01_file_path}")
         return []
 
-    dir_spec = get_path_spec(e01_file_path, partition_id, directory_to_list)
+    cache_key = (e01_file_path, str(partition_id), username)
+    mtime = os.stat(e01_file_path).st_mtime_ns
+    with _path_list_cache_lock:
+        cached = _path_list_cache.get(cache_key)
+        if cached and cached[0] == mtime:
+            _path_list_cache.move_to_end(cache_key)
+            return _filter_known_paths(cwd, partition_id, cached[1], exclude_known, evidence_id)
 
-    if not dir_spec:
-        print("[-] Failed to create path specification. Exiting.")
+    session = get_evidence_session(e01_file_path)
+    try:
+        directory = session.get_file_entry(partition_id, directory_to_list)
+    except Exception as e:
+        print(f"[-] Failed to open {directory_to_list}: {e}")
+        if raise_errors:
+            raise
         return []
 
-    get_eml_files_in_directory(dir_spec)
-    return eml_files
+    eml_files = sorted(iter_eml_files_in_directory(session, partition_id, directory))
+
+    with _path_list_cache_lock:
+        _path_list_cache[cache_key] = (mtime, eml_files)
+        _path_list_cache.move_to_end(cache_key)
+        while len(_path_list_cache) > MAX_CACHED_PATH_LISTS:
+            _path_list_cache.popitem(last=False)
+    return _filter_known_paths(cwd, partition_id, eml_files, exclude_known, evidence_id)
+
+
+def _filter_known_paths(cwd, partition_id, paths, exclude_known, evidence_id=None):
+    known_paths = get_known_file_paths(cwd, partition_id, evidence_id) if exclude_known else ()
+    return [path for path in paths if path not in known_paths]
 
 
 def parse_eml_file(email_data):
@@ -144,38 +164,197 @@ def parse_eml_file(email_data):
         return None
 
 
-def method_get_user_emails(cwd="", username="", partition_id=""):
-    """Retrieves and parses all emails for a user, returning structured data.
+def read_header_block(session, partition_id, file_path):
+    """
+    Reads the start of an email up to the blank line that ends its header block.
+    Small messages are read whole in the first piece; the body of larger ones,
+    attachments included, is never read.
+    """
+    data = bytearray()
+    try:
+        for chunk in session.iter_file_chunks(partition_id, file_path, EMAIL_HEADER_READ_SIZE):
+            # Look for the end only in the new bytes, plus 3 in case a CRLF CRLF is split across pieces.
+            search_start = max(len(data) - 3, 0)
+            data += chunk
+            header_end = _HEADER_END_PATTERN.search(data, search_start)
+            if header_end:
+                return bytes(data[:header_end.end()])
+            if len(data) >= MAX_HEADER_BLOCK_SIZE:
+                break
+    except Exception as e:
+        print(f"[-] Error reading file {file_path}: {e}")
+        return None
+    return bytes(data)
+
+
+def parse_eml_headers(header_data):
+    """
+    Parses the header block of an .eml file into the fields of parse_eml_file, without a body.
+    """
+    if not header_data:
+        return None
+
+    try:
+        msg = BytesHeaderParser().parsebytes(header_data)
+        return {
+            "date": msg.get('Date', 'No Date'),
+            "subject": msg.get('Subject', 'No Subject'),
+            "from_addr": msg.get('From', 'No Sender'),
+            "to_addr": msg.get('To', 'No Recipient'),
+        }
+    except Exception as e:
+        traceback.print_exc()
+        print(f"[-] Error parsing email headers: {e}")
+        return None
+
+
+def iter_user_emails(cwd="", username="", partition_id="", paths=None, max_workers=EMAIL_WORKERS, evidence_id=None):
+    """Reads and parses a user's emails on a bounded worker pool, yielding them in path order.
+
+    All workers share the session's file system handle for the partition, and
+    only a few emails are read ahead of the consumer, so the first results are
+    available right away and memory stays flat for large mailboxes.
+
+    Args:
+        cwd (str): The current working directory of the main application.
+        username (str): The username of the target user profile.
+        partition_id (int or str): The identifier of the partition to search.
+        paths (list): The email paths to read; all of the user's emails by default.
+        max_workers (int): The number of threads reading and parsing emails.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
+
+    Yields:
+        dict: A parsed email, including its metadata, body and source path.
+    """
+    if paths is None:
+        paths = method_get_user_email_paths(cwd, username, partition_id, evidence_id=evidence_id)
+    if not paths:
+        return
+    session = get_evidence_session(get_e01_path(cwd, evidence_id))
+
+    def load_email(path):
+        email_content = read_file_contents(session, partition_id, path)
+        if not email_content:
+            return None
+        with timed(email_parse_seconds, stage="email_parse"):
+            parsed_email = parse_eml_file(email_content)
+        if parsed_email:
+            parsed_email['source_path'] = path
+        return parsed_email
+
+    for parsed_email in bounded_ordered_map(load_email, paths, max_workers=max_workers):
+        if parsed_email:
+            yield parsed_email
+
+
+def iter_user_email_headers(cwd="", username="", partition_id="", paths=None, max_workers=EMAIL_WORKERS,
+                            evidence_id=None):
+    """Reads only the header blocks of a user's emails, yielding them in path order.
+
+    Works like iter_user_emails, but each record holds the date, subject,
+    sender, recipients and source path without a body. Listing a mailbox
+    therefore reads a few kilobytes per email however large its body and
+    attachments are; the source path is the handle to pass to
+    method_get_user_email_body for the full message.
+    """
+    if paths is None:
+        paths = method_get_user_email_paths(cwd, username, partition_id, evidence_id=evidence_id)
+    if not paths:
+        return
+    session = get_evidence_session(get_e01_path(cwd, evidence_id))
+
+    def load_headers(path):
+        header_data = read_header_block(session, partition_id, path)
+        if not header_data:
+            return None
+        with timed(email_parse_seconds, stage="email_parse"):
+            headers = parse_eml_headers(header_data)
+        if headers:
+            headers['source_path'] = path
+        return headers
+
+    for headers in bounded_ordered_map(load_headers, paths, max_workers=max_workers):
+        if headers:
+            yield headers
+
+
+def iter_user_emails_page(cwd="", username="", partition_id="", offset=0, limit=None, evidence_id=None,
+                          headers_only=False):
+    """Opens one page of a user's emails without reading them yet.
+
+    Works like method_get_user_emails_page, but 'emails' is a generator that
+    reads and parses each email as it is consumed, so a page can be streamed
+    to the client without holding it in memory.
+    """
+    paths = method_get_user_email_paths(cwd, username, partition_id, evidence_id=evidence_id)
+    offset = max(int(offset or 0), 0)
+    end = len(paths) if limit is None else min(offset + max(int(limit), 0), len(paths))
+    iter_emails = iter_user_email_headers if headers_only else iter_user_emails
+    return {
+        "emails": iter_emails(cwd, username, partition_id, paths=paths[offset:end], evidence_id=evidence_id),
+        "total": len(paths),
+        "next_offset": end if end < len(paths) else None,
+    }
+
+
+def method_get_user_emails_page(cwd="", username="", partition_id="", offset=0, limit=None, evidence_id=None,
+                                headers_only=False):
+    """Parses one page of a user's emails.
+
+    Offsets index the sorted list of email paths, so a page can be requested
+    without reading any of the emails before it. With headers_only, only the
+    header block of each email is read and the records have no body.
+
+    Returns:
+        dict: 'emails' with the parsed emails of the page, 'total' with the
+              number of email files found, and 'next_offset' with the offset
+              of the following page, or None after the last page.
+    """
+    page = iter_user_emails_page(cwd, username, partition_id, offset, limit, evidence_id, headers_only)
+    return dict(page, emails=list(page["emails"]))
+
+
+def method_get_user_emails(cwd="", username="", partition_id="", offset=0, limit=None, evidence_id=None):
+    """Retrieves and parses a user's emails, returning structured data.
 
     This function orchestrates the email collection process. It first calls
     method_get_user_email_paths() to discover all email file locations, then
-    iterates through each path, reads the raw file content from the E01 image,
-    and parses it into a structured dictionary.
+    reads the raw file contents from the E01 image and parses them into
+    structured dictionaries on a small pool of worker threads.
 
     Args:
         cwd (str): The current working directory of the main application.
         username (str): The username of the target user profile.
         partition_id (int or str): The identifier of the partition to search.
+        offset (int): The number of emails to skip, in path order.
+        limit (int): The maximum number of emails to return; all by default.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
 
     Returns:
         list: A list of dictionaries, where each dictionary represents a
               parsed email and includes its metadata, body, and source path.
     """
-    paths = method_get_user_email_paths(cwd, username, partition_id)
-    e01_file_path = str(Path(cwd) / "uploads" / "upload.E01")
-    parsed_emails = []
+    return method_get_user_emails_page(cwd, username, partition_id, offset, limit, evidence_id)["emails"]
 
-    for path in paths:
-        spec = get_path_spec(e01_file_path, partition_id, path)
-        email_content = read_file_contents(spec)
 
-        if email_content:
-            parsed_email = parse_eml_file(email_content)
-            if parsed_email:
-                parsed_email['source_path'] = path
-                parsed_emails.append(parsed_email)
+def method_get_user_email_body(cwd="", username="", partition_id="", source_path="", evidence_id=None):
+    """Reads and decodes the full message of one of a user's emails.
 
-    return parsed_emails
+    This is the second step after a header-only listing: the source path of
+    a listed email selects the message. Paths outside the user's mailbox are
+    refused, so only the user's .eml files can be read.
+
+    Returns:
+        dict: The parsed email with its body and source path, or None if the
+              path is not one of the user's emails or cannot be parsed.
+    """
+    if source_path not in method_get_user_email_paths(cwd, username, partition_id, exclude_known=False,
+                                                      evidence_id=evidence_id):
+        return None
+    return next(iter_user_emails(cwd, username, partition_id, paths=[source_path], max_workers=1,
+                                 evidence_id=evidence_id), None)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,10 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import threading
 from pathlib import Path
 import json
+import re
 
 def get_gemini_api_key(cwd):
     """Reads the Gemini API key from a local config.json file.
@@ -25,3 +30,151 @@ def get_gemini_api_key(cwd):
         print("[-] config.json not found. Please ensure it exists and contains your API key.")
         return "Unable to retrieve the Gemini API key."
 
+
+def get_config_value(cwd, key, default=None):
+    """Reads an optional setting from config.json, returning default if it is missing."""
+    try:
+        with open(Path(cwd) / "config.json", "r") as config_file:
+            return json.load(config_file).get(key, default)
+    except (FileNotFoundError, ValueError):
+        return default
+
+
+# Evidence IDs are generated as uuid4().hex; anything else is rejected so an
+# ID taken from a URL can never point outside the evidence store.
+EVIDENCE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def get_evidence_store_dir(cwd):
+    """Returns the directory holding one subdirectory per stored evidence image."""
+    return Path(cwd) / "uploads" / "evidence"
+
+
+def get_evidence_dir(cwd, evidence_id=None):
+    """Returns the directory holding an evidence image and everything derived from it.
+
+    Without an evidence ID this is the uploads directory itself, where the
+    single image of earlier versions was stored.
+
+    Raises:
+        ValueError: The evidence ID is not a valid ID.
+    """
+    if evidence_id is None:
+        return Path(cwd) / "uploads"
+    if not EVIDENCE_ID_PATTERN.match(str(evidence_id)):
+        raise ValueError(f"Invalid evidence ID: {evidence_id}")
+    return get_evidence_store_dir(cwd) / str(evidence_id)
+
+
+def get_e01_path(cwd, evidence_id=None):
+    """Returns the path of an uploaded evidence image for the application in cwd."""
+    return str(get_evidence_dir(cwd, evidence_id) / "upload.E01")
+
+
+def get_partition_dir(cwd, partition_id, evidence_id=None):
+    """Returns the directory where artifacts extracted from a partition are written."""
+    return get_evidence_dir(cwd, evidence_id) / "partitions" / str(partition_id)
+
+
+def get_extracted_file_path(cwd, partition_id, filepath, evidence_id=None):
+    """Returns where a file extracted from a partition is stored on disk."""
+    filename = filepath.split("/")[-1]
+    if filename == "SAM":
+        filename = "extracted_" + filename
+    return get_partition_dir(cwd, partition_id, evidence_id) / filename
+
+
+
+def get_email_index_path(cwd):
+    """Returns the path of the SQLite full-text index of parsed emails."""
+    return Path(cwd) / "uploads" / "email_index.sqlite3"
+
+
+def get_file_hash_db_path(cwd):
+    """Returns the path of the SQLite database holding partition file hashes."""
+    return Path(cwd) / "uploads" / "file_hashes.sqlite3"
+
+
+def get_attachment_store_dir(cwd):
+    """Returns the content-addressed directory holding email attachments, one file per SHA-256."""
+    return Path(cwd) / "uploads" / "attachments"
+
+
+def get_attachment_db_path(cwd):
+    """Returns the path of the SQLite database of email attachment metadata."""
+    return Path(cwd) / "uploads" / "attachments.sqlite3"
+
+
+def get_jobs_dir(cwd):
+    """Returns the directory holding the background job table and job results.
+
+    It lives outside uploads so a new upload does not discard finished jobs.
+    """
+    return Path(cwd) / "jobs"
+
+
+def get_summary_cache_dir(cwd):
+    """Returns the directory holding cached LLM summaries of email batches.
+
+    Entries are keyed by content, so like the jobs they are kept across uploads.
+    """
+    return Path(cwd) / "summary_cache"
+
+
+# Bumped whenever data derived from an image changes, e.g. a partition is
+# hashed or a mailbox indexed, so caches of results built on it can tell
+# that they are stale.
+_derived_data_generation = 0
+_derived_data_generation_lock = threading.Lock()
+
+
+def get_derived_data_generation():
+    """Returns the current generation of derived data; see bump_derived_data_generation."""
+    return _derived_data_generation
+
+
+def bump_derived_data_generation():
+    """Marks results computed from earlier file hashes or email indexes as stale."""
+    global _derived_data_generation
+    with _derived_data_generation_lock:
+        _derived_data_generation += 1
+
+
+def bounded_ordered_map(func, items, max_workers=4, max_in_flight=None):
+    """Applies func to items on a thread pool and yields the results in input order.
+
+    At most max_in_flight items (twice the worker count by default) are
+    submitted ahead of the consumer, so a consumer that stops early, e.g. once
+    a page of results is full, does not make the pool process the whole input.
+    """
+    max_in_flight = max_in_flight or max_workers * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for item in items:
+                # Workers run in a copy of the caller's context, so a job's
+                # progress reporting reaches them (see job_queue.run_in_context).
+                pending.append(executor.submit(contextvars.copy_context().run, func, item))
+                if len(pending) >= max_in_flight:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def iter_ndjson(records):
+    """Encodes records as newline-delimited JSON, yielding one line per record as it is produced.
+
+    Each record is sent as soon as it exists, so a client can render it while
+    the rest are still being read. The HTTP status has already gone out when
+    a record fails to be produced, so the error ends the stream as a final
+    {"status": "failed", "message": ...} line instead.
+    """
+    try:
+        for record in records:
+            yield (json.dumps(record, default=str) + "\n").encode("utf-8")
+    except Exception as e:
+        print(f"[-] Streaming stopped: {e}")
+        yield (json.dumps({"status": "failed", "message": str(e)}) + "\n").encode("utf-8")
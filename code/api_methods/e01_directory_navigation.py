@@ -2,59 +2,36 @@ import io
 import sys
 import traceback
 from email import message_from_bytes
-from pathlib import Path
 
-from dfvfs.lib import definitions
-from dfvfs.path import factory as path_spec_factory
-from dfvfs.resolver import resolver
+from .common import get_e01_path
+from .evidence_session import get_evidence_session
 
 
-def get_path_spec(e01_path, partition_id, file_path):
-    """Creates a dfvfs path specification object."""
-    os_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_OS, location=e01_path)
-
-    ewf_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_EWF, parent=os_path_spec)
-
-    partition_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_TSK_PARTITION,
-        location=f"/p{partition_id}",
-        parent=ewf_path_spec)
-
-    fs_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_TSK,
-        location=file_path,
-        parent=partition_path_spec)
-
-    return fs_path_spec
-
-
-def list_files_in_directory(directory_path_spec):
+def list_files_in_directory(session, partition_id, directory_path):
     """
-    Lists all files within a given directory path specification.
+    Lists all files within a given directory of a partition.
     Returns a list of filenames.
     """
     try:
-        file_object = resolver.Resolver.OpenFileObject(directory_path_spec)
-        filenames = []
-        for entry in file_object.entries:
-            # We only want to process files, not subdirectories
-            if entry.entry_type == definitions.FILE_ENTRY_TYPE_FILE:
-                filenames.append(entry.name)
-        return filenames
+        with session.partition_lock(partition_id):
+            directory = session.get_file_entry(partition_id, directory_path)
+            filenames = []
+            for entry in directory.sub_file_entries:
+                # We only want to process files, not subdirectories
+                if entry.IsFile():
+                    filenames.append(entry.name)
+            return filenames
     except Exception as e:
-        print(f"[-] Error listing directory {directory_path_spec.location}: {e}")
+        print(f"[-] Error listing directory {directory_path}: {e}")
         return []
 
 
-def read_file_contents(file_path_spec):
-    """Reads the full content of a file given its path specification."""
+def read_file_contents(session, partition_id, file_path):
+    """Reads the full content of a file inside a partition."""
     try:
-        file_object = resolver.Resolver.OpenFileObject(file_path_spec)
-        return file_object.read()
+        return session.read_file(partition_id, file_path)
     except Exception as e:
-        print(f"[-] Error reading file {file_path_spec.location}: {e}")
+        print(f"[-] Error reading file {file_path}: {e}")
         return None
 
 
@@ -68,14 +45,12 @@ def main_email_analysis_workflow(cwd, partition_id, username):
     # NOTE: This path is case-sensitive for dfvfs
     inbox_directory_path = f"/Users/{username}/AppData/Local/Microsoft/Windows Mail/Local Folders/Inbox"
 
-    e01_path = str(Path(cwd) / "uploads" / "upload.E01")
-
-    # 1. Get the path spec for the directory itself
-    directory_spec = get_path_spec(e01_path, partition_id, inbox_directory_path)
+    # 1. Reuse the opened image and file system for every read below
+    session = get_evidence_session(get_e01_path(cwd))
     print(f"[*] Attempting to list contents of: {inbox_directory_path}")
 
     # 2. List all the .eml files in the directory
-    email_filenames = list_files_in_directory(directory_spec)
+    email_filenames = list_files_in_directory(session, partition_id, inbox_directory_path)
 
     if not email_filenames:
         print("[-] No email files found in the directory or directory could not be accessed.")
@@ -90,10 +65,9 @@ def main_email_analysis_workflow(cwd, partition_id, username):
 
         # Construct the full path for the individual email file
         email_file_path = f"{inbox_directory_path}/{filename}"
-        email_file_spec = get_path_spec(e01_path, partition_id, email_file_path)
 
         # Read the raw .eml file content
-        email_data = read_file_contents(email_file_spec)
+        email_data = read_file_contents(session, partition_id, email_file_path)
 
         if email_data:
             # Parse the .eml file using Python's email library
@@ -0,0 +1,510 @@
+import binascii
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from email.header import decode_header, make_header
+from email.parser import BytesHeaderParser
+from pathlib import Path
+
+from .collect_user_emails import EMAIL_WORKERS, method_get_user_email_paths
+from .common import bounded_ordered_map, get_attachment_db_path, get_attachment_store_dir, get_e01_path
+from .email_index import get_mailbox_key
+from .evidence_intake import INTAKE_HASH_ALGORITHMS
+from .evidence_session import get_evidence_session
+from .job_queue import report_job_progress
+from .known_files import get_known_hash_set
+
+# Emails are read from the image in pieces of this size.
+EMAIL_READ_CHUNK_SIZE = 64 * 1024
+
+# A "line" without a line break is cut at this length, so a part with very
+# long lines does not have to fit in memory. Boundary lines are short, so
+# they are never cut.
+MAX_LINE_LENGTH = 64 * 1024
+
+# Attachment rows are written to the database in transactions of this many emails.
+ATTACHMENT_BATCH_SIZE = 200
+
+_SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+ATTACHMENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    md5 TEXT,
+    sha1 TEXT,
+    known INTEGER,
+    stored_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS email_attachments (
+    evidence_hash TEXT NOT NULL,
+    partition_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    source_path TEXT NOT NULL,
+    part_index INTEGER NOT NULL,
+    filename TEXT,
+    content_type TEXT,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (evidence_hash, partition_id, source_path, part_index)
+);
+CREATE INDEX IF NOT EXISTS email_attachments_mailbox ON email_attachments (evidence_hash, partition_id, username);
+CREATE INDEX IF NOT EXISTS email_attachments_sha256 ON email_attachments (sha256);
+CREATE TABLE IF NOT EXISTS attachment_mailboxes (
+    evidence_hash TEXT NOT NULL,
+    partition_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    email_count INTEGER NOT NULL,
+    extracted_at REAL NOT NULL,
+    PRIMARY KEY (evidence_hash, partition_id, username)
+);
+CREATE TABLE IF NOT EXISTS attachment_failures (
+    evidence_hash TEXT NOT NULL,
+    partition_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    source_path TEXT NOT NULL,
+    error TEXT NOT NULL,
+    PRIMARY KEY (evidence_hash, partition_id, source_path)
+);
+"""
+
+ATTACHMENT_COLUMNS = ("source_path", "part_index", "filename", "content_type", "size", "sha256")
+
+_extraction_locks = {}
+_extraction_locks_lock = threading.Lock()
+
+
+def connect_attachment_db(cwd):
+    """Opens the attachment database of the application in cwd, creating its schema on first use."""
+    db_path = get_attachment_db_path(cwd)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(str(db_path), timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(ATTACHMENT_SCHEMA)
+    return connection
+
+
+def get_blob_path(cwd, sha256):
+    """Returns where the attachment with a SHA-256 is stored, whether or not it exists."""
+    if not _SHA256_PATTERN.match(sha256 or ""):
+        raise ValueError(f"Invalid SHA-256: {sha256!r}")
+    return get_attachment_store_dir(cwd) / sha256[:2] / sha256
+
+
+def iter_lines(chunks):
+    """Splits a stream of byte chunks into lines that keep their line endings."""
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        start = 0
+        while True:
+            end = pending.find(b"\n", start)
+            if end < 0:
+                break
+            yield pending[start:end + 1]
+            start = end + 1
+        pending = pending[start:]
+        while len(pending) > MAX_LINE_LENGTH:
+            yield pending[:MAX_LINE_LENGTH]
+            pending = pending[MAX_LINE_LENGTH:]
+    if pending:
+        yield pending
+
+
+class _Base64Decoder:
+    def __init__(self):
+        self._pending = b""
+
+    def decode(self, data):
+        data = self._pending + b"".join(data.split())
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return self._decode(data[:usable])
+
+    def flush(self):
+        data, self._pending = self._pending, b""
+        return self._decode(data + b"=" * (-len(data) % 4)) if data else b""
+
+    @staticmethod
+    def _decode(data):
+        try:
+            return binascii.a2b_base64(data)
+        except binascii.Error:
+            return b""
+
+
+class _QuotedPrintableDecoder:
+    @staticmethod
+    def decode(data):
+        return binascii.a2b_qp(data)
+
+    @staticmethod
+    def flush():
+        return b""
+
+
+class _IdentityDecoder:
+    @staticmethod
+    def decode(data):
+        return data
+
+    @staticmethod
+    def flush():
+        return b""
+
+
+def _get_decoder(transfer_encoding):
+    transfer_encoding = (transfer_encoding or "").strip().lower()
+    if transfer_encoding == "base64":
+        return _Base64Decoder()
+    if transfer_encoding == "quoted-printable":
+        return _QuotedPrintableDecoder()
+    return _IdentityDecoder()
+
+
+def _decode_filename(part_headers):
+    filename = part_headers.get_filename()
+    if not filename:
+        return None
+    try:
+        return str(make_header(decode_header(filename)))
+    except Exception:
+        return filename
+
+
+def _is_attachment(part_headers):
+    disposition = (part_headers.get_content_disposition() or "").lower()
+    return disposition == "attachment" or bool(part_headers.get_filename())
+
+
+class _AttachmentWriter:
+    """Decodes one MIME part into a temporary file while hashing it, then moves it into the store.
+
+    The line ending before a boundary belongs to the boundary, so every line
+    is held back until the next one arrives and the last one is written
+    without its ending.
+    """
+
+    def __init__(self, store_dir, part_index, part_headers):
+        self.part_index = part_index
+        self.filename = _decode_filename(part_headers)
+        self.content_type = part_headers.get_content_type()
+        self._decoder = _get_decoder(part_headers.get("Content-Transfer-Encoding"))
+        self._hashers = {name: hashlib.new(name) for name in INTAKE_HASH_ALGORITHMS}
+        self._size = 0
+        self._held_line = None
+        tmp_dir = store_dir / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+        self._file = open(self._tmp_path, "wb")
+
+    def _write(self, data):
+        if data:
+            self._file.write(data)
+            for hasher in self._hashers.values():
+                hasher.update(data)
+            self._size += len(data)
+
+    def write_line(self, line):
+        if self._held_line is not None:
+            self._write(self._decoder.decode(self._held_line))
+        self._held_line = line
+
+    def finish(self, store_dir):
+        """Stores the decoded part under its SHA-256 and returns its metadata.
+
+        Returns:
+            dict: 'part_index', 'filename', 'content_type', 'size', the hashes
+                  and 'new', False when identical content was already stored.
+        """
+        if self._held_line is not None:
+            self._write(self._decoder.decode(self._held_line.rstrip(b"\r\n")))
+        self._write(self._decoder.flush())
+        self._file.close()
+
+        hashes = {name: hasher.hexdigest() for name, hasher in self._hashers.items()}
+        blob_path = store_dir / hashes["sha256"][:2] / hashes["sha256"]
+        is_new = not blob_path.exists()
+        if is_new:
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self._tmp_path, blob_path)
+        else:
+            self._tmp_path.unlink()
+        return {"part_index": self.part_index, "filename": self.filename, "content_type": self.content_type,
+                "size": self._size, "new": is_new, **hashes}
+
+    def abort(self):
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+def extract_attachments_from_lines(lines, store_dir):
+    """Streams the attachments of one MIME message into the content-addressed store.
+
+    The message is read line by line: multipart boundaries are tracked on a
+    stack, each part's header block is parsed on its own, and the body of an
+    attachment is decoded (base64, quoted-printable or as is) straight into a
+    temporary file that is then stored under its SHA-256. Only the current
+    line and the current part's headers are held in memory. Text bodies and
+    other parts without a file name or attachment disposition are skipped.
+
+    Args:
+        lines: The message as an iterable of lines with their line endings.
+        store_dir (Path): The root of the content-addressed store.
+
+    Returns:
+        list: The metadata of each attachment, see _AttachmentWriter.finish.
+    """
+    attachments = []
+    boundaries = []
+    header_lines = []
+    state = "headers"
+    writer = None
+    part_index = 0
+
+    def finish_part():
+        nonlocal writer
+        if writer is not None:
+            attachments.append(writer.finish(store_dir))
+            writer = None
+
+    try:
+        for line in lines:
+            if boundaries and line.startswith(b"--"):
+                delimiter = line.rstrip()
+                matched = next((boundary for boundary in reversed(boundaries)
+                                if delimiter in (b"--" + boundary, b"--" + boundary + b"--")), None)
+                if matched is not None:
+                    finish_part()
+                    del boundaries[boundaries.index(matched) + 1:]
+                    if delimiter.endswith(matched + b"--"):
+                        boundaries.pop()
+                        state = "skip"
+                    else:
+                        state = "headers"
+                        header_lines = []
+                    continue
+
+            if state == "headers":
+                if line.strip():
+                    header_lines.append(line)
+                    continue
+                part_headers = BytesHeaderParser().parsebytes(b"".join(header_lines))
+                boundary = part_headers.get_boundary()
+                if part_headers.get_content_maintype() == "multipart" and boundary:
+                    boundaries.append(boundary.encode("latin-1", errors="replace"))
+                    state = "skip"
+                else:
+                    part_index += 1
+                    state = "body"
+                    if _is_attachment(part_headers):
+                        writer = _AttachmentWriter(store_dir, part_index, part_headers)
+            elif state == "body" and writer is not None:
+                writer.write_line(line)
+        finish_part()
+    except Exception:
+        if writer is not None:
+            writer.abort()
+        raise
+    return attachments
+
+
+def extract_email_attachments(session, partition_id, source_path, store_dir):
+    """Streams the attachments of one .eml file in the image into the store."""
+    chunks = session.iter_file_chunks(partition_id, source_path, EMAIL_READ_CHUNK_SIZE)
+    return extract_attachments_from_lines(iter_lines(chunks), store_dir)
+
+
+def _get_extraction_lock(mailbox_key):
+    with _extraction_locks_lock:
+        return _extraction_locks.setdefault(mailbox_key, threading.Lock())
+
+
+def _store_attachment_rows(connection, mailbox_key, results, hash_set):
+    evidence_hash, partition_key, username = mailbox_key
+    with connection:
+        for source_path, attachments, error in results:
+            if error is not None:
+                connection.execute(
+                    "INSERT OR REPLACE INTO attachment_failures (evidence_hash, partition_id, username, source_path, "
+                    "error) VALUES (?, ?, ?, ?, ?)", mailbox_key + (source_path, error))
+                continue
+            for attachment in attachments:
+                known = None
+                if hash_set is not None:
+                    known = int(hash_set.contains({name: attachment[name] for name in INTAKE_HASH_ALGORITHMS}))
+                connection.execute(
+                    "INSERT OR IGNORE INTO blobs (sha256, size, md5, sha1, known, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (attachment["sha256"], attachment["size"], attachment["md5"], attachment["sha1"], known,
+                     time.time()))
+                connection.execute(
+                    "INSERT OR REPLACE INTO email_attachments (evidence_hash, partition_id, username, source_path, "
+                    "part_index, filename, content_type, size, sha256) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (evidence_hash, partition_key, username, source_path, attachment["part_index"],
+                     attachment["filename"], attachment["content_type"], attachment["size"], attachment["sha256"]))
+
+
+def method_extract_user_attachments(cwd="", username="", partition_id="", max_workers=EMAIL_WORKERS,
+                                    evidence_id=None):
+    """Extracts the attachments of all of a user's emails into the content-addressed store.
+
+    Every attachment is stored once under its SHA-256, however many emails,
+    mailboxes or images contain it, and each new file is checked against the
+    known-good hash set once. Per-email metadata (file name, content type,
+    size, SHA-256) goes into the attachment database. A mailbox is extracted
+    once per image; later calls only return the summary. Emails that cannot
+    be read are recorded with their error rather than counted as having no
+    attachments, and a mailbox whose emails cannot be listed is not marked
+    as extracted, so a later call tries again.
+
+    Args:
+        cwd (str): The current working directory of the main application.
+        username (str): The username of the target user profile.
+        partition_id (int or str): The identifier of the partition to search.
+        max_workers (int): The number of emails read at the same time.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
+
+    Returns:
+        dict: 'email_count', 'attachment_count', 'unique_count' (distinct
+              contents), 'stored_bytes' (size of those contents) and
+              'failed_count' (emails whose attachments could not be read).
+    """
+    e01_path = get_e01_path(cwd, evidence_id)
+    if not Path(e01_path).exists():
+        return {"status": "failed", "message": "E01 file not found."}
+    session = get_evidence_session(e01_path)
+    store_dir = get_attachment_store_dir(cwd)
+    mailbox_key = get_mailbox_key(cwd, username, partition_id, evidence_id)
+
+    with _get_extraction_lock(mailbox_key), closing(connect_attachment_db(cwd)) as connection:
+        if _get_extraction_summary(connection, mailbox_key) is None:
+            try:
+                paths = method_get_user_email_paths(cwd, username, partition_id, exclude_known=False,
+                                                    evidence_id=evidence_id, raise_errors=True)
+            except Exception as e:
+                return {"status": "failed", "message": f"Could not list the emails of {username}: {e}"}
+            hash_set = get_known_hash_set(cwd)
+
+            def extract(path):
+                try:
+                    return path, extract_email_attachments(session, partition_id, path, store_dir), None
+                except Exception as e:
+                    print(f"[-] Failed to extract the attachments of {path}: {e}")
+                    return path, [], str(e) or type(e).__name__
+
+            with connection:
+                connection.execute(
+                    "DELETE FROM attachment_failures WHERE evidence_hash = ? AND partition_id = ? AND username = ?",
+                    mailbox_key)
+            batch = []
+            for done, result in enumerate(bounded_ordered_map(extract, paths, max_workers=max_workers), 1):
+                batch.append(result)
+                if len(batch) >= ATTACHMENT_BATCH_SIZE:
+                    _store_attachment_rows(connection, mailbox_key, batch, hash_set)
+                    batch = []
+                    report_job_progress(done, len(paths), f"Extracting attachments of {username}")
+            _store_attachment_rows(connection, mailbox_key, batch, hash_set)
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO attachment_mailboxes (evidence_hash, partition_id, username, email_count, "
+                    "extracted_at) VALUES (?, ?, ?, ?, ?)", mailbox_key + (len(paths), time.time()))
+
+        summary = _get_extraction_summary(connection, mailbox_key)
+    return {"status": "passed", **summary}
+
+
+def _get_extraction_summary(connection, mailbox_key):
+    """Returns the extraction summary of a mailbox, or None if it has not been extracted."""
+    summary = connection.execute(
+        "SELECT m.email_count, COUNT(a.sha256) AS attachment_count, COUNT(DISTINCT a.sha256) AS unique_count "
+        "FROM attachment_mailboxes AS m LEFT JOIN email_attachments AS a ON a.evidence_hash = m.evidence_hash "
+        "AND a.partition_id = m.partition_id AND a.username = m.username "
+        "WHERE m.evidence_hash = ? AND m.partition_id = ? AND m.username = ? GROUP BY m.username",
+        mailbox_key).fetchone()
+    if summary is None:
+        return None
+    stored_bytes = connection.execute(
+        "SELECT COALESCE(SUM(size), 0) FROM blobs WHERE sha256 IN (SELECT sha256 FROM email_attachments "
+        "WHERE evidence_hash = ? AND partition_id = ? AND username = ?)", mailbox_key).fetchone()[0]
+    failed_count = connection.execute(
+        "SELECT COUNT(*) FROM attachment_failures WHERE evidence_hash = ? AND partition_id = ? AND username = ?",
+        mailbox_key).fetchone()[0]
+    return {
+        "email_count": summary["email_count"],
+        "attachment_count": summary["attachment_count"],
+        "unique_count": summary["unique_count"],
+        "stored_bytes": stored_bytes,
+        "failed_count": failed_count,
+    }
+
+
+def _not_extracted(username):
+    return {"status": "not_extracted",
+            "message": f"The attachments of {username} have not been extracted yet; extract them first."}
+
+
+def get_email_attachments(cwd, username, partition_id, source_path, evidence_id=None):
+    """Returns the attachment metadata of one email of an extracted mailbox.
+
+    The mailbox is never extracted here; until method_extract_user_attachments
+    has run for it, the status is "not_extracted".
+    """
+    mailbox_key = get_mailbox_key(cwd, username, partition_id, evidence_id)
+    with closing(connect_attachment_db(cwd)) as connection:
+        if _get_extraction_summary(connection, mailbox_key) is None:
+            return _not_extracted(username)
+        rows = connection.execute(
+            "SELECT a.*, b.known FROM email_attachments AS a JOIN blobs AS b ON b.sha256 = a.sha256 "
+            "WHERE a.evidence_hash = ? AND a.partition_id = ? AND a.username = ? AND a.source_path = ? "
+            "ORDER BY a.part_index",
+            mailbox_key + (source_path,)).fetchall()
+        failure = connection.execute(
+            "SELECT error FROM attachment_failures WHERE evidence_hash = ? AND partition_id = ? AND username = ? "
+            "AND source_path = ?", mailbox_key + (source_path,)).fetchone()
+    result = {"status": "passed", "attachments": [_row_to_attachment(row) for row in rows]}
+    if failure is not None:
+        result["error"] = failure["error"]
+    return result
+
+
+def get_user_attachments(cwd, username, partition_id, offset=0, limit=100, evidence_id=None):
+    """Lists the distinct attachments of an extracted mailbox with the number of emails carrying each.
+
+    The mailbox is never extracted here; until method_extract_user_attachments
+    has run for it, the status is "not_extracted".
+
+    Returns:
+        dict: 'total' distinct attachments and 'attachments', each with its
+              SHA-256, size, a file name and content type it was sent under,
+              'email_count' and 'known' (None if no hash set is configured).
+    """
+    mailbox_key = get_mailbox_key(cwd, username, partition_id, evidence_id)
+    with closing(connect_attachment_db(cwd)) as connection:
+        summary = _get_extraction_summary(connection, mailbox_key)
+        if summary is None:
+            return _not_extracted(username)
+        rows = connection.execute(
+            "SELECT a.sha256, b.size, MIN(a.filename) AS filename, MIN(a.content_type) AS content_type, "
+            "COUNT(DISTINCT a.source_path) AS email_count, b.known FROM email_attachments AS a "
+            "JOIN blobs AS b ON b.sha256 = a.sha256 "
+            "WHERE a.evidence_hash = ? AND a.partition_id = ? AND a.username = ? "
+            "GROUP BY a.sha256 ORDER BY email_count DESC, a.sha256 LIMIT ? OFFSET ?",
+            mailbox_key + (int(limit), max(int(offset), 0))).fetchall()
+    return {
+        "status": "passed",
+        "total": summary["unique_count"],
+        "attachments": [{key: row[key] for key in row.keys()} for row in rows],
+    }
+
+
+def _row_to_attachment(row):
+    attachment = {column: row[column] for column in ATTACHMENT_COLUMNS}
+    attachment["known"] = None if row["known"] is None else bool(row["known"])
+    return attachment
@@ -0,0 +1,365 @@
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from .collect_user_emails import MAIL_DIRECTORY_TEMPLATE, iter_user_emails, method_get_user_email_paths
+from .common import bump_derived_data_generation, get_e01_path, get_email_index_path
+from .evidence_session import get_evidence_session
+from .job_queue import get_job_queue, is_running_as_job, report_job_progress
+from .known_files import get_known_file_paths
+
+# Parsed emails are written to the index in transactions of this many rows.
+INDEX_BATCH_SIZE = 500
+
+EMAIL_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS emails (
+    id INTEGER PRIMARY KEY,
+    evidence_hash TEXT NOT NULL,
+    partition_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    source_path TEXT NOT NULL,
+    date TEXT,
+    date_utc TEXT,
+    subject TEXT,
+    from_addr TEXT,
+    to_addr TEXT,
+    body TEXT,
+    UNIQUE (evidence_hash, partition_id, source_path)
+);
+CREATE INDEX IF NOT EXISTS emails_mailbox ON emails (evidence_hash, partition_id, username, source_path);
+CREATE INDEX IF NOT EXISTS emails_date ON emails (evidence_hash, partition_id, username, date_utc);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+    subject, from_addr, to_addr, body,
+    content='emails', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS emails_ai AFTER INSERT ON emails BEGIN
+    INSERT INTO emails_fts (rowid, subject, from_addr, to_addr, body)
+    VALUES (new.id, new.subject, new.from_addr, new.to_addr, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS emails_ad AFTER DELETE ON emails BEGIN
+    INSERT INTO emails_fts (emails_fts, rowid, subject, from_addr, to_addr, body)
+    VALUES ('delete', old.id, old.subject, old.from_addr, old.to_addr, old.body);
+END;
+
+CREATE TABLE IF NOT EXISTS mailboxes (
+    evidence_hash TEXT NOT NULL,
+    partition_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    email_count INTEGER NOT NULL,
+    indexed_at REAL NOT NULL,
+    PRIMARY KEY (evidence_hash, partition_id, username)
+);
+"""
+
+EMAIL_COLUMNS = ("date", "subject", "body", "from_addr", "to_addr", "source_path")
+EMAIL_HEADER_COLUMNS = ("date", "subject", "from_addr", "to_addr", "source_path")
+
+# Leaves out emails that are known-good files; see _connect_excluding_known.
+KNOWN_PATH_FILTER = "{column} NOT IN (SELECT path FROM temp.known_paths)"
+
+_indexing_locks = {}
+_indexing_locks_lock = threading.Lock()
+
+# The job indexing each mailbox, so searches made while it runs share one job.
+_indexing_jobs = {}
+_indexing_jobs_lock = threading.Lock()
+
+
+def connect_email_index(cwd):
+    """Opens the email index of the application in cwd, creating its schema on first use."""
+    index_path = get_email_index_path(cwd)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(str(index_path), timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(EMAIL_INDEX_SCHEMA)
+    return connection
+
+
+def normalize_email_date(date):
+    """Converts an RFC 2822 Date header to an ISO 8601 UTC timestamp, or None if it cannot be parsed."""
+    try:
+        parsed = parsedate_to_datetime(date)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def build_fts_query(query):
+    """Turns free text into an FTS5 query matching every word, so punctuation is not read as FTS5 syntax."""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " ".join(f'"{term}"' for term in terms if term)
+
+
+def get_mailbox_key(cwd, username, partition_id, evidence_id=None):
+    """Returns the (evidence hash, partition ID, username) key of a user's mailbox in the email databases."""
+    session = get_evidence_session(get_e01_path(cwd, evidence_id))
+    return session.get_evidence_hash(), str(partition_id), username
+
+
+def _get_indexing_lock(mailbox_key):
+    with _indexing_locks_lock:
+        return _indexing_locks.setdefault(mailbox_key, threading.Lock())
+
+
+def is_mailbox_indexed(cwd, username, partition_id, evidence_id=None):
+    """Returns True if a user's mailbox on a partition has been fully indexed."""
+    if not Path(get_e01_path(cwd, evidence_id)).exists():
+        return False
+    with closing(connect_email_index(cwd)) as connection:
+        row = connection.execute(
+            "SELECT 1 FROM mailboxes WHERE evidence_hash = ? AND partition_id = ? AND username = ?",
+            get_mailbox_key(cwd, username, partition_id, evidence_id)).fetchone()
+    return row is not None
+
+
+def ensure_user_emails_indexed(cwd, username, partition_id, evidence_id=None):
+    """Parses a user's emails into the index unless they are already there.
+
+    The emails are read with the parallel pipeline of collect_user_emails and
+    written in batches. The mailbox is only recorded as indexed once every
+    email has been stored, so an interrupted run is resumed, skipping the rows
+    it already wrote, on the next call.
+
+    Returns:
+        int: The number of emails in the index for the mailbox.
+    """
+    if not Path(get_e01_path(cwd, evidence_id)).exists():
+        return 0
+    mailbox_key = get_mailbox_key(cwd, username, partition_id, evidence_id)
+    evidence_hash, partition_key, _ = mailbox_key
+
+    with _get_indexing_lock(mailbox_key):
+        connection = connect_email_index(cwd)
+        try:
+            row = connection.execute(
+                "SELECT email_count FROM mailboxes WHERE evidence_hash = ? AND partition_id = ? AND username = ?",
+                mailbox_key).fetchone()
+            if row is not None:
+                return row["email_count"]
+
+            # Known-good files are indexed too and left out when querying, so the
+            # index does not depend on whether the partition was hashed first.
+            paths = method_get_user_email_paths(cwd, username, partition_id, exclude_known=False,
+                                                evidence_id=evidence_id)
+            indexed_paths = {
+                row["source_path"] for row in connection.execute(
+                    "SELECT source_path FROM emails WHERE evidence_hash = ? AND partition_id = ? AND username = ?",
+                    mailbox_key)
+            }
+            remaining_paths = [path for path in paths if path not in indexed_paths]
+            print(f"[*] Indexing {len(remaining_paths)} of {len(paths)} emails of {username} on partition {partition_id}.")
+
+            batch = []
+            for done, email in enumerate(iter_user_emails(cwd, username, partition_id, paths=remaining_paths,
+                                                       evidence_id=evidence_id), 1):
+                batch.append((evidence_hash, partition_key, username, email["source_path"], email["date"],
+                              normalize_email_date(email["date"]), email["subject"], email["from_addr"],
+                              email["to_addr"], email["body"]))
+                if len(batch) >= INDEX_BATCH_SIZE:
+                    _insert_emails(connection, batch)
+                    batch = []
+                    report_job_progress(done, len(remaining_paths), f"Indexing emails of {username}")
+            if batch:
+                _insert_emails(connection, batch)
+
+            with connection:
+                email_count = connection.execute(
+                    "SELECT COUNT(*) FROM emails WHERE evidence_hash = ? AND partition_id = ? AND username = ?",
+                    mailbox_key).fetchone()[0]
+                connection.execute(
+                    "INSERT OR REPLACE INTO mailboxes (evidence_hash, partition_id, username, email_count, indexed_at) "
+                    "VALUES (?, ?, ?, ?, ?)", mailbox_key + (email_count, time.time()))
+            bump_derived_data_generation()
+            return email_count
+        finally:
+            connection.close()
+
+
+def submit_indexing_job(cwd, username, partition_id, evidence_id=None):
+    """Queues ensure_user_emails_indexed as a background job and returns the job's ID.
+
+    While a job for the same mailbox is queued or running, its ID is returned
+    instead of queuing another one.
+    """
+    job_queue = get_job_queue(cwd)
+    jobs_key = (str(cwd),) + get_mailbox_key(cwd, username, partition_id, evidence_id)
+    with _indexing_jobs_lock:
+        job_id = _indexing_jobs.get(jobs_key)
+        job = job_queue.get_job(job_id) if job_id else None
+        if job is None or job["status"] not in ("queued", "running"):
+            job_id = job_queue.submit("index_emails", ensure_user_emails_indexed, cwd=cwd, username=username,
+                                      partition_id=partition_id, evidence_id=evidence_id)
+            _indexing_jobs[jobs_key] = job_id
+    return job_id
+
+
+def _insert_emails(connection, rows):
+    with connection:
+        connection.executemany(
+            "INSERT OR IGNORE INTO emails (evidence_hash, partition_id, username, source_path, date, date_utc, "
+            "subject, from_addr, to_addr, body) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def _get_known_mailbox_paths(cwd, username, partition_id, evidence_id=None):
+    """Returns the paths of a user's emails that are in the known-good hash set."""
+    mail_directory = MAIL_DIRECTORY_TEMPLATE.format(username=username).upper()
+    return [path for path in get_known_file_paths(cwd, partition_id, evidence_id)
+            if path.upper().startswith(mail_directory)]
+
+
+def _connect_excluding_known(cwd, known_paths):
+    """Opens the index with the known-good paths in temp.known_paths, for KNOWN_PATH_FILTER."""
+    connection = connect_email_index(cwd)
+    connection.execute("CREATE TEMP TABLE known_paths (path TEXT PRIMARY KEY)")
+    connection.executemany("INSERT OR IGNORE INTO temp.known_paths (path) VALUES (?)",
+                           ((path,) for path in known_paths))
+    return connection
+
+
+def _row_to_email(row, columns=EMAIL_COLUMNS):
+    return {column: row[column] for column in columns}
+
+
+def _iter_indexed_emails(cwd, known_paths, query, parameters, columns):
+    # The connection is opened on the first row and closed with the generator,
+    # so rows are fetched as the consumer asks for them.
+    with closing(_connect_excluding_known(cwd, known_paths)) as connection:
+        for row in connection.execute(query, parameters):
+            yield _row_to_email(row, columns)
+
+
+def get_indexed_emails_page(cwd, username, partition_id, offset=0, limit=None, evidence_id=None,
+                            headers_only=False, stream=False):
+    """Returns a page of a user's emails from the index, in source path order.
+
+    With headers_only the bodies are not read from the index, as for
+    collect_user_emails.method_get_user_emails_page. With stream, 'emails' is
+    a generator reading the rows from the index as it is consumed. Known-good
+    files are left out of both the page and the total.
+
+    Returns:
+        dict: The same 'emails', 'total' and 'next_offset' keys as
+              collect_user_emails.method_get_user_emails_page, or None if the
+              mailbox has not been indexed yet.
+    """
+    if not is_mailbox_indexed(cwd, username, partition_id, evidence_id):
+        return None
+    mailbox_key = get_mailbox_key(cwd, username, partition_id, evidence_id)
+    known_paths = _get_known_mailbox_paths(cwd, username, partition_id, evidence_id)
+    where = ("evidence_hash = ? AND partition_id = ? AND username = ? AND "
+             + KNOWN_PATH_FILTER.format(column="source_path"))
+    offset = max(int(offset or 0), 0)
+    with closing(_connect_excluding_known(cwd, known_paths)) as connection:
+        total = connection.execute(f"SELECT COUNT(*) FROM emails WHERE {where}", mailbox_key).fetchone()[0]
+    end = total if limit is None else min(offset + max(int(limit), 0), total)
+    columns = EMAIL_HEADER_COLUMNS if headers_only else EMAIL_COLUMNS
+    emails = _iter_indexed_emails(
+        cwd, known_paths,
+        f"SELECT {', '.join(columns)} FROM emails WHERE {where} ORDER BY source_path LIMIT ? OFFSET ?",
+        mailbox_key + (-1 if limit is None else max(int(limit), 0), offset), columns)
+    return {
+        "emails": emails if stream else list(emails),
+        "total": total,
+        "next_offset": end if end < total else None,
+    }
+
+
+def get_indexed_email(cwd, username, partition_id, source_path, evidence_id=None):
+    """Returns one indexed email of a user by its source path, or None if it is not in the index."""
+    with closing(connect_email_index(cwd)) as connection:
+        row = connection.execute(
+            "SELECT * FROM emails WHERE evidence_hash = ? AND partition_id = ? AND username = ? AND source_path = ?",
+            get_mailbox_key(cwd, username, partition_id, evidence_id) + (source_path,)).fetchone()
+    return _row_to_email(row) if row is not None else None
+
+
+def method_search_user_emails(cwd="", username="", partition_id="", query="", sender="", date_from="", date_to="",
+                              limit=20, offset=0, evidence_id=None):
+    """Searches a user's emails by keyword, sender and date range.
+
+    The user's mailbox is parsed into a local full-text index the first time it
+    is searched; later searches are index lookups and do not read the image.
+    The indexing runs as a background job, and until it has finished searches
+    answer with the status "indexing" instead of results; when called from a
+    job, the mailbox is indexed right away. Prefer this over retrieving every
+    email when looking for emails about a topic, from a person or within a
+    period.
+
+    Args:
+        cwd (str): The current working directory of the main application.
+        username (str): The username of the target user profile.
+        partition_id (int or str): The identifier of the partition to search.
+        query (str): Words that must all appear in the subject, addresses or
+            body, e.g. "PGP trial software". Empty matches every email.
+        sender (str): Text the From address must contain, e.g. a name or domain.
+        date_from (str): Earliest date to include, as YYYY-MM-DD (UTC).
+        date_to (str): Latest date to include, as YYYY-MM-DD (UTC).
+        limit (int): The maximum number of emails to return.
+        offset (int): The number of matching emails to skip.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
+
+    Returns:
+        dict: A dictionary with the status of the operation, 'total' with the
+              number of matching emails and 'emails' with the returned matches,
+              each including its date, subject, body, sender, recipients and
+              source path. Keyword matches are ordered by relevance, the other
+              searches by date. While the mailbox is being indexed, the status
+              is "indexing" with the indexing job's 'job_id' and a message.
+    """
+    if not Path(get_e01_path(cwd, evidence_id)).exists():
+        return {"status": "failed", "message": "E01 file not found."}
+    if not is_running_as_job() and not is_mailbox_indexed(cwd, username, partition_id, evidence_id):
+        job_id = submit_indexing_job(cwd, username, partition_id, evidence_id)
+        return {
+            "status": "indexing",
+            "job_id": job_id,
+            "message": f"The emails of {username} are being indexed; search again once this has finished.",
+        }
+    ensure_user_emails_indexed(cwd, username, partition_id, evidence_id)
+
+    conditions = ["e.evidence_hash = ?", "e.partition_id = ?", "e.username = ?",
+                  KNOWN_PATH_FILTER.format(column="e.source_path")]
+    parameters = list(get_mailbox_key(cwd, username, partition_id, evidence_id))
+    source = "emails AS e"
+    order = "e.date_utc, e.source_path"
+
+    fts_query = build_fts_query(query or "")
+    if fts_query:
+        source = "emails_fts JOIN emails AS e ON e.id = emails_fts.rowid"
+        conditions.append("emails_fts MATCH ?")
+        parameters.append(fts_query)
+        order = "bm25(emails_fts), e.source_path"
+    if sender:
+        conditions.append("e.from_addr LIKE ?")
+        parameters.append(f"%{sender}%")
+    if date_from:
+        conditions.append("substr(e.date_utc, 1, 10) >= ?")
+        parameters.append(date_from)
+    if date_to:
+        conditions.append("substr(e.date_utc, 1, 10) <= ?")
+        parameters.append(date_to)
+
+    where = " AND ".join(conditions)
+    try:
+        known_paths = _get_known_mailbox_paths(cwd, username, partition_id, evidence_id)
+        with closing(_connect_excluding_known(cwd, known_paths)) as connection:
+            total = connection.execute(f"SELECT COUNT(*) FROM {source} WHERE {where}", parameters).fetchone()[0]
+            rows = connection.execute(
+                f"SELECT e.* FROM {source} WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                parameters + [int(limit), max(int(offset), 0)]).fetchall()
+    except sqlite3.Error as e:
+        print(f"[-] Email search failed: {e}")
+        return {"status": "failed", "message": f"Email search failed: {e}"}
+
+    return {"status": "passed", "total": total, "emails": [_row_to_email(row) for row in rows]}
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from .common import bounded_ordered_map
+from .job_queue import report_job_progress
+
+# Rough prompt size budget of one LLM request; emails are batched to fit it.
+SUMMARY_BATCH_TOKEN_BUDGET = 24000
+
+# Number of batch summaries requested from the LLM at the same time.
+SUMMARY_WORKERS = 4
+
+# Average characters per token used to estimate prompt sizes without a tokenizer.
+CHARS_PER_TOKEN = 4
+
+MAP_PROMPT = """
+You are a forensic analyst assistant. Your task is to summarize a collection of emails.
+Based on the following email data, provide a concise summary covering these points:
+1. **Key Correspondents:** Who are the main people the user is communicating with?
+2. **Main Topics of Discussion:** What are the primary subjects being discussed?
+3. **Potentially Suspicious Activity:** Are there any emails that seem unusual, out of place, or mention sensitive topics like passwords, confidential data, or illicit activities? Be specific but objective.
+
+Here is the email data:
+---
+{content}
+"""
+
+REDUCE_PROMPT = """
+You are a forensic analyst assistant. The following are summaries of consecutive batches of one user's emails.
+Combine them into a single concise summary with the same three sections:
+1. **Key Correspondents:** Who are the main people the user is communicating with?
+2. **Main Topics of Discussion:** What are the primary subjects being discussed?
+3. **Potentially Suspicious Activity:** Keep every specific suspicious item mentioned in the batch summaries.
+
+Here are the batch summaries:
+---
+{content}
+"""
+
+
+class StubSummaryModel:
+    """A local stand-in for the LLM that needs no network access or API key.
+
+    It answers every prompt with a short deterministic text, so the
+    summarization pipeline can be exercised in tests and benchmarks.
+    """
+
+    name = "stub"
+
+    def __init__(self):
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        return f"Stub summary {digest} of a {len(prompt):,} character prompt."
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def build_batches(texts, token_budget=SUMMARY_BATCH_TOKEN_BUDGET):
+    """Groups texts, in order, into batches whose estimated size fits token_budget.
+
+    A text larger than the budget on its own is truncated to fit it.
+    """
+    max_chars = token_budget * CHARS_PER_TOKEN
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for text in texts:
+        if len(text) > max_chars:
+            text = text[:max_chars - 20] + "\n[...truncated...]\n"
+        tokens = estimate_tokens(text)
+        if batch and batch_tokens + tokens > token_budget:
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class SummaryCache:
+    """LLM answers stored on disk under a hash of the model name and prompt.
+
+    Identical batches of emails therefore cost one request however many times
+    they are summarized, across reruns and restarts.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+
+    def _get_path(self, model_name, prompt):
+        digest = hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+        return self.cache_dir / digest[:2] / f"{digest}.json"
+
+    def get(self, model_name, prompt):
+        try:
+            return json.loads(self._get_path(model_name, prompt).read_text())["summary"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, model_name, prompt, summary):
+        path = self._get_path(model_name, prompt)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps({"model": model_name, "summary": summary}))
+        os.replace(tmp_path, path)
+
+
+def _generate_cached(model, cache, prompt):
+    summary = cache.get(model.name, prompt) if cache else None
+    if summary is None:
+        summary = model.generate(prompt)
+        if cache:
+            cache.put(model.name, prompt, summary)
+    return summary
+
+
+def _summarize_batches(model, cache, prompt_template, batches, max_workers, stage):
+    def summarize(batch):
+        return _generate_cached(model, cache, prompt_template.format(content="\n---\n".join(batch)))
+
+    summaries = []
+    for summary in bounded_ordered_map(summarize, batches, max_workers=max_workers, max_in_flight=max_workers):
+        summaries.append(summary)
+        report_job_progress(len(summaries), len(batches), f"{stage}: {len(summaries)} of {len(batches)} batches")
+    return summaries
+
+
+def map_reduce_summarize(texts, model, cache=None, token_budget=SUMMARY_BATCH_TOKEN_BUDGET,
+                         max_workers=SUMMARY_WORKERS):
+    """Summarizes any number of texts with a bounded number of concurrent LLM requests.
+
+    The texts are split into batches that fit token_budget and each batch is
+    summarized on its own (map). The batch summaries are then combined,
+    again in batches if they do not fit one prompt, until one summary is left
+    (reduce). Every request goes through the cache first.
+
+    Args:
+        texts (list): The texts to summarize, e.g. formatted emails.
+        model: An object with a 'name' attribute and a generate(prompt)
+            method returning the answer text.
+        cache (SummaryCache): Where answers are looked up and stored; None
+            disables caching.
+        token_budget (int): The estimated maximum size of one prompt.
+        max_workers (int): The number of requests in flight at the same time.
+
+    Returns:
+        str: The summary, or None if there were no texts.
+    """
+    batches = build_batches(texts, token_budget)
+    if not batches:
+        return None
+    summaries = _summarize_batches(model, cache, MAP_PROMPT, batches, max_workers, "Summarizing emails")
+    while len(summaries) > 1:
+        batches = build_batches(summaries, token_budget)
+        if len(batches) == len(summaries):
+            # Every summary needs a prompt of its own; pair them so the reduction still converges.
+            batches = [summaries[index:index + 2] for index in range(0, len(summaries), 2)]
+        summaries = _summarize_batches(model, cache, REDUCE_PROMPT, batches, max_workers, "Combining summaries")
+    return summaries[0]
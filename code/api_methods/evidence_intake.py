@@ -0,0 +1,173 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+# Large reads keep the per-chunk Python overhead negligible next to disk and
+# network time on 100+ GB images.
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+INTAKE_HASH_ALGORITHMS = ("md5", "sha1", "sha256")
+
+# Progress records of this many recent uploads are kept for polling clients.
+MAX_TRACKED_UPLOADS = 64
+
+
+class UploadProgress:
+    """Thread-safe progress record of one upload."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {"status": "idle"}
+
+    def start(self, filename, total_bytes=None):
+        with self._lock:
+            self._state = {
+                "status": "receiving",
+                "filename": filename,
+                "bytes_received": 0,
+                "total_bytes": total_bytes,
+                "started_at": time.time(),
+                "finished_at": None,
+            }
+
+    def update(self, bytes_received):
+        with self._lock:
+            self._state["bytes_received"] = bytes_received
+
+    def finish(self, status):
+        with self._lock:
+            self._state["status"] = status
+            self._state["finished_at"] = time.time()
+
+    def snapshot(self):
+        """Returns the current progress including percentage and throughput."""
+        with self._lock:
+            state = dict(self._state)
+        if state["status"] == "idle":
+            return state
+
+        end_time = state["finished_at"] or time.time()
+        elapsed = max(end_time - state["started_at"], 1e-6)
+        state["elapsed_seconds"] = round(elapsed, 2)
+        state["throughput_MBps"] = round(state["bytes_received"] / elapsed / (1024 ** 2), 2)
+        if state["total_bytes"]:
+            state["percent"] = round(100 * state["bytes_received"] / state["total_bytes"], 2)
+        return state
+
+
+_upload_progress = OrderedDict()
+_upload_progress_lock = threading.Lock()
+
+
+def get_upload_progress(evidence_id):
+    """Returns the progress record of an evidence image's upload, creating it on first use.
+
+    Each upload has its own record, so concurrent uploads do not overwrite
+    each other's progress. Only the most recent uploads are remembered.
+    """
+    with _upload_progress_lock:
+        progress = _upload_progress.get(evidence_id)
+        if progress is None:
+            progress = _upload_progress[evidence_id] = UploadProgress()
+        _upload_progress.move_to_end(evidence_id)
+        while len(_upload_progress) > MAX_TRACKED_UPLOADS:
+            _upload_progress.popitem(last=False)
+        return progress
+
+
+def method_stream_evidence_to_disk(stream, output_path, total_bytes=None, progress=None,
+                                   chunk_size=UPLOAD_CHUNK_SIZE):
+    """Writes an incoming upload to disk while hashing it in the same pass.
+
+    The evidence is never read back from disk: MD5, SHA-1 and SHA-256 are
+    updated from the same chunks that are written, so intake hashes cost no
+    extra I/O even for images of hundreds of gigabytes.
+
+    Args:
+        stream: A binary file-like object, e.g. Flask's request.stream.
+        output_path (str): Where the evidence file is written.
+        total_bytes (int): Expected size, used for progress reporting only.
+        progress (UploadProgress): Optional progress record to update.
+        chunk_size (int): Number of bytes read per iteration.
+
+    Returns:
+        dict: 'bytes_written' and one hex digest per INTAKE_HASH_ALGORITHMS entry.
+    """
+    hashers = {name: hashlib.new(name) for name in INTAKE_HASH_ALGORITHMS}
+    bytes_written = 0
+    if progress:
+        progress.start(Path(output_path).name, total_bytes)
+
+    try:
+        with open(output_path, "wb") as out_file:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                out_file.write(chunk)
+                for hasher in hashers.values():
+                    hasher.update(chunk)
+                bytes_written += len(chunk)
+                if progress:
+                    progress.update(bytes_written)
+    except Exception:
+        if progress:
+            progress.finish("failed")
+        raise
+
+    if progress:
+        progress.finish("received")
+
+    result = {"bytes_written": bytes_written}
+    result.update({name: hasher.hexdigest() for name, hasher in hashers.items()})
+    return result
+
+
+def verify_intake_hashes(intake_hashes, acquisition_hashes, expected_hashes=None):
+    """Compares the intake hashes with the hashes known for the evidence.
+
+    The EWF header stores the acquisition MD5/SHA-1 of the decompressed media,
+    not of the .E01 container that was uploaded. Those values are reported
+    alongside the intake hashes so both end up in the case record. The
+    container hashes themselves are checked against any hashes the submitter
+    supplied for the file (e.g. from the transfer manifest).
+
+    Args:
+        intake_hashes (dict): Output of method_stream_evidence_to_disk.
+        acquisition_hashes (dict): Hashes read from the EWF header.
+        expected_hashes (dict): Optional submitter hashes keyed by algorithm.
+
+    Returns:
+        dict: 'status' is "passed" when every supplied hash matched,
+              "failed" on any mismatch and "unverified" when nothing was
+              supplied to compare against.
+    """
+    comparisons = {}
+    for name, expected in (expected_hashes or {}).items():
+        if expected and name in intake_hashes:
+            comparisons[name] = expected.strip().lower() == intake_hashes[name]
+
+    if not comparisons:
+        status = "unverified"
+    elif all(comparisons.values()):
+        status = "passed"
+    else:
+        status = "failed"
+
+    return {
+        "status": status,
+        "matches": comparisons,
+        "acquisition_hashes": acquisition_hashes,
+    }
+
+
+def load_intake_record(e01_path):
+    """Reads the upload_info.txt record written next to an uploaded image."""
+    try:
+        with open(Path(e01_path).parent / "upload_info.txt", "r") as info_file:
+            return json.load(info_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
@@ -0,0 +1,291 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import pyewf
+from dfvfs.lib import definitions
+from dfvfs.path import factory as path_spec_factory
+from dfvfs.resolver import context
+from dfvfs.resolver import resolver
+from dfvfs.volume import tsk_volume_system
+
+from .evidence_intake import load_intake_record
+from .ewf_chunk_cache import ewf_chunk_cache, register_cached_ewf_resolver
+from .metrics import image_bytes_read, resolver_opens
+
+register_cached_ewf_resolver()
+
+# Segment file signatures of EWF (E01) and EWF2 (Ex01) images.
+EWF_SIGNATURES = (b"EVF\x09\x0d\x0a\xff\x00", b"EVF2\x0d\x0a\x81\x00")
+
+
+def is_ewf_image(image_path):
+    """Returns True if a file starts with an EWF segment signature.
+
+    A file that cannot be read is reported as EWF, so opening it fails the
+    same way it did before RAW images were supported.
+    """
+    try:
+        with open(image_path, "rb") as image_file:
+            header = image_file.read(8)
+    except OSError:
+        return True
+    return header in EWF_SIGNATURES
+
+
+class EvidenceSession:
+    """Keeps the dfvfs handles for one uploaded evidence image open.
+
+    The OS -> EWF path specification chain is built once, the EWF file object
+    is opened once and every partition's TSK file system is opened on first use
+    and then reused. All api_methods read files through a session instead of
+    building a new path specification chain and walking the resolver per file.
+
+    dfvfs/pytsk3 handles are not safe for concurrent use. Each partition is
+    therefore opened in its own resolver context (with its own EWF handle
+    underneath) and guarded by its own lock, so different partitions can be
+    read in parallel while calls against one partition are serialized.
+    Callers that hold a file object or iterate a directory across several
+    calls should take ``partition_lock(partition_id)`` themselves.
+    """
+
+    def __init__(self, e01_path):
+        self.e01_path = str(Path(e01_path).resolve())
+        self.image_lock = threading.RLock()
+        self._resolver_context = context.Context()
+        self._ewf_file_object = None
+        self._partition_ids = None
+        self._stored_hashes = None
+        self._partition_locks = {}
+        self._partition_contexts = {}
+        self._partition_path_specs = {}
+        self._file_systems = {}
+
+        # Uploads are stored as upload.E01 whatever their format; plain RAW
+        # (dd) images, such as the benchmark fixtures, are opened as RAW media.
+        self.is_ewf = is_ewf_image(self.e01_path)
+        os_path_spec = path_spec_factory.Factory.NewPathSpec(
+            definitions.TYPE_INDICATOR_OS, location=self.e01_path)
+        self.media_path_spec = path_spec_factory.Factory.NewPathSpec(
+            definitions.TYPE_INDICATOR_EWF if self.is_ewf else definitions.TYPE_INDICATOR_RAW,
+            parent=os_path_spec)
+
+    def get_ewf_file_object(self):
+        """Returns the opened file-like object for the media (EWF or RAW) of the image."""
+        with self.image_lock:
+            if self._ewf_file_object is None:
+                self._ewf_file_object = resolver.Resolver.OpenFileObject(
+                    self.media_path_spec, resolver_context=self._resolver_context)
+                resolver_opens.inc(kind="media")
+            return self._ewf_file_object
+
+    def list_partition_ids(self):
+        """Enumerates the allocated partitions once through the TSK volume system.
+
+        Returns:
+            list: The partition numbers usable as ``/p<N>`` locations, in
+                  volume system order.
+        """
+        with self.image_lock:
+            if self._partition_ids is None:
+                volume_system_path_spec = path_spec_factory.Factory.NewPathSpec(
+                    definitions.TYPE_INDICATOR_TSK_PARTITION,
+                    location="/",
+                    parent=self.media_path_spec)
+                volume_system = tsk_volume_system.TSKVolumeSystem()
+                volume_system.Open(volume_system_path_spec)
+                self._partition_ids = [
+                    int(volume.identifier[len(volume_system.VOLUME_IDENTIFIER_PREFIX):])
+                    for volume in volume_system.volumes]
+            return list(self._partition_ids)
+
+    def get_stored_hashes(self):
+        """Returns the acquisition hashes recorded in the EWF header.
+
+        Returns:
+            dict: 'md5' and 'sha1' keys; a value is None when the acquisition
+                  tool did not store that hash or the image is not EWF.
+        """
+        with self.image_lock:
+            if self._stored_hashes is None and not self.is_ewf:
+                self._stored_hashes = {"md5": None, "sha1": None}
+            if self._stored_hashes is None:
+                ewf_handle = pyewf.handle()
+                ewf_handle.open(pyewf.glob(self.e01_path))
+                try:
+                    self._stored_hashes = {
+                        "md5": ewf_handle.get_hash_value("MD5"),
+                        "sha1": ewf_handle.get_hash_value("SHA1"),
+                    }
+                finally:
+                    ewf_handle.close()
+            return dict(self._stored_hashes)
+
+    def get_evidence_hash(self):
+        """Returns a stable identifier for the image, used to key derived caches.
+
+        The SHA-256 computed on upload is preferred; for an image uploaded as
+        several EWF segments this is the SHA-256 over the segments' SHA-256
+        digests in segment order. Otherwise the acquisition MD5 from the EWF
+        header is used. Images without either fall back to a fingerprint of
+        path, size and modification time, which still changes whenever the
+        image is replaced.
+        """
+        intake_hashes = load_intake_record(self.e01_path).get("hashes", {})
+        if intake_hashes.get("sha256"):
+            return f"sha256:{intake_hashes['sha256']}"
+        if intake_hashes.get("segment_set_sha256"):
+            return f"segments-sha256:{intake_hashes['segment_set_sha256']}"
+
+        try:
+            stored_md5 = self.get_stored_hashes().get("md5")
+        except Exception as e:
+            print(f"[-] Could not read EWF header hashes: {e}")
+            stored_md5 = None
+        if stored_md5:
+            return f"md5:{stored_md5.lower()}"
+
+        stat = os.stat(self.e01_path)
+        fingerprint = f"{self.e01_path}|{stat.st_size}|{stat.st_mtime_ns}"
+        return "fingerprint:" + hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+    def partition_lock(self, partition_id):
+        """Returns the lock that serializes access to one partition."""
+        partition_id = int(partition_id)
+        with self.image_lock:
+            if partition_id not in self._partition_locks:
+                self._partition_locks[partition_id] = threading.RLock()
+            return self._partition_locks[partition_id]
+
+    def get_partition_path_spec(self, partition_id):
+        """Returns the TSK_PARTITION path specification for a partition."""
+        partition_id = int(partition_id)
+        with self.image_lock:
+            if partition_id not in self._partition_path_specs:
+                self._partition_path_specs[partition_id] = path_spec_factory.Factory.NewPathSpec(
+                    definitions.TYPE_INDICATOR_TSK_PARTITION,
+                    location=f"/p{partition_id}",
+                    parent=self.media_path_spec)
+            return self._partition_path_specs[partition_id]
+
+    def get_path_spec(self, partition_id, location="/"):
+        """Creates a TSK path specification for a location inside a partition."""
+        return path_spec_factory.Factory.NewPathSpec(
+            definitions.TYPE_INDICATOR_TSK,
+            location=location,
+            parent=self.get_partition_path_spec(partition_id))
+
+    def get_file_system(self, partition_id):
+        """Returns the TSK file system of a partition, opening it on first use."""
+        partition_id = int(partition_id)
+        with self.partition_lock(partition_id):
+            if partition_id not in self._file_systems:
+                resolver_context = context.Context()
+                self._file_systems[partition_id] = resolver.Resolver.OpenFileSystem(
+                    self.get_path_spec(partition_id, "/"),
+                    resolver_context=resolver_context)
+                self._partition_contexts[partition_id] = resolver_context
+                resolver_opens.inc(kind="file_system")
+            return self._file_systems[partition_id]
+
+    def get_file_entry(self, partition_id, location):
+        """Returns the dfvfs file entry at a location, or None if it does not exist."""
+        with self.partition_lock(partition_id):
+            file_system = self.get_file_system(partition_id)
+            return file_system.GetFileEntryByPathSpec(self.get_path_spec(partition_id, location))
+
+    def open_file_object(self, partition_id, location):
+        """Opens a file inside a partition and returns its dfvfs file object."""
+        with self.partition_lock(partition_id):
+            file_entry = self.get_file_entry(partition_id, location)
+            if file_entry is None:
+                raise FileNotFoundError(f"{location} not found in partition {partition_id}")
+            return file_entry.GetFileObject()
+
+    def iter_file_chunks(self, partition_id, location, chunk_size=1024 * 1024):
+        """Yields the content of a file inside a partition in chunks.
+
+        The partition lock is only held while a chunk is read, and every read
+        seeks to its own offset first, so a slow consumer (e.g. a disk write)
+        does not block other readers of the partition.
+        """
+        with self.partition_lock(partition_id):
+            file_object = self.open_file_object(partition_id, location)
+        offset = 0
+        while True:
+            with self.partition_lock(partition_id):
+                file_object.seek(offset, os.SEEK_SET)
+                data = file_object.read(chunk_size)
+            if not data:
+                break
+            image_bytes_read.inc(len(data), layer="file")
+            offset += len(data)
+            yield data
+
+    def walk_file_entries(self, partition_id, location="/"):
+        """Yields every file entry below a directory of a partition, depth first.
+
+        The walk keeps one directory iterator per level instead of a list of
+        every entry, so memory grows with the depth of the tree rather than
+        its size. The partition lock is only held while the next entry is
+        read, never while the caller processes it.
+        """
+        with self.partition_lock(partition_id):
+            directory = self.get_file_entry(partition_id, location)
+            if directory is None:
+                raise FileNotFoundError(f"{location} not found in partition {partition_id}")
+            pending = [iter(directory.sub_file_entries)]
+        while pending:
+            with self.partition_lock(partition_id):
+                file_entry = next(pending[-1], None)
+                if file_entry is not None and file_entry.IsDirectory():
+                    pending.append(iter(file_entry.sub_file_entries))
+            if file_entry is None:
+                pending.pop()
+                continue
+            yield file_entry
+
+    def read_file(self, partition_id, location):
+        """Reads the full content of a file inside a partition."""
+        with self.partition_lock(partition_id):
+            file_object = self.open_file_object(partition_id, location)
+            data = file_object.read()
+        image_bytes_read.inc(len(data), layer="file")
+        return data
+
+    def close(self):
+        """Drops every cached handle so the image file can be removed."""
+        with self.image_lock:
+            self._file_systems = {}
+            self._partition_path_specs = {}
+            self._ewf_file_object = None
+            for resolver_context in self._partition_contexts.values():
+                resolver_context.Empty()
+            self._partition_contexts = {}
+            self._resolver_context.Empty()
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_evidence_session(e01_path):
+    """Returns the shared EvidenceSession for an image, creating it on first use."""
+    key = str(Path(e01_path).resolve())
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = EvidenceSession(key)
+            _sessions[key] = session
+        return session
+
+
+def close_evidence_session(e01_path):
+    """Closes and forgets the session of an image, e.g. before it is replaced."""
+    key = str(Path(e01_path).resolve())
+    with _sessions_lock:
+        session = _sessions.pop(key, None)
+    if session is not None:
+        session.close()
+    ewf_chunk_cache.invalidate_image(key)
@@ -0,0 +1,164 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from .common import get_e01_path, get_evidence_dir, get_evidence_store_dir
+from .evidence_intake import load_intake_record
+from .evidence_session import close_evidence_session
+
+DEFAULT_CASE_ID = "default"
+
+# Evidence record written next to each stored image.
+EVIDENCE_RECORD_NAME = "evidence.json"
+
+_store_lock = threading.Lock()
+
+# The latest ready evidence ID per application directory, so requests to the
+# unscoped URLs do not list the whole store. Creating, finishing or deleting
+# evidence forgets it; the generation keeps a lookup that raced with one of
+# those from storing an outdated ID.
+_latest_evidence_ids = {}
+_latest_evidence_generation = 0
+_latest_evidence_lock = threading.Lock()
+
+
+def _forget_latest_evidence_id(cwd):
+    global _latest_evidence_generation
+    with _latest_evidence_lock:
+        _latest_evidence_ids.pop(str(cwd), None)
+        _latest_evidence_generation += 1
+
+
+def _write_record(record, cwd):
+    evidence_dir = get_evidence_dir(cwd, record["evidence_id"])
+    tmp_path = evidence_dir / f"{EVIDENCE_RECORD_NAME}.tmp"
+    tmp_path.write_text(json.dumps(record, indent=2))
+    os.replace(tmp_path, evidence_dir / EVIDENCE_RECORD_NAME)
+
+
+def create_evidence(cwd, filename, case_id=DEFAULT_CASE_ID, segment_count=None):
+    """Creates the directory of a new evidence image and returns its record.
+
+    Every image gets its own directory under uploads/evidence/<evidence ID>,
+    holding the image, its intake record and every artifact extracted from
+    it, so several images can be stored and processed side by side.
+
+    Args:
+        cwd (str): The current working directory of the main application.
+        filename (str): The original name of the uploaded file.
+        case_id (str): The case the evidence belongs to.
+        segment_count (int): For images uploaded as EWF segments, the number
+            of segments the client announced.
+
+    Returns:
+        dict: 'evidence_id', 'case_id', 'filename', 'created_at' and
+              'status', which is "uploading" until mark_evidence_ready is called.
+    """
+    record = {
+        "evidence_id": uuid.uuid4().hex,
+        "case_id": case_id or DEFAULT_CASE_ID,
+        "filename": filename,
+        "created_at": time.time(),
+        "status": "uploading",
+    }
+    if segment_count:
+        record["segment_count"] = segment_count
+        record["segments"] = {}
+    get_evidence_dir(cwd, record["evidence_id"]).mkdir(parents=True)
+    _write_record(record, cwd)
+    _forget_latest_evidence_id(cwd)
+    return record
+
+
+def mark_evidence_ready(cwd, evidence_id):
+    """Records that an evidence image has been received completely."""
+    with _store_lock:
+        record = get_evidence(cwd, evidence_id)
+        record.pop("intake", None)
+        record["status"] = "ready"
+        _write_record(record, cwd)
+    _forget_latest_evidence_id(cwd)
+    return record
+
+
+def record_evidence_segment(cwd, evidence_id, segment):
+    """Adds a received EWF segment and its intake hashes to the evidence record."""
+    with _store_lock:
+        record = get_evidence(cwd, evidence_id)
+        record.pop("intake", None)
+        record.setdefault("segments", {})[str(segment["segment_number"])] = {
+            "filename": segment["filename"],
+            "hashes": segment["hashes"],
+            "verification": segment["verification"],
+        }
+        _write_record(record, cwd)
+    return record
+
+
+def get_evidence(cwd, evidence_id):
+    """Returns the record of an evidence image, or None if it does not exist."""
+    try:
+        record_path = get_evidence_dir(cwd, evidence_id) / EVIDENCE_RECORD_NAME
+        record = json.loads(record_path.read_text())
+    except (ValueError, OSError):
+        return None
+    record["intake"] = load_intake_record(get_e01_path(cwd, evidence_id))
+    return record
+
+
+def list_evidence(cwd, case_id=None):
+    """Lists the stored evidence images, most recent first, optionally of one case only."""
+    store_dir = get_evidence_store_dir(cwd)
+    if not store_dir.is_dir():
+        return []
+    records = []
+    for evidence_dir in store_dir.iterdir():
+        record = get_evidence(cwd, evidence_dir.name) if evidence_dir.is_dir() else None
+        if record and (case_id is None or record["case_id"] == case_id):
+            records.append(record)
+    return sorted(records, key=lambda record: record["created_at"], reverse=True)
+
+
+def list_cases(cwd):
+    """Returns the case IDs of the stored evidence with the number of images of each."""
+    cases = {}
+    for record in list_evidence(cwd):
+        cases[record["case_id"]] = cases.get(record["case_id"], 0) + 1
+    return [{"case_id": case_id, "evidence_count": count} for case_id, count in sorted(cases.items())]
+
+
+def get_latest_evidence_id(cwd):
+    """Returns the ID of the most recently uploaded image that is ready, or None.
+
+    The store is only listed on the first call and after evidence was
+    created, finished or deleted; the ID is remembered in between.
+    """
+    with _latest_evidence_lock:
+        generation = _latest_evidence_generation
+        if str(cwd) in _latest_evidence_ids:
+            evidence_id = _latest_evidence_ids[str(cwd)]
+            if evidence_id is None or get_evidence_dir(cwd, evidence_id).is_dir():
+                return evidence_id
+
+    evidence_id = next((record["evidence_id"] for record in list_evidence(cwd) if record["status"] == "ready"), None)
+    with _latest_evidence_lock:
+        if generation == _latest_evidence_generation:
+            _latest_evidence_ids[str(cwd)] = evidence_id
+    return evidence_id
+
+
+def delete_evidence(cwd, evidence_id):
+    """Closes an evidence image's handles and removes it with everything derived from it.
+
+    Returns:
+        bool: False if there is no evidence with this ID.
+    """
+    if get_evidence(cwd, evidence_id) is None:
+        return False
+    close_evidence_session(get_e01_path(cwd, evidence_id))
+    shutil.rmtree(get_evidence_dir(cwd, evidence_id))
+    _forget_latest_evidence_id(cwd)
+    return True
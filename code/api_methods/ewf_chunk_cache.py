@@ -0,0 +1,201 @@
+import os
+import threading
+from collections import OrderedDict
+
+from dfvfs.file_io import ewf_file_io
+from dfvfs.resolver_helpers import ewf_resolver_helper
+from dfvfs.resolver_helpers import manager as resolver_helper_manager
+
+from .metrics import image_bytes_read
+
+# Default memory budget of the shared cache of decompressed EWF chunks.
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+# Size of a cached block when the handle does not report its chunk size;
+# 64 sectors of 512 bytes is the chunk size most acquisition tools write.
+DEFAULT_CHUNK_SIZE = 32 * 1024
+
+
+class EWFChunkCache:
+    """A process-wide LRU cache of decompressed EWF media chunks.
+
+    Entries are keyed by image and chunk index, so every resolver context and
+    partition reading the same image shares them. The cache holds at most
+    max_bytes of chunk data and is safe to use from several threads.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._chunks = OrderedDict()
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                self.misses += 1
+                return None
+            self._chunks.move_to_end(key)
+            self.hits += 1
+            return chunk
+
+    def put(self, key, chunk):
+        if len(chunk) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._chunks.pop(key, None)
+            if previous is not None:
+                self._current_bytes -= len(previous)
+            self._chunks[key] = chunk
+            self._current_bytes += len(chunk)
+            while self._current_bytes > self.max_bytes:
+                _, evicted = self._chunks.popitem(last=False)
+                self._current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def resize(self, max_bytes):
+        """Changes the memory budget, evicting chunks until the cache fits."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self._current_bytes > self.max_bytes:
+                _, evicted = self._chunks.popitem(last=False)
+                self._current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate_image(self, image_path):
+        """Drops every chunk read from an image path, e.g. before the image is replaced."""
+        with self._lock:
+            for key in [key for key in self._chunks if key[0][0] == image_path]:
+                self._current_bytes -= len(self._chunks.pop(key))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "cached_chunks": len(self._chunks),
+                "cached_bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+ewf_chunk_cache = EWFChunkCache()
+
+
+class ChunkCachingEWFHandle:
+    """Wraps a pyewf handle so media reads are served from the shared chunk cache.
+
+    Reads are split on chunk boundaries; each missing chunk is read (and thus
+    decompressed) once through the wrapped handle and then kept in the cache.
+    Callers must serialize access to one wrapper, as they must for pyewf.
+    """
+
+    def __init__(self, ewf_handle, image_key, cache=ewf_chunk_cache):
+        self._ewf_handle = ewf_handle
+        self._image_key = image_key
+        self._cache = cache
+        self._offset = 0
+        self._media_size = ewf_handle.get_media_size()
+        get_chunk_size = getattr(ewf_handle, "get_chunk_size", None)
+        self._chunk_size = (get_chunk_size() if get_chunk_size else 0) or DEFAULT_CHUNK_SIZE
+
+    def __getattr__(self, name):
+        return getattr(self._ewf_handle, name)
+
+    def _get_chunk(self, chunk_index):
+        key = (self._image_key, chunk_index)
+        chunk = self._cache.get(key)
+        if chunk is None:
+            self._ewf_handle.seek(chunk_index * self._chunk_size, os.SEEK_SET)
+            chunk = self._ewf_handle.read(self._chunk_size)
+            image_bytes_read.inc(len(chunk), layer="ewf_chunk")
+            self._cache.put(key, chunk)
+        return chunk
+
+    def read(self, size=None):
+        remaining = self._media_size - self._offset
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        parts = []
+        while size > 0:
+            chunk_index, chunk_offset = divmod(self._offset, self._chunk_size)
+            piece = self._get_chunk(chunk_index)[chunk_offset:chunk_offset + size]
+            if not piece:
+                break
+            parts.append(piece)
+            self._offset += len(piece)
+            size -= len(piece)
+        return b"".join(parts)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._offset
+        elif whence == os.SEEK_END:
+            offset += self._media_size
+        elif whence != os.SEEK_SET:
+            raise IOError("Unsupported whence.")
+        if offset < 0:
+            raise IOError("Invalid offset value less than zero.")
+        self._offset = offset
+
+    def get_offset(self):
+        return self._offset
+
+    def tell(self):
+        return self._offset
+
+    def get_media_size(self):
+        return self._media_size
+
+    def get_size(self):
+        return self._media_size
+
+    def close(self):
+        self._ewf_handle.close()
+
+
+def get_image_key(image_path):
+    """Identifies an image file by path and modification time, so a replaced upload never hits stale chunks."""
+    return (image_path, os.stat(image_path).st_mtime_ns)
+
+
+class CachedEWFFile(ewf_file_io.EWFFile):
+    """The dfvfs EWF file object, reading its media through the shared chunk cache."""
+
+    def _OpenFileObject(self, path_spec):
+        ewf_handle = super()._OpenFileObject(path_spec)
+        if ewf_handle is None:
+            return None
+        return ChunkCachingEWFHandle(ewf_handle, get_image_key(path_spec.parent.location))
+
+
+class CachedEWFResolverHelper(ewf_resolver_helper.EWFResolverHelper):
+    """Resolver helper creating CachedEWFFile objects for EWF path specifications."""
+
+    def NewFileObject(self, resolver_context, path_spec):
+        return CachedEWFFile(resolver_context, path_spec)
+
+
+_registration_lock = threading.Lock()
+_registered = False
+
+
+def register_cached_ewf_resolver():
+    """Replaces dfvfs's EWF resolver helper with the caching one, once per process."""
+    global _registered
+    with _registration_lock:
+        if _registered:
+            return
+        try:
+            resolver_helper_manager.ResolverHelperManager.DeregisterHelper(ewf_resolver_helper.EWFResolverHelper())
+        except KeyError:
+            pass
+        resolver_helper_manager.ResolverHelperManager.RegisterHelper(CachedEWFResolverHelper())
+        _registered = True
@@ -0,0 +1,152 @@
+import os
+import re
+import struct
+from pathlib import Path
+
+from .evidence_intake import method_stream_evidence_to_disk, verify_intake_hashes
+from .evidence_session import EWF_SIGNATURES
+
+# Segment extensions as libewf names them: E01 to E99, then EAA to EZZ,
+# FAA to ZZZ. EWF2 sets use Ex01 to Ex99, ExAA to ExZZ, FxAA and so on.
+SEGMENT_EXTENSION_PATTERN = re.compile(r"^([E-Z])(X?)(\d{2}|[A-Z]{2})$")
+
+# Largest number of segments in one set, the last one being ZZZ (or ZxZZ).
+MAX_SEGMENT_NUMBER = 99 + 22 * 26 * 26
+
+# Name of the first segment in the evidence directory; libewf finds the
+# others from it, so every segment is stored as upload.<E-style extension>.
+SEGMENT_STORAGE_STEM = "upload"
+
+
+def parse_segment_number(filename):
+    """Returns the segment number encoded in an EWF segment file name.
+
+    Args:
+        filename (str): e.g. "laptop.E01", "laptop.E10" or "laptop.EAA".
+
+    Returns:
+        int: The segment number starting at 1 (EAA is 100), or None if the
+             extension is not an EWF segment extension.
+    """
+    match = SEGMENT_EXTENSION_PATTERN.match(Path(filename).suffix[1:].upper())
+    if not match:
+        return None
+    first_letter, _, rest = match.groups()
+    if rest.isdigit():
+        number = int(rest)
+        return number if first_letter == "E" and number > 0 else None
+    return 100 + (ord(first_letter) - ord("E")) * 26 * 26 + (ord(rest[0]) - ord("A")) * 26 + ord(rest[1]) - ord("A")
+
+
+def get_segment_extension(segment_number):
+    """Returns the E01-style extension of a segment number, the inverse of parse_segment_number."""
+    if not 1 <= segment_number <= MAX_SEGMENT_NUMBER:
+        raise ValueError(f"Segment number {segment_number} is out of range.")
+    if segment_number < 100:
+        return f"E{segment_number:02d}"
+    first_letter, rest = divmod(segment_number - 100, 26 * 26)
+    return chr(ord("E") + first_letter) + chr(ord("A") + rest // 26) + chr(ord("A") + rest % 26)
+
+
+def get_segment_storage_path(evidence_dir, segment_number):
+    """Returns where a segment is stored so that libewf's glob of upload.E01 finds it."""
+    return Path(evidence_dir) / f"{SEGMENT_STORAGE_STEM}.{get_segment_extension(segment_number)}"
+
+
+def read_segment_header(segment_path):
+    """Reads the format and segment number from the file header of an EWF segment.
+
+    Returns:
+        tuple: ("EWF" or "EWF2", segment number), or (None, None) if the file
+               does not start with an EWF or EWF2 signature.
+    """
+    with open(segment_path, "rb") as segment_file:
+        header = segment_file.read(16)
+    if header[:8] == EWF_SIGNATURES[0] and len(header) >= 11:
+        return "EWF", struct.unpack_from("<H", header, 9)[0]
+    if header[:8] == EWF_SIGNATURES[1] and len(header) >= 16:
+        return "EWF2", struct.unpack_from("<I", header, 12)[0]
+    return None, None
+
+
+def method_receive_segment(stream, evidence_dir, filename, total_bytes=None, expected_hashes=None):
+    """Writes one uploaded EWF segment to the evidence directory, hashing it on receipt.
+
+    The segment is written under a temporary name and only renamed to its
+    final upload.E<nn> name once it has been received completely, so several
+    segments of one image can be received at the same time and a broken
+    upload never leaves a partial segment behind.
+
+    Args:
+        stream: A binary file-like object, e.g. Flask's request.stream.
+        evidence_dir (Path): The evidence store directory of the image.
+        filename (str): The original name of the segment, e.g. "laptop.E02".
+        total_bytes (int): The expected size of the segment, if known.
+        expected_hashes (dict): Optional submitter hashes of this segment.
+
+    Returns:
+        dict: 'status', and on success 'filename', 'segment_number', the
+              intake hashes and their 'verification'.
+    """
+    segment_number = parse_segment_number(filename)
+    if segment_number is None:
+        return {"status": "failed", "message": f"{filename} is not named like an EWF segment (.E01, .E02, ...)."}
+
+    segment_path = get_segment_storage_path(evidence_dir, segment_number)
+    received_path = segment_path.with_name(f"{segment_path.name}.part")
+    try:
+        intake_hashes = method_stream_evidence_to_disk(stream, str(received_path), total_bytes=total_bytes)
+    except Exception:
+        received_path.unlink(missing_ok=True)
+        raise
+    os.replace(received_path, segment_path)
+
+    return {
+        "status": "passed",
+        "filename": filename,
+        "segment_number": segment_number,
+        "hashes": intake_hashes,
+        "verification": verify_intake_hashes(intake_hashes, {}, expected_hashes),
+    }
+
+
+def validate_segment_set(evidence_dir, expected_count=None):
+    """Checks that the segments received for an image form one complete set.
+
+    The segment numbers must run from 1 without gaps, every segment must be
+    of the same format and the number in each segment's file header must
+    match its file name. Without expected_count a missing last segment
+    cannot be detected here; libewf then reports it when the image is opened.
+
+    Args:
+        evidence_dir (Path): The evidence store directory of the image.
+        expected_count (int): The number of segments announced by the client.
+
+    Returns:
+        dict: 'status' and 'segment_count', with a 'message' on failure.
+    """
+    numbers = sorted(number for number in (parse_segment_number(path.name)
+                                           for path in Path(evidence_dir).glob(f"{SEGMENT_STORAGE_STEM}.*"))
+                     if number is not None)
+
+    def failed(message):
+        return {"status": "failed", "message": message, "segment_count": len(numbers)}
+
+    if not numbers:
+        return failed("No segments have been received.")
+    last_number = max(numbers[-1], expected_count or 0)
+    missing = sorted(set(range(1, last_number + 1)) - set(numbers))
+    if missing:
+        return failed("Missing segments: " + ", ".join(get_segment_extension(number) for number in missing) + ".")
+
+    formats = set()
+    for number in numbers:
+        segment_format, header_number = read_segment_header(get_segment_storage_path(evidence_dir, number))
+        if segment_format is None:
+            return failed(f"Segment {get_segment_extension(number)} is not an EWF segment file.")
+        if header_number != number:
+            return failed(f"Segment {get_segment_extension(number)} is segment {header_number} of its set.")
+        formats.add(segment_format)
+    if len(formats) > 1:
+        return failed("The segments mix EWF and EWF2 files.")
+    return {"status": "passed", "segment_count": len(numbers)}
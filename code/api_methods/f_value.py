@@ -1,10 +1,13 @@
 import struct
+from pathlib import Path
 from . import read_csv_1
 from datetime import datetime, timedelta
 
 # This is the largest possible 64-bit integer, often used as a "never expires" placeholder.
 NEVER_EXPIRES_SENTINEL = 0x7FFFFFFFFFFFFFFF
 
+F_VALUE_OFFSETS_CSV = Path(__file__).parent / "f_value_offsets.csv"
+
 def convert_windows_time(win_time):
     """Converts a 64-bit Windows NT time value to a Python datetime object."""
     # Check for both 0 and the max value sentinel for "Never"
@@ -22,40 +25,89 @@ def convert_windows_time(win_time):
         return "Invalid (date out of range)"
 
 
-def method_get_f_value_data(cwd, f_value_data):
-    data_list = []
-    data_address_list = read_csv_1.method_read_csv_to_dicts(cwd + "\\api_methods\\f_value_offsets.csv")
+def compile_f_value_layout(data_address_list):
+    """Compiles the rows of f_value_offsets.csv into a single struct.Struct.
+
+    The fields are sorted by offset and the gaps between them become pad bytes,
+    so one unpack_from call decodes every field of an F value.
 
-    for data_address in data_address_list:
-        f_info = {}
-        f_info['field'] = data_address['Field Name']
-        data_offset = int(data_address['Offset (Decimal)'])
+    Returns:
+        tuple: The compiled struct.Struct and, in CSV order, one
+               (field name, kind, index into the unpacked tuple) entry per
+               field, where kind is "time", "int" or "raw".
+    """
+    fields = []
+    for csv_index, data_address in enumerate(data_address_list):
         data_type = data_address['Data Type']
         size_bytes = int(data_address['Size (Bytes)'])
 
-        value = None
-
         # Use the 'Data Type' from the CSV to decide how to unpack the data
         if data_type == 'Windows NT Time':
             # Timestamps are 8-byte unsigned long longs
-            raw_val = struct.unpack_from('<Q', f_value_data, offset=data_offset)[0]
-            value = convert_windows_time(raw_val)
-
-        elif 'Integer' in data_type: # Catches 'Integer', 'Unsigned Integer', and 'Unsigned Integer (Bitmask)'
-            # Handle different integer sizes
-            if size_bytes == 4:
-                # 4-byte unsigned integer (for RID, Flags)
-                value = struct.unpack_from('<L', f_value_data, offset=data_offset)[0]
-            elif size_bytes == 2:
-                # 2-byte integer (for Revision, Counts)
-                value = struct.unpack_from('<H', f_value_data, offset=data_offset)[0]
-
-        # If the type is unknown, just show the raw bytes
-        if value is None:
-            raw_data = f_value_data[data_offset : data_offset + size_bytes]
-            value = str(raw_data)
-
-        f_info['value'] = value
-        data_list.append(f_info)
-
-    return data_list
+            kind, code = "time", "Q"
+        elif 'Integer' in data_type and size_bytes == 4: # Catches 'Integer', 'Unsigned Integer', and 'Unsigned Integer (Bitmask)'
+            kind, code = "int", "L"
+        elif 'Integer' in data_type and size_bytes == 2:
+            kind, code = "int", "H"
+        else:
+            # If the type is unknown, the raw bytes are shown
+            kind, code = "raw", f"{size_bytes}s"
+        fields.append((int(data_address['Offset (Decimal)']), struct.calcsize("<" + code), code, csv_index,
+                       data_address['Field Name'], kind))
+
+    layout_format = "<"
+    position = 0
+    tuple_index_by_csv_index = {}
+    for tuple_index, (offset, size, code, csv_index, _, _) in enumerate(sorted(fields)):
+        if offset < position:
+            raise ValueError(f"Overlapping F value fields at offset {offset}")
+        if offset > position:
+            layout_format += f"{offset - position}x"
+        layout_format += code
+        position = offset + size
+        tuple_index_by_csv_index[csv_index] = tuple_index
+
+    field_list = [(name, kind, tuple_index_by_csv_index[csv_index])
+                  for _, _, _, csv_index, name, kind in fields]
+    return struct.Struct(layout_format), field_list
+
+
+F_VALUE_STRUCT, F_VALUE_FIELDS = compile_f_value_layout(
+    read_csv_1.method_read_csv_to_dicts(str(F_VALUE_OFFSETS_CSV)))
+
+
+def _convert_field(kind, raw_val):
+    if kind == "time":
+        return convert_windows_time(raw_val)
+    if kind == "raw":
+        return str(raw_val)
+    return raw_val
+
+
+def method_get_f_value_data(cwd, f_value_data):
+    """Decodes an F value with the layout compiled from f_value_offsets.csv at import.
+
+    cwd is kept for compatibility with existing callers and is not used.
+    """
+    raw_values = F_VALUE_STRUCT.unpack_from(f_value_data)
+    return [
+        {'field': field_name, 'value': _convert_field(kind, raw_values[tuple_index])}
+        for field_name, kind, tuple_index in F_VALUE_FIELDS
+    ]
+
+
+def method_decode_f_values_batch(f_value_blobs):
+    """Decodes many F values at once into columns.
+
+    Args:
+        f_value_blobs (iterable): Raw F value data, one entry per account.
+
+    Returns:
+        dict: One list per field name, each holding that field's decoded
+              value for every blob in input order.
+    """
+    rows = [F_VALUE_STRUCT.unpack_from(f_value_data) for f_value_data in f_value_blobs]
+    return {
+        field_name: [_convert_field(kind, row[tuple_index]) for row in rows]
+        for field_name, kind, tuple_index in F_VALUE_FIELDS
+    }
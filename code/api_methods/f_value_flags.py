@@ -1,23 +1,35 @@
 import struct
+from pathlib import Path
 from . import read_csv_1
 
-def method_get_f_value_flags(cwd, f_value_data):
-    # Assume 'f_value_data' is the 88-byte binary data from the 'F' value
-    # 'L' specifies a 4-byte unsigned long integer
+UAC_FLAGS_CSV = Path(__file__).parent / "uac_flags.csv"
+
+# The RID is at offset 48 (0x30) and the UAC flags are at offset 56 (0x38) of
+# the 88-byte 'F' value; both are 4-byte unsigned long integers ('L').
+RID_AND_UAC_STRUCT = struct.Struct("<48xL4xL")
+
+# (decimal value, flag row) pairs compiled once from uac_flags.csv.
+UAC_FLAG_TABLE = [
+    (int(flag_info['Decimal Value']), flag_info)
+    for flag_info in read_csv_1.method_read_csv_to_dicts(str(UAC_FLAGS_CSV))
+]
 
-    # The RID is at offset 48 (0x30)
-    rid = struct.unpack_from('<L', f_value_data, offset=48)[0]
 
-    # The UAC flags are at offset 56 (0x38)
-    uac_flag_sum_decimal = struct.unpack_from('<L', f_value_data, offset=56)[0]
-    current_uac_flags_list = []
-    full_uac_flags_list = read_csv_1.method_read_csv_to_dicts(cwd + "\\api_methods\\uac_flags.csv")
-    for flag_info in full_uac_flags_list:
-        if uac_flag_sum_decimal & int(flag_info['Decimal Value']) == int(flag_info['Decimal Value']):
-            current_uac_flags_list.append(flag_info)
+def decode_uac_flags(uac_flag_sum_decimal):
+    """Returns the uac_flags.csv rows of every flag set in a UAC bitmask."""
+    return [
+        dict(flag_info) for flag_value, flag_info in UAC_FLAG_TABLE
+        if uac_flag_sum_decimal & flag_value == flag_value
+    ]
+
+
+def method_get_f_value_flags(cwd, f_value_data):
+    # Assume 'f_value_data' is the 88-byte binary data from the 'F' value
+    # cwd is kept for compatibility with existing callers and is not used.
+    rid, uac_flag_sum_decimal = RID_AND_UAC_STRUCT.unpack_from(f_value_data)
     response = {
         "rid": rid,
-        "uac_flags_list": current_uac_flags_list,
+        "uac_flags_list": decode_uac_flags(uac_flag_sum_decimal),
         "uac_flag_sum_decimal": uac_flag_sum_decimal
     }
     return response
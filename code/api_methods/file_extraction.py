@@ -1,75 +1,52 @@
 import traceback
 from pathlib import Path
 
-from dfvfs.lib import definitions
-from dfvfs.path import factory as path_spec_factory
-from dfvfs.resolver import resolver
+from .common import get_e01_path, get_extracted_file_path
+from .evidence_session import get_evidence_session
+from .job_queue import report_job_progress
+from .load_file_from_e01 import HIVE_READ_CHUNK_SIZE
 
 
 
-def get_sam_path_spec(e01_path, partition_id, filepath):
-    os_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_OS, location=e01_path)
-
-    ewf_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_EWF, parent=os_path_spec)
-
-    partition_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_TSK_PARTITION,
-        location=f"/p{partition_id}",
-        parent=ewf_path_spec)
-
-    fs_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_TSK,
-        location=filepath,
-        parent=partition_path_spec)
-
-    return fs_path_spec
-
-
-def extract_file_to_local(path_spec, output_path):
+def extract_file_to_local(session, partition_id, filepath, output_path, chunk_size=HIVE_READ_CHUNK_SIZE, total_bytes=None):
     print(f"[*] Extracting to {output_path}...")
 
-    file_object = resolver.Resolver.OpenFileObject(path_spec)
+    bytes_written = 0
     with open(output_path, "wb") as out_file:
-        data = file_object.read(4096)
-        while data:
+        for data in session.iter_file_chunks(partition_id, filepath, chunk_size):
             out_file.write(data)
-            data = file_object.read(4096)
+            bytes_written += len(data)
+            report_job_progress(bytes_written, total_bytes, f"Extracting {filepath}")
 
     print("[+] Done.")
 
 
-def method_extract_file_from_e01(cwd, partition_id, filepath="/Windows/System32/config/SAM"):
-
+def method_extract_file_from_e01(cwd, partition_id, filepath="/Windows/System32/config/SAM", evidence_id=None):
+    """Writes a copy of a file from the E01 image to the partition's directory.
 
+    The hive parsers read hives straight from the image, so this copy is only
+    needed for export. An existing copy that is newer than the image and has
+    the same size as the source file is reused instead of being rewritten.
+    """
     try:
         partition_id = str(partition_id)
-        e01_path = cwd + "\\uploads\\upload.E01"
-        print("e01_path")
-        print(e01_path)
-        output_dir = cwd + "\\uploads\\partitions\\" + partition_id
-        print("output_dir")
-        print(output_dir)
-        path = Path(output_dir)
-        path.mkdir(parents=True, exist_ok=True)
-        filename = filepath.split("/")[-1]
-        print("filename")
-        print(filename)
-        if filename == "SAM":
-            output_path = cwd + "\\uploads\\partitions\\" + partition_id + "\\extracted_" + filename
+        e01_path = get_e01_path(cwd, evidence_id)
+        output_path = get_extracted_file_path(cwd, partition_id, filepath, evidence_id)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        session = get_evidence_session(e01_path)
+
+        file_entry = session.get_file_entry(partition_id, filepath)
+        if file_entry is None:
+            raise FileNotFoundError(f"{filepath} not found in partition {partition_id}")
+        if (output_path.exists()
+                and output_path.stat().st_size == file_entry.size
+                and output_path.stat().st_mtime >= Path(e01_path).stat().st_mtime):
+            print(f"[*] {output_path} is up to date, skipping extraction.")
         else:
-            output_path = cwd + "\\uploads\\partitions\\" + partition_id + "\\" + filename
-        print("output_path")
-        print(output_path)
-        fs_path_spec = get_sam_path_spec(e01_path, partition_id, filepath)
-
-        extract_file_to_local(fs_path_spec, output_path)
+            extract_file_to_local(session, partition_id, filepath, str(output_path), total_bytes=file_entry.size)
     except:
         traceback.print_exc()
         print("[-] Failed to extract SAM registry.")
         return {"status": "failed", "message": "Failed to extract SAM registry."}
     else:
         return {"status": "passed", "message": "SAM registry extracted."}
-
-
@@ -0,0 +1,131 @@
+import struct
+
+from . import f_value
+from . import f_value_flags
+from . import v_value
+from .hive_reader import HiveParseError, RegistryKeyNotFound
+
+from .sam_hive_cache import get_sam_hive, read_user_value
+
+# Errors a corrupt F or V value of one account can raise while it is decoded.
+ACCOUNT_DECODE_ERRORS = (struct.error, HiveParseError, OverflowError, ValueError)
+
+
+def method_get_all_users_full(cwd, partition_id, evidence_id=None):
+    """Decodes the F values, UAC flags and V values of every account in one pass.
+
+    This function walks the user keys under "SAM/Domains/Account/Users" of the
+    cached, parsed SAM hive once and decodes each account's F value (logon
+    and password timestamps, counters), its User Account Control flags and
+    its V value (username, full name, comment, home directory). It replaces
+    3 x N calls to the per-RID methods, e.g. for questions such as "who
+    logged on last", which need the data of every account.
+
+    Args:
+        cwd (str): The current working directory of the main application.
+        partition_id (int or str): The identifier of the partition containing
+            the SAM hive.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
+
+    Returns:
+        dict: A dictionary containing the status of the operation. On success,
+              the status is "passed" and 'users' holds one dictionary per
+              account with 'account_rid', 'account_name', 'f_val', 'f_flags'
+              and 'v_val' keys, using the same formats as the per-RID methods.
+              An account whose F or V value cannot be decoded has empty
+              values and an 'error' message. On failure, the status is
+              "failed" with an error message.
+    """
+    try:
+        hive = get_sam_hive(cwd, partition_id, evidence_id=evidence_id)
+        users = []
+        for rid, user_key in sorted(hive.users_by_rid.items()):
+            user = {"account_rid": rid, "account_name": hive.names_by_rid.get(rid)}
+            try:
+                raw_f_value = read_user_value(user_key, "F")
+                raw_v_value = read_user_value(user_key, "V")
+                user.update({
+                    "f_val": f_value.method_get_f_value_data(cwd, raw_f_value) if raw_f_value is not None else [],
+                    "f_flags": (f_value_flags.method_get_f_value_flags(cwd, raw_f_value)
+                                if raw_f_value is not None else {}),
+                    "v_val": v_value.method_get_v_value_data(cwd, raw_v_value) if raw_v_value is not None else [],
+                })
+            except ACCOUNT_DECODE_ERRORS as e:
+                # A truncated or corrupt value only spoils its own account.
+                print(f"Error decoding the F/V values of RID {rid}: {e}")
+                user.update({"f_val": [], "f_flags": {}, "v_val": [], "error": f"Malformed F or V value: {e}"})
+            users.append(user)
+
+        return {
+            "users": users,
+            "status": "passed"
+        }
+
+    except FileNotFoundError:
+        print(f"Error: The SAM hive of partition {partition_id} was not found.")
+        return {"status": "failed", "message": "SAM file not found."}
+    except (HiveParseError, RegistryKeyNotFound) as e:
+        print(f"Error parsing the registry file: {e}")
+        return {"status": "failed", "message": f"Registry Parse Error: {e}"}
+
+
+def method_get_all_users_columns(cwd, partition_id, evidence_id=None):
+    """Decodes every account's F and V values into columns with the batch decoders.
+
+    Intended for bulk processing across many accounts and images, where one
+    list per field is cheaper to build and compare than one record per user.
+
+    Args:
+        cwd (str): The current working directory of the main application.
+        partition_id (int or str): The identifier of the partition containing
+            the SAM hive.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
+
+    Returns:
+        dict: On success, the status is "passed" with 'account_rid' and
+              'account_name' lists and 'f_columns'/'v_columns' mappings of
+              field name to per-account values, all in the same account order.
+              Accounts missing an F or V value are left out, as are accounts
+              whose values cannot be decoded; those are listed in 'errors'
+              with their RID and an error message.
+    """
+    try:
+        hive = get_sam_hive(cwd, partition_id, evidence_id=evidence_id)
+        rids = []
+        f_columns = f_value.method_decode_f_values_batch([])
+        v_columns = v_value.method_decode_v_values_batch([])
+        errors = []
+        for rid, user_key in sorted(hive.users_by_rid.items()):
+            try:
+                raw_f_value = read_user_value(user_key, "F")
+                raw_v_value = read_user_value(user_key, "V")
+                if raw_f_value is None or raw_v_value is None:
+                    continue
+                account_f_columns = f_value.method_decode_f_values_batch([raw_f_value])
+                account_v_columns = v_value.method_decode_v_values_batch([raw_v_value])
+            except ACCOUNT_DECODE_ERRORS as e:
+                print(f"Error decoding the F/V values of RID {rid}: {e}")
+                errors.append({"account_rid": rid, "error": f"Malformed F or V value: {e}"})
+                continue
+            rids.append(rid)
+            for columns, account_columns in ((f_columns, account_f_columns), (v_columns, account_v_columns)):
+                for field, values in account_columns.items():
+                    columns[field].extend(values)
+
+        return {
+            "account_rid": rids,
+            "account_name": [hive.names_by_rid.get(rid) for rid in rids],
+            "f_columns": f_columns,
+            "v_columns": v_columns,
+            "errors": errors,
+            "status": "passed"
+        }
+
+    except FileNotFoundError:
+        print(f"Error: The SAM hive of partition {partition_id} was not found.")
+        return {"status": "failed", "message": "SAM file not found."}
+    except (HiveParseError, RegistryKeyNotFound) as e:
+        print(f"Error parsing the registry file: {e}")
+        return {"status": "failed", "message": f"Registry Parse Error: {e}"}
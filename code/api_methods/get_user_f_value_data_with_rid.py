@@ -1,13 +1,13 @@
 from . import f_value
-from .load_file_from_e01 import method_load_file_from_e01
-from Registry import Registry
+from .sam_hive_cache import get_sam_hive
+from .hive_reader import HiveParseError, RegistryKeyNotFound
 
-def method_get_user_f_value_data_with_rid(cwd, partition_id, rid):
+def method_get_user_f_value_data_with_rid(cwd, partition_id, rid, evidence_id=None):
     """Extracts and parses the F value data for a specific user from the SAM hive.
 
-    This function orchestrates the process of reading the SAM hive from the
-    E01 evidence file, locating the specific user account key by its
-    Relative ID (RID), and then passing the raw binary F value data to a
+    This function takes the parsed SAM hive from the hive cache, looks up
+    the specific user account key by its Relative ID (RID) in the hive's
+    RID index, and then passes the raw binary F value data to a
     specialized parser. The user/rid key is located within "SAM/Domains/Account/Users"
 
     Args:
@@ -16,6 +16,8 @@ def method_get_user_f_value_data_with_rid(cwd, partition_id, rid):
             the SAM hive.
         rid (int or str): The Relative ID of the target user whose F value
             is to be parsed.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
 
     Returns:
         dict: A dictionary containing the status of the operation. On success,
@@ -23,45 +25,22 @@ def method_get_user_f_value_data_with_rid(cwd, partition_id, rid):
               under the 'f_val' key. On failure, the status is "failed" with
               an error message.
     """
-    print("rid")
-    print(rid)
     try:
-        registry_file_path_in_e01 = "/Windows/System32/config/SAM"
-        try:
-            f = method_load_file_from_e01(cwd=cwd, partition_id=partition_id, filepath=registry_file_path_in_e01)
-        except:
-            return {
-                "status": "failed",
-                "message": "Unable to read file"
-            }
-        else:
+        hive = get_sam_hive(cwd, partition_id, evidence_id=evidence_id)
+        f_val = {}
+        raw_f_value = hive.get_user_value(rid, "F")
+        if raw_f_value is not None:
+            f_val = f_value.method_get_f_value_data(cwd, raw_f_value)
 
-            registry = Registry.Registry(f)
-            run_key = registry.open("SAM\\Domains\\Account\\Users")
-            flag = 0
-            f_val = {}
-            for value in run_key.subkeys():
-                if flag == 1:
-                    break
-                if value.name() != "Names":
-                    if int(value.name(), 16) == int(rid):
-                        print(f"Key Name: {value.name()}")
-                        for unit_type_1 in value.values():
-                            if unit_type_1.name() == "F":
-                                print(f"Value Name: {unit_type_1.name()}")
-                                f_val = f_value.method_get_f_value_data(cwd, unit_type_1.raw_data())
-                                print(f_val)
-                                flag = 1
-
-            return {
-                "f_val": f_val,
-                "status": "passed"
-            }
+        return {
+            "f_val": f_val,
+            "status": "passed"
+        }
 
     except FileNotFoundError:
         print(f"Error: The file was not found.")
         return {"status": "failed", "message": "SAM file not found."}
-    except Registry.RegistryParse.ParseException as e:
+    except (HiveParseError, RegistryKeyNotFound) as e:
         print(f"Error parsing the registry file: {e}")
         return {"status": "failed", "message": f"Registry Parse Error: {e}"}
 
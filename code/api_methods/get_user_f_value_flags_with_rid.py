@@ -1,10 +1,12 @@
 from . import f_value_flags
-from Registry import Registry
+from .hive_reader import HiveParseError, RegistryKeyNotFound
 
-def method_get_user_f_value_flags_with_rid(cwd, partition_id, rid):
+from .sam_hive_cache import get_sam_hive
+
+def method_get_user_f_value_flags_with_rid(cwd, partition_id, rid, evidence_id=None):
     """Extracts and decodes the UAC flags from a user's F value.
 
-    This function locates a user within the extracted SAM hive by their
+    This function looks up a user in the cached, parsed SAM hive by their
     Relative ID (RID). It then finds the corresponding F value, a binary
     data blob, and passes it to a helper module (f_value_flags) to parse
     the data and decode the User Account Control (UAC) flags into a
@@ -12,54 +14,41 @@ def method_get_user_f_value_flags_with_rid(cwd, partition_id, rid):
 
     Args:
         cwd (str): The current working directory of the main application, used
-            to construct the path to the extracted SAM hive.
-        partition_id (int or str): The identifier of the partition from which
-            the SAM hive was extracted.
+            to locate the evidence image.
+        partition_id (int or str): The identifier of the partition containing
+            the SAM hive.
         rid (int or str): The Relative ID of the target user.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
 
     Returns:
         dict: A dictionary containing the status of the operation. On success,
               the status is "passed" and it includes the decoded flag data
               under the 'f_val' key. On failure, the status is "failed".
     """
-    print("rid")
-    print(rid)
     try:
-        registry_file = cwd + "\\uploads\\partitions\\" + str(partition_id) + "\\extracted_SAM"
-        with open(registry_file, "rb") as f:
-            registry = Registry.Registry(f)
-            run_key = registry.open("SAM\\Domains\\Account\\Users")
-            flag = 0
-            f_val = {}
-            for value in run_key.subkeys():
-                if flag == 1:
-                    break
-                if value.name() != "Names":
-                    if int(value.name(), 16) == int(rid):
-                        print(f"Key Name: {value.name()}")
-                        for unit_type_1 in value.values():
-                            if unit_type_1.name() == "F":
-                                print(f"Value Name: {unit_type_1.name()}")
-                                f_val = f_value_flags.method_get_f_value_flags(cwd, unit_type_1.raw_data())
-                                print(f_val)
-                                flag = 1
+        hive = get_sam_hive(cwd, partition_id, evidence_id=evidence_id)
+        f_val = {}
+        raw_f_value = hive.get_user_value(rid, "F")
+        if raw_f_value is not None:
+            f_val = f_value_flags.method_get_f_value_flags(cwd, raw_f_value)
 
-            # Final check to ensure the parsed data corresponds to the requested RID
-            if "rid" in f_val:
-                if str(f_val["rid"]) == str(rid):
-                    return {
-                        "f_val": f_val,
-                        "status": "passed"
-                    }
+        # Final check to ensure the parsed data corresponds to the requested RID
+        if "rid" in f_val:
+            if str(f_val["rid"]) == str(rid):
+                return {
+                    "f_val": f_val,
+                    "status": "passed"
+                }
 
-            return {
-                "f_val": f_val, # May be empty or incorrect on failure
-                #"status": "failed"
-            }
+        return {
+            "f_val": f_val, # May be empty or incorrect on failure
+            #"status": "failed"
+        }
 
     except FileNotFoundError:
-        print(f"Error: The file '{registry_file}' was not found.")
+        print(f"Error: The SAM hive of partition {partition_id} was not found.")
         return {"status": "failed", "message": "SAM file not found."}
-    except Registry.RegistryParse.ParseException as e:
+    except (HiveParseError, RegistryKeyNotFound) as e:
         print(f"Error parsing the registry file: {e}")
         return {"status": "failed", "message": f"Registry Parse Error: {e}"}
@@ -1,12 +1,14 @@
 from . import v_value
-from Registry import Registry
+from .hive_reader import HiveParseError, RegistryKeyNotFound
 
-def method_get_user_v_value_data_with_rid(cwd, partition_id, rid):
+from .sam_hive_cache import get_sam_hive
+
+def method_get_user_v_value_data_with_rid(cwd, partition_id, rid, evidence_id=None):
     """Extracts and parses the V value data for a specific user from the SAM hive.
 
-    This function orchestrates the process of reading the SAM hive from the
-    extracted partition files, locating the specific user account key by its
-    Relative ID (RID), and then passing the raw binary V value data to a
+    This function takes the parsed SAM hive of the partition from the hive
+    cache, looks up the specific user account key by its Relative ID (RID)
+    in the hive's RID index, and then passes the raw binary V value data to a
     specialized parser (v_value.py). The user/rid key is located within "SAM/Domains/Account/Users"
 
     Args:
@@ -15,6 +17,8 @@ def method_get_user_v_value_data_with_rid(cwd, partition_id, rid):
             the SAM hive.
         rid (int or str): The Relative ID of the target user whose V value
             is to be parsed.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
 
     Returns:
         dict: A dictionary containing the status of the operation. On success,
@@ -22,36 +26,21 @@ def method_get_user_v_value_data_with_rid(cwd, partition_id, rid):
               under the 'v_val' key. On failure, it returns a dictionary
               with a "failed" status and an error message.
     """
-    print("rid")
-    print(rid)
     try:
-        registry_file = cwd + "\\uploads\\partitions\\" + str(partition_id) + "\\extracted_SAM"
-        with open(registry_file, "rb") as f:
-            registry = Registry.Registry(f)
-            run_key = registry.open("SAM\\Domains\\Account\\Users")
-            flag = 0
-            v_val = {}
-            for value in run_key.subkeys():
-                if flag == 1:
-                    break
-                if value.name() != "Names":
-                    if int(value.name(), 16) == int(rid):
-                        print(f"Key Name: {value.name()}")
-                        for unit_type_1 in value.values():
-                            if unit_type_1.name() == "V":
-                                print(f"Value Name: {unit_type_1.name()}")
-                                v_val = v_value.method_get_v_value_data(cwd, unit_type_1.raw_data())
-                                print(v_val)
-                                flag = 1
-            return {
-                "v_val": v_val,
-                "status": "passed"
-            }
+        hive = get_sam_hive(cwd, partition_id, evidence_id=evidence_id)
+        v_val = {}
+        raw_v_value = hive.get_user_value(rid, "V")
+        if raw_v_value is not None:
+            v_val = v_value.method_get_v_value_data(cwd, raw_v_value)
+        return {
+            "v_val": v_val,
+            "status": "passed"
+        }
 
     except FileNotFoundError:
-        print(f"Error: The file '{registry_file}' was not found.")
+        print(f"Error: The SAM hive of partition {partition_id} was not found.")
         return {"status": "failed", "message": "SAM file not found."}
-    except Registry.RegistryParse.ParseException as e:
+    except (HiveParseError, RegistryKeyNotFound) as e:
         print(f"Error parsing the registry file: {e}")
         return {"status": "failed", "message": f"Registry Parse Error: {e}"}
 
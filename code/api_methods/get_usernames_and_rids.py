@@ -1,21 +1,24 @@
-from Registry import Registry
+from .hive_reader import HiveParseError, RegistryKeyNotFound
 import os
 
-def method_get_usernames_and_rids(partition_id: int, cwd: str):
+from .sam_hive_cache import get_sam_hive
+
+def method_get_usernames_and_rids(partition_id: int, cwd: str, evidence_id: str = None):
     partition_id = int(partition_id)
     """Parses the SAM hive to extract a list of local user accounts and their RIDs.
 
-    This function locates the extracted SAM hive for a given partition, opens it,
-    and navigates to the key containing user account names. It iterates through
-    each user subkey to extract the username and its corresponding Relative ID (RID),
-    compiling them into a list of dictionaries.
+    This function takes the parsed SAM hive for a given partition from the hive
+    cache and returns its prebuilt index of usernames and their corresponding
+    Relative IDs (RID) as a list of dictionaries.
     The user keys are located within "SAM/Domains/Account/Users/Names"
 
     Args:
-        partition_id (int or str): The identifier for the partition from which
-            the SAM hive was extracted.
+        partition_id (int or str): The identifier for the partition containing
+            the SAM hive.
         cwd (str): The current working directory of the main application, used to
-            construct the path to the hive file.
+            locate the evidence image.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
 
     Returns:
         list: A list of dictionaries, where each dictionary represents a user
@@ -23,46 +26,40 @@ def method_get_usernames_and_rids(partition_id: int, cwd: str):
               None if the SAM file cannot be found or parsed.
     """
     try:
-        registry_file = cwd + "\\uploads\\partitions\\" + str(partition_id) + "\\extracted_SAM"
-
-        with open(registry_file, "rb") as f:
-            registry = Registry.Registry(f)
-
-            run_key = registry.open("SAM\\Domains\\Account\\Users\\Names")
-            response_info = []
-
-            for rkey in run_key.subkeys():
-                new_dict = {}
-                # The RID is stored as the 'type' of the default value in the user's subkey
-                rtype = rkey.values()[0].value_type()
-                new_dict["account_name"] = rkey.name()
-                new_dict["account_rid"] = rtype
-                response_info.append(new_dict)
-            return response_info
+        hive = get_sam_hive(cwd, partition_id, evidence_id=evidence_id)
+        return [
+            {"account_name": account_name, "account_rid": account_rid}
+            for account_rid, account_name in hive.names_by_rid.items()
+        ]
 
     except FileNotFoundError:
-        print(f"Error: The file '{registry_file}' was not found.")
+        print(f"Error: The SAM hive of partition {partition_id} was not found.")
         return None
-    except Registry.RegistryParse.ParseException as e:
+    except (HiveParseError, RegistryKeyNotFound) as e:
         print(f"Error parsing the registry file: {e}")
         return None
 
-def get_username_from_rid(partition_id, rid, cwd):
+def get_username_from_rid(partition_id, rid, cwd, evidence_id=None):
     """Retrieves a specific username by looking up its RID.
 
     Args:
         partition_id (int or str): The identifier for the target partition.
         rid (int or str): The Relative ID of the user to find.
         cwd (str): The current working directory of the main application.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
 
     Returns:
         str: The account name corresponding to the given RID, or None if not found.
     """
-    link = method_get_usernames_and_rids(partition_id, cwd)
-    if link:
-        sel = [user for user in link if str(user['account_rid']) == str(rid)]
-        return sel[0]['account_name'] if len(sel) > 0 else None
-    return None
+    try:
+        return get_sam_hive(cwd, partition_id, evidence_id=evidence_id).names_by_rid.get(int(rid))
+    except FileNotFoundError:
+        print(f"Error: The SAM hive of partition {partition_id} was not found.")
+        return None
+    except (HiveParseError, RegistryKeyNotFound) as e:
+        print(f"Error parsing the registry file: {e}")
+        return None
 
 if __name__ == '__main__':
     # Assumes the script is in 'api_methods', so we go up one level to the project root.
@@ -1,13 +1,11 @@
 import os
-from dfvfs.lib import definitions
-from dfvfs.path import factory as path_spec_factory
-from dfvfs.resolver import resolver
+from .evidence_session import get_evidence_session
 
 def get_ewf_handle(e01_path):
     """Creates a dfvfs file object handle for an E01 evidence file.
 
-    This helper function builds the necessary dfvfs path specification stack
-    to open a file-like object for the raw E01 image container.
+    The handle is owned by the image's shared EvidenceSession, so repeated
+    calls reuse the already opened EWF file object.
 
     Args:
         e01_path (str): The path to the .E01 file.
@@ -16,22 +14,7 @@ def get_ewf_handle(e01_path):
         dfvfs.file_io.file_io.FileIO: A dfvfs file-like object representing
             the E01 image, or raises an exception on failure.
     """
-    # Wrap the actual OS file path first
-    os_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_OS,
-        location=e01_path
-    )
-
-    # Then wrap it in an EWF path spec
-    ewf_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_EWF,
-        parent=os_path_spec
-    )
-
-    # Open EWF file object
-    # Using capitalized Resolver as confirmed by user testing.
-    file_object = resolver.Resolver.OpenFileObject(ewf_path_spec)
-    return file_object
+    return get_evidence_session(e01_path).get_ewf_file_object()
 
 def method_get_volume_information(e01_path: str):
     """Retrieves the total size of an E01 evidence image.
@@ -55,8 +38,9 @@ def method_get_volume_information(e01_path: str):
         ewf_object = get_ewf_handle(e01_path)
 
         # Get image size by seeking to the end of the file-like object
-        ewf_object.seek(0, os.SEEK_END)
-        size = ewf_object.get_offset()
+        with get_evidence_session(e01_path).image_lock:
+            ewf_object.seek(0, os.SEEK_END)
+            size = ewf_object.get_offset()
 
         print(f"[+] E01 image size: {size:,} bytes ({size / (1024 ** 2):.2f} MB)")
         return {
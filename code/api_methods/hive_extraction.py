@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import time
+import traceback
+from pathlib import Path
+
+from .common import bounded_ordered_map, get_e01_path, get_partition_dir
+from .evidence_intake import INTAKE_HASH_ALGORITHMS
+from .evidence_session import get_evidence_session
+from .job_queue import report_job_progress
+from .load_file_from_e01 import HIVE_READ_CHUNK_SIZE
+
+SYSTEM_HIVE_DIR = "/Windows/System32/config"
+SYSTEM_HIVES = ("SAM", "SECURITY", "SYSTEM", "SOFTWARE")
+
+# Profile directories of Vista and later, and of XP.
+PROFILE_ROOTS = ("/Users", "/Documents and Settings")
+
+# Per-profile hives and where they are found below the profile directory;
+# the first existing location wins (Vista and later first, then XP).
+USER_HIVES = (
+    ("NTUSER.DAT", ("NTUSER.DAT",)),
+    ("UsrClass.dat", ("AppData/Local/Microsoft/Windows/UsrClass.dat",
+                      "Local Settings/Application Data/Microsoft/Windows/UsrClass.dat")),
+)
+
+# Number of hives read from the image at the same time. Reads of one
+# partition are serialized by the session, so more workers only help while
+# others hash and write.
+HIVE_EXTRACTION_WORKERS = 4
+
+MANIFEST_NAME = "manifest.json"
+
+
+def get_registry_dir(cwd, partition_id, evidence_id=None):
+    """Returns the directory the registry hives of a partition are extracted to."""
+    return get_partition_dir(cwd, partition_id, evidence_id) / "registry"
+
+
+def _list_directories(session, partition_id, location):
+    with session.partition_lock(partition_id):
+        directory = session.get_file_entry(partition_id, location)
+        if directory is None or not directory.IsDirectory():
+            return []
+        return [entry.name for entry in directory.sub_file_entries
+                if entry.IsDirectory() and entry.name not in (".", "..")]
+
+
+def find_registry_hives(session, partition_id):
+    """Lists the registry hives present in a partition.
+
+    Returns:
+        list: One dict per hive with 'hive', 'profile' (None for system
+              hives), 'location' inside the partition, 'size' and
+              'output_name', the path relative to the registry directory.
+    """
+    candidates = [(hive, None, [f"{SYSTEM_HIVE_DIR}/{hive}"], hive) for hive in SYSTEM_HIVES]
+    for profile_root in PROFILE_ROOTS:
+        for profile in _list_directories(session, partition_id, profile_root):
+            for hive, relative_paths in USER_HIVES:
+                candidates.append((hive, profile, [f"{profile_root}/{profile}/{path}" for path in relative_paths],
+                                   f"users/{profile}/{hive}"))
+
+    hives = []
+    for hive, profile, locations, output_name in candidates:
+        for location in locations:
+            file_entry = session.get_file_entry(partition_id, location)
+            if file_entry is not None and file_entry.IsFile():
+                hives.append({"hive": hive, "profile": profile, "location": location,
+                              "size": file_entry.size, "output_name": output_name})
+                break
+    return hives
+
+
+def _load_manifest(registry_dir):
+    try:
+        with open(registry_dir / MANIFEST_NAME, "r") as manifest_file:
+            return json.load(manifest_file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def get_extracted_hive_path(cwd, partition_id, location, evidence_id=None):
+    """Returns the extracted copy of a hive if the manifest lists it and it is newer than the image.
+
+    Args:
+        location (str): The hive's path inside the partition, e.g.
+            "/Windows/System32/config/SAM"; compared case-insensitively.
+
+    Returns:
+        Path: The copy under the partition's registry directory, or None.
+    """
+    registry_dir = get_registry_dir(cwd, partition_id, evidence_id)
+    for entry in _load_manifest(registry_dir).get("hives", []):
+        if entry["location"].upper() != location.upper():
+            continue
+        output_path = registry_dir / entry["output_name"]
+        try:
+            stat = output_path.stat()
+            image_mtime = Path(get_e01_path(cwd, evidence_id)).stat().st_mtime
+        except OSError:
+            return None
+        if stat.st_size == entry["size"] and stat.st_mtime >= image_mtime:
+            return output_path
+        return None
+    return None
+
+
+def _extract_hive(session, partition_id, hive, output_path, previous_entry, image_mtime):
+    """Copies one hive to output_path while hashing it, unless the previous copy is still current."""
+    if (previous_entry
+            and previous_entry.get("location") == hive["location"]
+            and output_path.exists()
+            and output_path.stat().st_size == hive["size"]
+            and output_path.stat().st_mtime >= image_mtime):
+        return dict(previous_entry, reused=True)
+
+    hashers = {name: hashlib.new(name) for name in INTAKE_HASH_ALGORITHMS}
+    bytes_written = 0
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(f"{output_path.name}.part")
+    with open(tmp_path, "wb") as out_file:
+        for data in session.iter_file_chunks(partition_id, hive["location"], HIVE_READ_CHUNK_SIZE):
+            out_file.write(data)
+            for hasher in hashers.values():
+                hasher.update(data)
+            bytes_written += len(data)
+    os.replace(tmp_path, output_path)
+
+    entry = dict(hive, size=bytes_written, reused=False)
+    entry.update({name: hasher.hexdigest() for name, hasher in hashers.items()})
+    return entry
+
+
+def method_extract_registry_hives(cwd, partition_id, evidence_id=None, max_workers=HIVE_EXTRACTION_WORKERS):
+    """Extracts every registry hive of a partition in one pass and writes a manifest.
+
+    SAM, SECURITY, SYSTEM and SOFTWARE, and the NTUSER.DAT and UsrClass.dat
+    of every profile, are copied to the partition's registry directory
+    through the image's shared evidence session, several at a time. Each
+    hive is hashed while it is written. Copies that are newer than the image
+    and listed in the previous manifest are kept as they are.
+
+    Args:
+        cwd (str): The current working directory of the main application.
+        partition_id (int or str): The identifier of the partition.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
+        max_workers (int): The number of hives extracted at the same time.
+
+    Returns:
+        dict: 'manifest_path' and 'hives', one entry per extracted hive with
+              its source location, 'output_name', size and MD5/SHA-1/SHA-256;
+              hives that could not be read are listed in 'failed'.
+    """
+    try:
+        partition_id = str(partition_id)
+        e01_path = get_e01_path(cwd, evidence_id)
+        if not Path(e01_path).exists():
+            return {"status": "failed", "message": "E01 file not found."}
+        session = get_evidence_session(e01_path)
+        registry_dir = get_registry_dir(cwd, partition_id, evidence_id)
+        image_mtime = Path(e01_path).stat().st_mtime
+
+        hives = find_registry_hives(session, partition_id)
+        previous_entries = {entry["output_name"]: entry for entry in _load_manifest(registry_dir).get("hives", [])}
+        total_bytes = sum(hive["size"] for hive in hives)
+
+        def extract(hive):
+            try:
+                return _extract_hive(session, partition_id, hive, registry_dir / hive["output_name"],
+                                     previous_entries.get(hive["output_name"]), image_mtime)
+            except Exception as e:
+                traceback.print_exc()
+                return dict(hive, error=str(e))
+
+        extracted = []
+        failed = []
+        bytes_done = 0
+        for entry in bounded_ordered_map(extract, hives, max_workers=max_workers):
+            (failed if "error" in entry else extracted).append(entry)
+            bytes_done += entry["size"]
+            report_job_progress(bytes_done, total_bytes, f"Extracted {len(extracted) + len(failed)} of {len(hives)} hives")
+
+        manifest = {
+            "evidence_hash": session.get_evidence_hash(),
+            "partition_id": partition_id,
+            "extracted_at": time.time(),
+            "hives": extracted,
+            "failed": failed,
+        }
+        registry_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = registry_dir / MANIFEST_NAME
+        tmp_path = manifest_path.with_name(f"{MANIFEST_NAME}.tmp")
+        tmp_path.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp_path, manifest_path)
+    except Exception as e:
+        traceback.print_exc()
+        return {"status": "failed", "message": f"Failed to extract the registry hives: {e}"}
+
+    print(f"[+] Extracted {len(extracted)} registry hives of partition {partition_id} ({len(failed)} failed).")
+    return dict(manifest, status="passed", manifest_path=str(manifest_path))
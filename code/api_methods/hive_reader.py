@@ -0,0 +1,288 @@
+import mmap
+import struct
+from datetime import datetime, timedelta, timezone
+
+# Offset of the first hive bin; cell offsets in the hive are relative to it.
+HBIN_START = 0x1000
+
+KEY_COMP_NAME = 0x0020
+VALUE_COMP_NAME = 0x0001
+NO_OFFSET = 0xFFFFFFFF
+
+# Values larger than this are stored in "db" big data cells (hive version 1.4+).
+BIG_DATA_SEGMENT_SIZE = 16344
+
+# Inline data: the high bit of a vk data size means the data is in the offset field.
+DATA_INLINE_FLAG = 0x80000000
+
+REG_SZ = 1
+REG_EXPAND_SZ = 2
+REG_DWORD = 4
+REG_DWORD_BIG_ENDIAN = 5
+REG_MULTI_SZ = 7
+REG_QWORD = 11
+
+# ri index lists point at other index lists; real hives nest them one level.
+MAX_INDEX_DEPTH = 8
+
+
+class HiveParseError(Exception):
+    """The hive is not a regf file or one of its cells is malformed."""
+
+
+class RegistryKeyNotFound(KeyError):
+    """A key does not exist in the hive."""
+
+
+class RegistryValueNotFound(KeyError):
+    """A value does not exist in a key."""
+
+
+def _filetime_to_datetime(filetime):
+    return datetime(1601, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=filetime // 10)
+
+
+def get_lh_hash(name):
+    """Returns the hash an lh list stores for a key name."""
+    name_hash = 0
+    for character in name.upper():
+        name_hash = (name_hash * 37 + ord(character)) & 0xFFFFFFFF
+    return name_hash
+
+
+def _get_lf_hint(name):
+    """Returns the four-byte name hint an lf list stores, or None for names it cannot represent."""
+    try:
+        return name[:4].encode("ascii").ljust(4, b"\0")
+    except UnicodeEncodeError:
+        return None
+
+
+class HiveReader:
+    """Reads keys and values of a regf hive on demand.
+
+    Nothing is parsed up front: a key decodes its fixed fields from its nk
+    cell when they are asked for, values are decoded one at a time and a
+    subkey is found through the hash (lh) or name hint (lf) entries of its
+    parent's index, so only the cells on the path to a value are touched.
+    The hive can be a memory map of a file, which keeps even hives of
+    hundreds of megabytes out of the Python heap, or bytes already in memory.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        if len(self._view) < HBIN_START or bytes(self._view[:4]) != b"regf":
+            raise HiveParseError("Not a registry hive: the regf base block is missing.")
+        self.minor_version, = struct.unpack_from("<I", self._view, 0x18)
+        self.root_cell_offset, = struct.unpack_from("<I", self._view, 0x24)
+
+    @classmethod
+    def open(cls, path):
+        """Memory-maps a hive file read-only and returns its reader."""
+        with open(path, "rb") as hive_file:
+            try:
+                buffer = mmap.mmap(hive_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise HiveParseError(f"{path} is empty.")
+        return cls(buffer)
+
+    def close(self):
+        """Unmaps the hive; keys and values read from it must not be used afterwards."""
+        self._view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def cell(self, offset):
+        """Returns the payload of the cell at a hive offset as a memoryview."""
+        position = HBIN_START + offset
+        if offset == NO_OFFSET or position + 4 > len(self._view):
+            raise HiveParseError(f"Cell offset {offset:#x} is outside the hive.")
+        size, = struct.unpack_from("<i", self._view, position)
+        size = abs(size)
+        if size < 4 or position + size > len(self._view):
+            raise HiveParseError(f"Cell at {offset:#x} has an invalid size of {size}.")
+        return self._view[position + 4:position + size]
+
+    def root(self):
+        return RegistryKey(self, self.root_cell_offset)
+
+    def open_key(self, path):
+        """Returns the key at a backslash-separated path below the root key."""
+        return self.root().find_key(path)
+
+
+class RegistryKey:
+    """A key of a hive, decoded from its nk cell on first use."""
+
+    def __init__(self, hive, offset):
+        self._hive = hive
+        self._offset = offset
+        self._cell = hive.cell(offset)
+        if bytes(self._cell[:2]) != b"nk" or len(self._cell) < 0x4C:
+            raise HiveParseError(f"Cell at {offset:#x} is not a key (nk) cell.")
+
+    def _read(self, fmt, field_offset):
+        return struct.unpack_from(fmt, self._cell, field_offset)[0]
+
+    def name(self):
+        name_length = self._read("<H", 0x48)
+        raw_name = bytes(self._cell[0x4C:0x4C + name_length])
+        if self._read("<H", 0x02) & KEY_COMP_NAME:
+            return raw_name.decode("latin-1")
+        return raw_name.decode("utf-16-le", errors="replace")
+
+    def timestamp(self):
+        return _filetime_to_datetime(self._read("<Q", 0x04))
+
+    def subkeys_number(self):
+        return self._read("<I", 0x14)
+
+    def values_number(self):
+        return self._read("<I", 0x24)
+
+    def _iter_index(self, list_offset, depth=0):
+        """Yields (subkey offset, lf hint or lh hash or None) from an index list and its sublists."""
+        if depth > MAX_INDEX_DEPTH:
+            raise HiveParseError("Subkey index lists are nested too deeply.")
+        index = self._hive.cell(list_offset)
+        signature = bytes(index[:2])
+        count, = struct.unpack_from("<H", index, 2)
+        if 4 + count * (8 if signature in (b"lf", b"lh") else 4) > len(index):
+            raise HiveParseError(f"Subkey index list at {list_offset:#x} is shorter than its {count} entries.")
+        if signature in (b"lf", b"lh"):
+            for entry in range(count):
+                offset, = struct.unpack_from("<I", index, 4 + entry * 8)
+                yield offset, bytes(index[8 + entry * 8:12 + entry * 8])
+        elif signature == b"li":
+            for entry in range(count):
+                yield struct.unpack_from("<I", index, 4 + entry * 4)[0], None
+        elif signature == b"ri":
+            for entry in range(count):
+                sublist_offset, = struct.unpack_from("<I", index, 4 + entry * 4)
+                yield from self._iter_index(sublist_offset, depth + 1)
+        else:
+            raise HiveParseError(f"Unknown subkey index list {signature!r} at {list_offset:#x}.")
+
+    def subkeys(self):
+        """Yields the subkeys one at a time, in the order the hive stores them."""
+        if self.subkeys_number() == 0:
+            return
+        for offset, _ in self._iter_index(self._read("<I", 0x1C)):
+            yield RegistryKey(self._hive, offset)
+
+    def subkey(self, name):
+        """Returns the subkey with a name, compared case-insensitively.
+
+        Only subkeys whose lh hash or lf name hint match are decoded.
+
+        Raises:
+            RegistryKeyNotFound: There is no subkey with that name.
+        """
+        if self.subkeys_number():
+            name_hash = get_lh_hash(name)
+            name_hint = _get_lf_hint(name)
+            upper_name = name.upper()
+            for offset, hint in self._iter_index(self._read("<I", 0x1C)):
+                if hint is not None and name_hint is not None:
+                    if int.from_bytes(hint, "little") != name_hash and hint.upper() != name_hint.upper():
+                        continue
+                subkey = RegistryKey(self._hive, offset)
+                if subkey.name().upper() == upper_name:
+                    return subkey
+        raise RegistryKeyNotFound(name)
+
+    def find_key(self, path):
+        """Returns the key at a backslash-separated path below this key."""
+        key = self
+        for name in filter(None, path.split("\\")):
+            key = key.subkey(name)
+        return key
+
+    def values(self):
+        """Yields the values one at a time."""
+        count = self.values_number()
+        if count == 0:
+            return
+        value_list = self._hive.cell(self._read("<I", 0x28))
+        if count * 4 > len(value_list):
+            raise HiveParseError(f"The value list of key {self.name()!r} is shorter than its {count} entries.")
+        for entry in range(count):
+            yield RegistryValue(self._hive, struct.unpack_from("<I", value_list, entry * 4)[0])
+
+    def value(self, name):
+        """Returns the value with a name, compared case-insensitively; "" is the default value.
+
+        Raises:
+            RegistryValueNotFound: The key has no value with that name.
+        """
+        upper_name = name.upper()
+        for value in self.values():
+            if value.name().upper() == upper_name:
+                return value
+        raise RegistryValueNotFound(name)
+
+
+class RegistryValue:
+    """A value of a key, decoded from its vk cell; the data is only read when asked for."""
+
+    def __init__(self, hive, offset):
+        self._hive = hive
+        self._cell = hive.cell(offset)
+        if bytes(self._cell[:2]) != b"vk" or len(self._cell) < 0x14:
+            raise HiveParseError(f"Cell at {offset:#x} is not a value (vk) cell.")
+
+    def name(self):
+        name_length, = struct.unpack_from("<H", self._cell, 0x02)
+        raw_name = bytes(self._cell[0x14:0x14 + name_length])
+        if struct.unpack_from("<H", self._cell, 0x10)[0] & VALUE_COMP_NAME:
+            return raw_name.decode("latin-1")
+        return raw_name.decode("utf-16-le", errors="replace")
+
+    def value_type(self):
+        return struct.unpack_from("<I", self._cell, 0x0C)[0]
+
+    def raw_data(self):
+        data_size, data_offset = struct.unpack_from("<II", self._cell, 0x04)
+        if data_size & DATA_INLINE_FLAG:
+            return bytes(self._cell[0x08:0x08 + min(data_size & ~DATA_INLINE_FLAG, 4)])
+        if data_size == 0:
+            return b""
+
+        data = self._hive.cell(data_offset)
+        if data_size > BIG_DATA_SEGMENT_SIZE and self._hive.minor_version >= 4 and bytes(data[:2]) == b"db":
+            segment_count, segment_list_offset = struct.unpack_from("<HI", data, 2)
+            segment_list = self._hive.cell(segment_list_offset)
+            parts = []
+            remaining = data_size
+            for segment in range(segment_count):
+                segment_offset, = struct.unpack_from("<I", segment_list, segment * 4)
+                part = self._hive.cell(segment_offset)[:min(remaining, BIG_DATA_SEGMENT_SIZE)]
+                parts.append(bytes(part))
+                remaining -= len(part)
+            return b"".join(parts)
+        if data_size > len(data):
+            raise HiveParseError(f"Value data at {data_offset:#x} is shorter than its size of {data_size}.")
+        return bytes(data[:data_size])
+
+    def value(self):
+        """Returns the data decoded by type: str, list of str, int or, for other types, bytes."""
+        data = self.raw_data()
+        value_type = self.value_type()
+        if value_type in (REG_SZ, REG_EXPAND_SZ):
+            return data.decode("utf-16-le", errors="replace").split("\0", 1)[0]
+        if value_type == REG_MULTI_SZ:
+            return [item for item in data.decode("utf-16-le", errors="replace").split("\0") if item]
+        if value_type == REG_DWORD and len(data) >= 4:
+            return struct.unpack_from("<I", data)[0]
+        if value_type == REG_DWORD_BIG_ENDIAN and len(data) >= 4:
+            return struct.unpack_from(">I", data)[0]
+        if value_type == REG_QWORD and len(data) >= 8:
+            return struct.unpack_from("<Q", data)[0]
+        return data
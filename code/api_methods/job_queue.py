@@ -0,0 +1,175 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import get_jobs_dir
+
+# Number of jobs run at the same time; further jobs wait in the queue.
+JOB_WORKERS = 2
+
+JOB_STATES = ("queued", "running", "succeeded", "failed")
+
+# Finished jobs kept in the job table, with their results; older ones are dropped.
+MAX_FINISHED_JOBS = 200
+
+# A context variable rather than a thread-local, so workers started with a
+# copy of the job's context (see run_in_context) report to the same job.
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def report_job_progress(done, total=None, message=None):
+    """Records the progress of the job running on the calling thread.
+
+    Functions that may run as a job call this from their main loop; outside a
+    job it does nothing, so the same code can serve synchronous requests.
+    Pool workers only see the job if they were submitted through
+    run_in_context.
+    """
+    job = _current_job.get()
+    if job is not None:
+        job[0].update_progress(job[1], done, total, message)
+
+
+def is_running_as_job():
+    """Returns True when called from a job, or from a worker started through run_in_context."""
+    return _current_job.get() is not None
+
+
+def run_in_context(executor, func, *args):
+    """Submits func(*args) to an executor in a copy of the caller's context.
+
+    Keeps the calling job visible to report_job_progress in the worker. Each
+    task needs its own copy, since a context cannot run on two threads at once.
+    """
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+
+class JobQueue:
+    """Runs long triage operations on a bounded thread pool.
+
+    Each job gets an ID that can be polled for its status and progress, and
+    its result is written to <state_dir>/<job ID>.json once it finishes. The
+    job table is persisted to <state_dir>/state.json, so finished jobs and
+    their results survive a restart; jobs that were queued or running when the
+    server stopped are reported as failed.
+    """
+
+    def __init__(self, state_dir, max_workers=JOB_WORKERS):
+        self.state_dir = state_dir
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = self._load_state()
+
+    def _load_state(self):
+        try:
+            jobs = json.loads((self.state_dir / "state.json").read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+        for job in jobs.values():
+            if job["status"] in ("queued", "running"):
+                job["status"] = "failed"
+                job["error"] = "The server stopped before the job finished."
+        self._prune_finished_jobs(jobs)
+        return jobs
+
+    def _prune_finished_jobs(self, jobs):
+        """Drops the oldest finished jobs and their results beyond MAX_FINISHED_JOBS."""
+        finished = sorted((job for job in jobs.values() if job["status"] in ("succeeded", "failed")),
+                          key=lambda job: job["finished_at"] or job["submitted_at"])
+        for job in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del jobs[job["job_id"]]
+            (self.state_dir / f"{job['job_id']}.json").unlink(missing_ok=True)
+
+    def _save_state(self):
+        # Callers hold self._lock. Write and rename so a crash never leaves a truncated file.
+        state_path = self.state_dir / "state.json"
+        temp_path = state_path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(self._jobs))
+        os.replace(temp_path, state_path)
+
+    def submit(self, kind, func, *args, **kwargs):
+        """Queues func(*args, **kwargs) and returns the new job's ID.
+
+        func must return a JSON-serializable result. A dictionary result with
+        status "failed" marks the job as failed, like an exception does.
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "progress": {"done": 0, "total": None, "message": None},
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+            }
+            self._save_state()
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        self._set_fields(job_id, status="running", started_at=time.time())
+        token = _current_job.set((self, job_id))
+        try:
+            result = func(*args, **kwargs)
+            (self.state_dir / f"{job_id}.json").write_text(json.dumps(result, default=str))
+            failed = isinstance(result, dict) and result.get("status") == "failed"
+            self._set_fields(job_id, status="failed" if failed else "succeeded", finished_at=time.time(),
+                             error=result.get("message") if failed else None)
+        except Exception as e:
+            traceback.print_exc()
+            self._set_fields(job_id, status="failed", finished_at=time.time(), error=str(e))
+        finally:
+            _current_job.reset(token)
+
+    def _set_fields(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+            if fields.get("status") in ("succeeded", "failed"):
+                self._prune_finished_jobs(self._jobs)
+            self._save_state()
+
+    def update_progress(self, job_id, done, total=None, message=None):
+        """Updates a job's progress. Progress is kept in memory and saved with the next state change."""
+        with self._lock:
+            self._jobs[job_id]["progress"] = {"done": done, "total": total, "message": message}
+
+    def get_job(self, job_id):
+        """Returns a copy of a job's record, or None if the job is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def list_jobs(self):
+        """Returns copies of every job's record, most recently submitted first."""
+        with self._lock:
+            jobs = json.loads(json.dumps(list(self._jobs.values())))
+        return sorted(jobs, key=lambda job: job["submitted_at"], reverse=True)
+
+    def get_result(self, job_id):
+        """Returns the result of a finished job, or None if it has not produced one."""
+        try:
+            return json.loads((self.state_dir / f"{job_id}.json").read_text())
+        except FileNotFoundError:
+            return None
+
+
+_job_queues = {}
+_job_queues_lock = threading.Lock()
+
+
+def get_job_queue(cwd):
+    """Returns the job queue of the application in cwd, creating it on first use."""
+    jobs_dir = get_jobs_dir(cwd)
+    with _job_queues_lock:
+        if str(jobs_dir) not in _job_queues:
+            _job_queues[str(jobs_dir)] = JobQueue(jobs_dir)
+        return _job_queues[str(jobs_dir)]
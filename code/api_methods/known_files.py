@@ -0,0 +1,374 @@
+import csv
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+from .common import (
+    bounded_ordered_map, bump_derived_data_generation, get_config_value, get_e01_path, get_file_hash_db_path
+)
+from .evidence_session import get_evidence_session
+from .job_queue import report_job_progress
+
+# config.json key naming the known-good hash set: a text file with one hash
+# (or one NSRL-style CSV row) per line, or a SQLite database such as the NSRL RDS.
+KNOWN_HASH_SET_CONFIG_KEY = "known_hash_set_path"
+
+# Hex digest length -> algorithm name, as found in hash sets.
+HASH_ALGORITHMS_BY_LENGTH = {32: "md5", 40: "sha1", 64: "sha256"}
+
+# Number of files hashed at the same time.
+HASH_WORKERS = 4
+HASH_READ_CHUNK_SIZE = 1024 * 1024
+
+_HEX_DIGEST_PATTERN = re.compile(r"^[0-9a-fA-F]+$")
+
+FILE_HASH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_hashes (
+    evidence_hash TEXT NOT NULL,
+    partition_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER,
+    md5 TEXT,
+    sha1 TEXT,
+    sha256 TEXT,
+    PRIMARY KEY (evidence_hash, partition_id, path)
+);
+CREATE TABLE IF NOT EXISTS hashed_partitions (
+    evidence_hash TEXT NOT NULL,
+    partition_id TEXT NOT NULL,
+    file_count INTEGER NOT NULL,
+    hashed_at REAL NOT NULL,
+    PRIMARY KEY (evidence_hash, partition_id)
+);
+"""
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter over hash digests.
+
+    The digests are already uniformly distributed, so the bit positions are
+    derived from the digest bytes with double hashing instead of hashing again.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.bit_count = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+
+    def _positions(self, digest):
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:16], "little") | 1
+        return [(first + i * second) % self.bit_count for i in range(self.hash_count)]
+
+    def add(self, digest):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class SortedDigestSet:
+    """An exact set of fixed-width digests kept as one sorted bytes object.
+
+    A Python set of bytes costs around 80 bytes per entry; this costs the
+    digest width, and a lookup is a binary search.
+    """
+
+    def __init__(self, digests, width):
+        self.width = width
+        unique = []
+        for digest in sorted(digests):
+            if not unique or unique[-1] != digest:
+                unique.append(digest)
+        self.count = len(unique)
+        self.data = b"".join(unique)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, digest):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            item = self.data[middle * self.width:(middle + 1) * self.width]
+            if item < digest:
+                low = middle + 1
+            elif item > digest:
+                high = middle
+            else:
+                return True
+        return False
+
+
+class KnownHashSet:
+    """Known-good digests per algorithm, each held in a Bloom filter and an exact store.
+
+    Most files are not known, and the Bloom filter rejects them without a
+    search; only its hits are confirmed against the exact store.
+    """
+
+    def __init__(self, digests_by_algorithm):
+        self.filters = {}
+        for algorithm, digests in digests_by_algorithm.items():
+            if not digests:
+                continue
+            width = len(digests[0])
+            bloom_filter = BloomFilter(len(digests))
+            for digest in digests:
+                bloom_filter.add(digest)
+            self.filters[algorithm] = (bloom_filter, SortedDigestSet(digests, width))
+
+    @property
+    def algorithms(self):
+        return tuple(self.filters)
+
+    def __len__(self):
+        return sum(len(exact) for _, exact in self.filters.values())
+
+    def contains(self, hashes):
+        """Returns True if any of the hex digests in hashes (algorithm -> digest) is known."""
+        for algorithm, (bloom_filter, exact) in self.filters.items():
+            hex_digest = hashes.get(algorithm)
+            if not hex_digest:
+                continue
+            digest = bytes.fromhex(hex_digest)
+            if digest in bloom_filter and digest in exact:
+                return True
+        return False
+
+
+def _add_hex_digest(digests_by_algorithm, value):
+    value = value.strip().strip('"')
+    algorithm = HASH_ALGORITHMS_BY_LENGTH.get(len(value))
+    if algorithm and _HEX_DIGEST_PATTERN.match(value):
+        digests_by_algorithm[algorithm].append(bytes.fromhex(value))
+
+
+def read_text_hash_set(path):
+    """Reads the digests of a text hash set, one hash or NSRL-style CSV row per line."""
+    digests_by_algorithm = {algorithm: [] for algorithm in HASH_ALGORITHMS_BY_LENGTH.values()}
+    with open(path, "r", newline="", errors="ignore") as hash_file:
+        for row in csv.reader(hash_file):
+            for value in row:
+                _add_hex_digest(digests_by_algorithm, value)
+    return digests_by_algorithm
+
+
+def read_sqlite_hash_set(path):
+    """Reads the digests of every md5, sha1 or sha256 column of a SQLite hash set such as the NSRL RDS."""
+    digests_by_algorithm = {algorithm: [] for algorithm in HASH_ALGORITHMS_BY_LENGTH.values()}
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as connection:
+        tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            columns = [row[1] for row in connection.execute(f'PRAGMA table_info("{table}")')]
+            for column in columns:
+                if column.lower() not in digests_by_algorithm:
+                    continue
+                for (value,) in connection.execute(f'SELECT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL'):
+                    _add_hex_digest(digests_by_algorithm, str(value))
+    return digests_by_algorithm
+
+
+def load_hash_set(path):
+    """Loads a text or SQLite hash set file into a KnownHashSet."""
+    with open(path, "rb") as hash_file:
+        is_sqlite = hash_file.read(16) == b"SQLite format 3\x00"
+    digests_by_algorithm = read_sqlite_hash_set(path) if is_sqlite else read_text_hash_set(path)
+    return KnownHashSet(digests_by_algorithm)
+
+
+_hash_set_cache = {}
+_hash_set_cache_lock = threading.Lock()
+
+
+def get_known_hash_set(cwd):
+    """Returns the configured known-good hash set, or None if none is configured.
+
+    The set is loaded once and reloaded when the hash set file changes.
+    """
+    return _get_known_hash_set_with_version(cwd)[1]
+
+
+def _get_known_hash_set_with_version(cwd):
+    """Returns ((hash set path, modification time), hash set), or (None, None) if none is configured."""
+    configured_path = get_config_value(cwd, KNOWN_HASH_SET_CONFIG_KEY)
+    if not configured_path:
+        return None, None
+    hash_set_path = Path(cwd) / configured_path
+    try:
+        mtime = os.stat(hash_set_path).st_mtime_ns
+    except FileNotFoundError:
+        print(f"[-] Known hash set not found at {hash_set_path}")
+        return None, None
+
+    with _hash_set_cache_lock:
+        cached = _hash_set_cache.get(str(hash_set_path))
+        if not (cached and cached[0] == mtime):
+            print(f"[*] Loading known hash set {hash_set_path}...")
+            hash_set = load_hash_set(hash_set_path)
+            print(f"[+] Loaded {len(hash_set):,} known hashes.")
+            cached = _hash_set_cache[str(hash_set_path)] = (mtime, hash_set)
+        return (str(hash_set_path), cached[0]), cached[1]
+
+
+def connect_file_hash_db(cwd):
+    """Opens the file hash database of the application in cwd, creating its schema on first use."""
+    db_path = get_file_hash_db_path(cwd)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(str(db_path), timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(FILE_HASH_SCHEMA)
+    return connection
+
+
+def hash_file(session, partition_id, path):
+    """Computes the MD5, SHA-1 and SHA-256 of a file in one pass over its content."""
+    hashers = {"md5": hashlib.md5(), "sha1": hashlib.sha1(), "sha256": hashlib.sha256()}
+    size = 0
+    for chunk in session.iter_file_chunks(partition_id, path, HASH_READ_CHUNK_SIZE):
+        size += len(chunk)
+        for hasher in hashers.values():
+            hasher.update(chunk)
+    return {"path": path, "size": size, **{name: hasher.hexdigest() for name, hasher in hashers.items()}}
+
+
+def iter_allocated_file_paths(session, partition_id):
+    """Yields the path of every allocated regular file in a partition."""
+    for file_entry in session.walk_file_entries(partition_id, "/"):
+        if file_entry.IsFile() and file_entry.IsAllocated():
+            yield file_entry.path_spec.location
+
+
+def method_hash_partition_files(cwd, partition_id, max_workers=HASH_WORKERS, evidence_id=None):
+    """Hashes every allocated file of a partition and stores the hashes.
+
+    Files are hashed on a pool of workers while the walk continues, and the
+    hashes are stored in uploads/file_hashes.sqlite3 so known files can be
+    filtered out of later results without hashing them again.
+
+    Args:
+        cwd (str): The current working directory of the main application.
+        partition_id (int or str): The identifier of the partition to hash.
+        max_workers (int): The number of files hashed at the same time.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
+
+    Returns:
+        dict: The status of the operation with the number of files hashed and
+              how many of them are in the known-good hash set.
+    """
+    e01_path = get_e01_path(cwd, evidence_id)
+    if not Path(e01_path).exists():
+        return {"status": "failed", "message": "E01 file not found."}
+    session = get_evidence_session(e01_path)
+    evidence_hash = session.get_evidence_hash()
+    hash_set = get_known_hash_set(cwd)
+
+    def hash_or_skip(path):
+        try:
+            return hash_file(session, partition_id, path)
+        except Exception as e:
+            print(f"[-] Could not hash {path}: {e}")
+            return None
+
+    files_hashed = 0
+    known_files = 0
+    batch = []
+    with closing(connect_file_hash_db(cwd)) as connection:
+        with connection:
+            # Files deleted from the image since the last run must not keep their old hashes.
+            connection.execute("DELETE FROM hashed_partitions WHERE evidence_hash = ? AND partition_id = ?",
+                               (evidence_hash, str(partition_id)))
+            connection.execute("DELETE FROM file_hashes WHERE evidence_hash = ? AND partition_id = ?",
+                               (evidence_hash, str(partition_id)))
+        for file_hashes in bounded_ordered_map(hash_or_skip, iter_allocated_file_paths(session, partition_id),
+                                               max_workers=max_workers):
+            if file_hashes is None:
+                continue
+            files_hashed += 1
+            if hash_set is not None and hash_set.contains(file_hashes):
+                known_files += 1
+            batch.append((evidence_hash, str(partition_id), file_hashes["path"], file_hashes["size"],
+                          file_hashes["md5"], file_hashes["sha1"], file_hashes["sha256"]))
+            if len(batch) >= 1000:
+                _store_file_hashes(connection, batch)
+                batch = []
+                report_job_progress(files_hashed, None, f"Hashed {files_hashed:,} files")
+        _store_file_hashes(connection, batch)
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO hashed_partitions (evidence_hash, partition_id, file_count, hashed_at) "
+                "VALUES (?, ?, ?, ?)", (evidence_hash, str(partition_id), files_hashed, time.time()))
+
+    with _known_paths_cache_lock:
+        _known_paths_cache.clear()
+    bump_derived_data_generation()
+    return {
+        "status": "passed",
+        "files_hashed": files_hashed,
+        "known_files": known_files,
+        "hash_set_loaded": hash_set is not None,
+    }
+
+
+def _store_file_hashes(connection, rows):
+    with connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO file_hashes (evidence_hash, partition_id, path, size, md5, sha1, sha256) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+_known_paths_cache = {}
+_known_paths_cache_lock = threading.Lock()
+
+
+def clear_caches():
+    """Forgets the loaded hash sets and the cached known file paths."""
+    with _hash_set_cache_lock:
+        _hash_set_cache.clear()
+    with _known_paths_cache_lock:
+        _known_paths_cache.clear()
+
+
+def get_known_file_paths(cwd, partition_id, evidence_id=None):
+    """Returns the paths of a partition's files that are in the known-good hash set.
+
+    The set is empty until the partition has been hashed or when no hash set
+    is configured, so callers can always filter with it. Results are cached
+    per image, partition and hash set file version, so they are recomputed
+    when the hash set file is replaced or modified.
+    """
+    hash_set_version, hash_set = _get_known_hash_set_with_version(cwd)
+    e01_path = get_e01_path(cwd, evidence_id)
+    if hash_set is None or not Path(e01_path).exists():
+        return frozenset()
+    evidence_hash = get_evidence_session(e01_path).get_evidence_hash()
+    cache_key = (evidence_hash, str(partition_id), hash_set_version)
+
+    with _known_paths_cache_lock:
+        if cache_key in _known_paths_cache:
+            return _known_paths_cache[cache_key]
+
+    known_paths = set()
+    if get_file_hash_db_path(cwd).exists():
+        with closing(connect_file_hash_db(cwd)) as connection:
+            rows = connection.execute(
+                "SELECT path, md5, sha1, sha256 FROM file_hashes WHERE evidence_hash = ? AND partition_id = ?",
+                (evidence_hash, str(partition_id)))
+            for row in rows:
+                if hash_set.contains(dict(row)):
+                    known_paths.add(row["path"])
+
+    known_paths = frozenset(known_paths)
+    with _known_paths_cache_lock:
+        _known_paths_cache[cache_key] = known_paths
+    return known_paths
@@ -3,53 +3,66 @@ import sys
 import traceback
 from pathlib import Path
 
-from dfvfs.lib import definitions
-from dfvfs.path import factory as path_spec_factory
-from dfvfs.resolver import resolver
-def get_sam_path_spec(e01_path, partition_id, filepath):
-    os_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_OS, location=e01_path)
+from .common import get_e01_path, get_extracted_file_path
+from .evidence_session import get_evidence_session
 
-    ewf_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_EWF, parent=os_path_spec)
+# Hives are read from the image in 1 MiB chunks instead of many small reads.
+HIVE_READ_CHUNK_SIZE = 1024 * 1024
 
-    partition_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_TSK_PARTITION,
-        location=f"/p{partition_id}",
-        parent=ewf_path_spec)
 
-    fs_path_spec = path_spec_factory.Factory.NewPathSpec(
-        definitions.TYPE_INDICATOR_TSK,
-        location=filepath,
-        parent=partition_path_spec)
+def read_file_contents(session, partition_id, filepath, chunk_size=HIVE_READ_CHUNK_SIZE):
+    """Reads a whole file from the image using large buffered reads."""
+    data = bytearray()
+    for chunk in session.iter_file_chunks(partition_id, filepath, chunk_size):
+        data += chunk
+    return bytes(data)
 
-    return fs_path_spec
 
+def method_load_hive(cwd, partition_id, filepath="/Windows/System32/config/SAM", write_to_disk=False,
+                     evidence_id=None):
+    """Reads a registry hive straight from the E01 image into memory.
 
-def read_file_contents(path_spec):
-    print("point 1")
-    print(path_spec)
-    file_object = resolver.Resolver.OpenFileObject(path_spec)
-    print("point 2")
-    print(file_object)
-    data = file_object.read()
-    print("[*] First bytes:", data[:64])
-    return data
+    The returned bytes can be handed to the registry parser directly, so no
+    copy has to be written to and re-read from uploads/partitions. A disk copy
+    is only written when requested, and is kept until the image changes.
 
+    Args:
+        cwd (str): The current working directory of the main application.
+        partition_id (int or str): The partition containing the hive.
+        filepath (str): The hive's path inside the partition.
+        write_to_disk (bool): Also store the hive under the partition's
+            extraction directory.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
 
+    Returns:
+        bytes: The raw content of the hive file.
 
-def method_load_file_from_e01(cwd, partition_id, filepath="/Windows/System32/config/SAM"):
+    Raises:
+        FileNotFoundError: The image or the hive inside it does not exist.
+    """
+    e01_path = get_e01_path(cwd, evidence_id)
+    if not Path(e01_path).exists():
+        raise FileNotFoundError(e01_path)
+    session = get_evidence_session(e01_path)
+    file_data = read_file_contents(session, partition_id, filepath)
 
+    if write_to_disk:
+        output_path = get_extracted_file_path(cwd, partition_id, filepath, evidence_id)
+        if not (output_path.exists()
+                and output_path.stat().st_size == len(file_data)
+                and output_path.stat().st_mtime >= Path(e01_path).stat().st_mtime):
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            output_path.write_bytes(file_data)
+
+    return file_data
+
+
+def method_load_file_from_e01(cwd, partition_id, filepath="/Windows/System32/config/SAM", evidence_id=None):
 
-    try:
-        partition_id = str(partition_id)
-        e01_path = cwd + "\\uploads\\upload.E01"
-        fs_path_spec = get_sam_path_spec(e01_path, partition_id, filepath)
 
-        file_data = read_file_contents(fs_path_spec)
-        return io.BytesIO(file_data)
+    try:
+        return io.BytesIO(method_load_hive(cwd, partition_id, filepath, evidence_id=evidence_id))
     except:
         traceback.print_exc()
         raise Exception("Unexpected error:", sys.exc_info()[0])
-
-
@@ -0,0 +1,156 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the histogram buckets; wide enough for both a
+# cached registry lookup and a Gemini round trip.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    metric_type = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}"
+                for key, value in values]
+
+
+class Histogram:
+    """Observations counted into cumulative buckets per label combination."""
+
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        bucket_index = bisect_left(self.buckets, value)
+        with self._lock:
+            bucket_counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            bucket_counts[bucket_index] += 1
+            self._values[key] = (bucket_counts, total + value)
+
+    def collect(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (bucket_counts, total) in values:
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, [("le", _format_number(upper_bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+resolver_opens = Counter(
+    "triage_resolver_opens_total",
+    "dfvfs handles opened on evidence images.",
+    ("kind",))
+image_bytes_read = Counter(
+    "triage_image_bytes_read_total",
+    "Bytes read from evidence images, per layer.",
+    ("layer",))
+hive_parse_seconds = Histogram(
+    "triage_hive_parse_seconds",
+    "Time to load a registry hive from the image and parse it.",
+    ("hive",))
+email_parse_seconds = Histogram(
+    "triage_email_parse_seconds",
+    "Time to parse one .eml file.")
+llm_request_seconds = Histogram(
+    "triage_llm_request_seconds",
+    "Round-trip time of requests to the language model.",
+    ("operation",))
+http_request_seconds = Histogram(
+    "triage_http_request_seconds",
+    "Latency of HTTP requests, per route.",
+    ("method", "route", "status"))
+
+ALL_METRICS = (resolver_opens, image_bytes_read, hive_parse_seconds, email_parse_seconds, llm_request_seconds,
+               http_request_seconds)
+
+
+def render_prometheus_text(metrics=ALL_METRICS):
+    """Returns the metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+_request_timings = threading.local()
+
+
+def start_request_timings():
+    """Starts collecting the stage durations of the current request on this thread."""
+    _request_timings.stages = {}
+
+
+def finish_request_timings():
+    """Stops collecting and returns {stage name: total seconds} for the current request."""
+    stages = getattr(_request_timings, "stages", None)
+    _request_timings.stages = None
+    return stages or {}
+
+
+@contextmanager
+def timed(histogram, stage=None, **labels):
+    """Observes the duration of the block in a histogram.
+
+    The duration is also added to the current request's stage timings under
+    stage (the histogram name by default) when the block runs on the thread
+    handling the request.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, **labels)
+        stages = getattr(_request_timings, "stages", None)
+        if stages is not None:
+            stage = stage or histogram.name
+            stages[stage] = stages.get(stage, 0.0) + elapsed
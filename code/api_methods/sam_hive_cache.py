@@ -0,0 +1,135 @@
+import os
+import threading
+from collections import OrderedDict
+
+from .common import get_e01_path
+from .hive_extraction import get_extracted_hive_path
+from .hive_reader import HiveReader, RegistryKeyNotFound, RegistryValueNotFound
+from .load_file_from_e01 import method_load_hive
+from .metrics import hive_parse_seconds, timed
+
+SAM_HIVE_PATH = "/Windows/System32/config/SAM"
+SAM_USERS_KEY = "SAM\\Domains\\Account\\Users"
+SAM_NAMES_KEY = "SAM\\Domains\\Account\\Users\\Names"
+
+# Number of opened hives kept; one per recently viewed partition.
+MAX_CACHED_HIVES = 8
+
+
+class SamHive:
+    """A SAM hive whose user keys are looked up by RID on demand.
+
+    The user keys under SAM/Domains/Account/Users are named after the RID in
+    eight hex digits, so one account's key is found through the hash index of
+    Users without reading any other account. The subkeys of Users/Names carry
+    the RID as the type of their default value; that mapping, and the list of
+    every RID, are only built when first asked for.
+    """
+
+    def __init__(self, hive):
+        self.hive = hive
+        self.users_key = hive.open_key(SAM_USERS_KEY)
+        self._users_by_rid = None
+        self._names_by_rid = None
+        self._lock = threading.Lock()
+
+    @property
+    def users_by_rid(self):
+        """{RID: user key} of every account."""
+        with self._lock:
+            if self._users_by_rid is None:
+                users_by_rid = {}
+                for user_key in self.users_key.subkeys():
+                    try:
+                        users_by_rid[int(user_key.name(), 16)] = user_key
+                    except ValueError:
+                        continue
+                self._users_by_rid = users_by_rid
+            return self._users_by_rid
+
+    @property
+    def names_by_rid(self):
+        """{RID: username} of every account."""
+        with self._lock:
+            if self._names_by_rid is None:
+                names_by_rid = {}
+                for name_key in self.hive.open_key(SAM_NAMES_KEY).subkeys():
+                    # The RID is stored as the 'type' of the default value in the user's subkey
+                    default_value = next(name_key.values(), None)
+                    if default_value is not None:
+                        names_by_rid[default_value.value_type()] = name_key.name()
+                self._names_by_rid = names_by_rid
+            return self._names_by_rid
+
+    def get_user_key(self, rid):
+        """Returns the Users/<RID> key of an account, or None if the RID is unknown."""
+        try:
+            return self.users_key.subkey(f"{int(rid):08X}")
+        except RegistryKeyNotFound:
+            return None
+
+    def get_user_value(self, rid, value_name):
+        """Returns the raw data of a value (e.g. "F" or "V") of an account, or None."""
+        user_key = self.get_user_key(rid)
+        if user_key is None:
+            return None
+        return read_user_value(user_key, value_name)
+
+
+def read_user_value(user_key, value_name):
+    """Returns the raw data of a value of a user key, e.g. one from SamHive.users_by_rid, or None."""
+    try:
+        return user_key.value(value_name).raw_data()
+    except RegistryValueNotFound:
+        return None
+
+
+_hive_cache = OrderedDict()
+_hive_cache_lock = threading.Lock()
+
+
+def clear_caches():
+    """Forgets every opened hive."""
+    with _hive_cache_lock:
+        _hive_cache.clear()
+
+
+def get_sam_hive(cwd, partition_id, hive_path=SAM_HIVE_PATH, evidence_id=None):
+    """Returns the SAM hive of a partition, reusing an already opened one.
+
+    A copy written by method_extract_registry_hives is memory-mapped when it
+    is current; otherwise the hive bytes are read straight from the evidence
+    image, and nothing is written to uploads/partitions. Either way keys and
+    values are only decoded when they are looked up. Cache entries are keyed
+    by image path, partition and hive path, and invalidated when the image's
+    modification time changes, e.g. after a new upload. The least recently
+    used hive is evicted once MAX_CACHED_HIVES is exceeded.
+
+    Raises:
+        FileNotFoundError: The image or the SAM hive inside it does not exist.
+        HiveParseError: The hive is malformed.
+        RegistryKeyNotFound: The hive has no SAM/Domains/Account/Users key.
+    """
+    e01_path = get_e01_path(cwd, evidence_id)
+    cache_key = (e01_path, str(partition_id), hive_path)
+    mtime = os.stat(e01_path).st_mtime_ns
+
+    with _hive_cache_lock:
+        cached = _hive_cache.get(cache_key)
+        if cached and cached[0] == mtime:
+            _hive_cache.move_to_end(cache_key)
+            return cached[1]
+
+    with timed(hive_parse_seconds, stage="hive_parse", hive=hive_path):
+        extracted_path = get_extracted_hive_path(cwd, partition_id, hive_path, evidence_id)
+        if extracted_path:
+            hive = SamHive(HiveReader.open(extracted_path))
+        else:
+            hive = SamHive(HiveReader(method_load_hive(cwd, partition_id, hive_path, evidence_id=evidence_id)))
+
+    with _hive_cache_lock:
+        _hive_cache[cache_key] = (mtime, hive)
+        _hive_cache.move_to_end(cache_key)
+        while len(_hive_cache) > MAX_CACHED_HIVES:
+            _hive_cache.popitem(last=False)
+    return hive
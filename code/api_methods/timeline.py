@@ -0,0 +1,211 @@
+import json
+import stat
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .common import get_e01_path, get_partition_dir
+from .evidence_session import get_evidence_session
+from .job_queue import report_job_progress, run_in_context
+from .known_files import get_known_file_paths
+
+# Timeline lines are sent and written in blocks of about this many bytes.
+TIMELINE_CHUNK_SIZE = 256 * 1024
+
+# Number of partitions whose timelines are exported at the same time.
+TIMELINE_WORKERS = 4
+
+MACB_ATTRIBUTES = (
+    ("mtime", "modification_time"),
+    ("atime", "access_time"),
+    ("ctime", "change_time"),
+    ("crtime", "creation_time"),
+)
+
+
+def _get_timestamps(file_entry):
+    """Returns the MACB timestamps of a file entry as POSIX seconds and ISO 8601 strings."""
+    posix_times = {}
+    iso_times = {}
+    for name, attribute in MACB_ATTRIBUTES:
+        date_time = getattr(file_entry, attribute, None)
+        posix_times[name] = (date_time.CopyToPosixTimestamp() or 0) if date_time else 0
+        iso_times[name] = date_time.CopyToDateTimeStringISO8601() if date_time else None
+    return posix_times, iso_times
+
+
+def _get_mode(file_entry):
+    """Returns the mode bits of a file entry, or None if the file system does not record them."""
+    try:
+        return file_entry.GetStatAttribute().mode
+    except AttributeError:
+        return None
+
+
+def _format_mode(is_directory, mode):
+    """Formats a mode the way TSK's fls does in bodyfiles, e.g. 'r/rrwxr-xr-x'."""
+    type_letter = "d" if is_directory else "r"
+    permissions = stat.filemode(mode)[1:] if mode is not None else "---------"
+    return f"{type_letter}/{type_letter}{permissions}"
+
+
+def iter_timeline_records(session, partition_id):
+    """Yields one record with the MACB timestamps of every file and directory in a partition."""
+    for done, file_entry in enumerate(session.walk_file_entries(partition_id, "/"), 1):
+        posix_times, iso_times = _get_timestamps(file_entry)
+        is_directory = file_entry.IsDirectory()
+        yield {
+            "partition_id": str(partition_id),
+            "path": file_entry.path_spec.location,
+            "inode": getattr(file_entry.path_spec, "inode", None),
+            "type": "directory" if is_directory else "file",
+            "mode": _format_mode(is_directory, _get_mode(file_entry)),
+            "size": file_entry.size or 0,
+            "posix_times": posix_times,
+            "iso_times": iso_times,
+        }
+        if done % 10000 == 0:
+            report_job_progress(done, None, f"Partition {partition_id}: {done:,} entries")
+
+
+def format_bodyfile_line(record):
+    """Formats a timeline record as a bodyfile (TSK 3.x) line, readable by mactime."""
+    times = record["posix_times"]
+    inode = record["inode"] if record["inode"] is not None else 0
+    return (f"0|{record['path']}|{inode}|{record['mode']}|0|0|{record['size']}|"
+            f"{times['atime']}|{times['mtime']}|{times['ctime']}|{times['crtime']}\n")
+
+
+def format_jsonl_line(record):
+    """Formats a timeline record as one JSON object per line with ISO 8601 timestamps."""
+    return json.dumps({
+        "partition_id": record["partition_id"],
+        "path": record["path"],
+        "inode": record["inode"],
+        "type": record["type"],
+        "size": record["size"],
+        **record["iso_times"],
+    }) + "\n"
+
+
+# format name -> (line formatter, file extension, MIME type)
+TIMELINE_FORMATS = {
+    "bodyfile": (format_bodyfile_line, "body", "text/plain"),
+    "jsonl": (format_jsonl_line, "jsonl", "application/x-ndjson"),
+}
+
+
+def iter_timeline_chunks(cwd, partition_id, timeline_format="bodyfile", chunk_size=TIMELINE_CHUNK_SIZE,
+                         exclude_known=True, evidence_id=None):
+    """Yields the timeline of a partition as encoded chunks of whole lines.
+
+    Entries are formatted as they are walked, so memory stays constant however
+    many entries the partition holds. Files in the known-good hash set are left
+    out unless exclude_known is False.
+
+    Raises:
+        ValueError: The format is not one of TIMELINE_FORMATS.
+    """
+    if timeline_format not in TIMELINE_FORMATS:
+        raise ValueError(f"Unknown timeline format: {timeline_format}")
+    format_line = TIMELINE_FORMATS[timeline_format][0]
+    session = get_evidence_session(get_e01_path(cwd, evidence_id))
+    known_paths = get_known_file_paths(cwd, partition_id, evidence_id) if exclude_known else ()
+
+    lines = []
+    buffered = 0
+    for record in iter_timeline_records(session, partition_id):
+        if record["path"] in known_paths:
+            continue
+        line = format_line(record)
+        lines.append(line)
+        buffered += len(line)
+        if buffered >= chunk_size:
+            yield "".join(lines).encode("utf-8")
+            lines = []
+            buffered = 0
+    if lines:
+        yield "".join(lines).encode("utf-8")
+
+
+def iter_timeline_download(cwd, partition_id, timeline_format="bodyfile", exclude_known=True, evidence_id=None):
+    """Yields the timeline chunks of an HTTP download, ending with an error line if the walk fails.
+
+    The response status has already been sent once streaming starts, so a
+    failure part way is written into the download: a '#' comment line in a
+    bodyfile, which mactime skips, or a {"status": "failed"} object in JSONL.
+    """
+    try:
+        yield from iter_timeline_chunks(cwd, partition_id, timeline_format, exclude_known=exclude_known,
+                                        evidence_id=evidence_id)
+    except Exception as e:
+        traceback.print_exc()
+        message = f"The timeline is incomplete: {e}"
+        if timeline_format == "jsonl":
+            line = json.dumps({"status": "failed", "message": message})
+        else:
+            line = f"# ERROR: {message}"
+        yield (line + "\n").encode("utf-8")
+
+
+def get_timeline_path(cwd, partition_id, timeline_format="bodyfile", evidence_id=None):
+    """Returns where the exported timeline of a partition is written."""
+    return get_partition_dir(cwd, partition_id, evidence_id) / f"timeline.{TIMELINE_FORMATS[timeline_format][1]}"
+
+
+def write_timeline(cwd, partition_id, timeline_format="bodyfile", exclude_known=True, evidence_id=None):
+    """Writes the timeline of a partition to disk and returns its path and size."""
+    output_path = get_timeline_path(cwd, partition_id, timeline_format, evidence_id)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    bytes_written = 0
+    with open(output_path, "wb") as out_file:
+        for chunk in iter_timeline_chunks(cwd, partition_id, timeline_format, exclude_known=exclude_known,
+                                          evidence_id=evidence_id):
+            out_file.write(chunk)
+            bytes_written += len(chunk)
+    return {"partition_id": str(partition_id), "path": str(output_path), "bytes_written": bytes_written}
+
+
+def method_export_timelines(cwd, partition_ids=None, timeline_format="bodyfile", max_workers=TIMELINE_WORKERS,
+                            exclude_known=True, evidence_id=None):
+    """Exports the timelines of several partitions concurrently.
+
+    Each partition is walked through its own file system handle, so the
+    partitions are processed in parallel. The timelines are written to
+    the image's partitions/<partition ID>/timeline.<extension>.
+
+    Args:
+        cwd (str): The current working directory of the main application.
+        partition_ids (list): The partitions to export; every partition of
+            the image by default.
+        timeline_format (str): "bodyfile" or "jsonl".
+        max_workers (int): The number of partitions exported at the same time.
+        exclude_known (bool): Leave out files in the known-good hash set.
+        evidence_id (str): The evidence store ID of the image; None selects
+            the image in uploads/upload.E01.
+
+    Returns:
+        dict: The status of the operation and, per partition, the path and
+              size of the written timeline or the error that stopped it.
+    """
+    if timeline_format not in TIMELINE_FORMATS:
+        return {"status": "failed", "message": f"Unknown timeline format: {timeline_format}"}
+    e01_path = get_e01_path(cwd, evidence_id)
+    if not Path(e01_path).exists():
+        return {"status": "failed", "message": "E01 file not found."}
+    if not partition_ids:
+        partition_ids = get_evidence_session(e01_path).list_partition_ids()
+
+    def export(partition_id):
+        try:
+            return write_timeline(cwd, partition_id, timeline_format, exclude_known, evidence_id)
+        except Exception as e:
+            traceback.print_exc()
+            return {"partition_id": str(partition_id), "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [run_in_context(executor, export, partition_id) for partition_id in partition_ids]
+        timelines = [future.result() for future in futures]
+
+    failed = all("error" in timeline for timeline in timelines)
+    return {"status": "failed" if failed else "passed", "timelines": timelines}
@@ -1,7 +1,13 @@
 import struct
+from pathlib import Path
 from . import read_csv_1
 from datetime import datetime, timedelta
 
+V_VALUE_HEADER_OFFSETS_CSV = Path(__file__).parent / "v_value_header_offsets.csv"
+
+# The data area starts at a fixed offset of 204
+DATA_AREA_START_OFFSET = 204
+
 def convert_windows_time(win_time):
     """Converts a 64-bit Windows NT time value to a Python datetime object."""
     if win_time == 0:
@@ -12,42 +18,108 @@ def convert_windows_time(win_time):
     delta = timedelta(microseconds=win_time / 10)
     return epoch + delta
 
-def method_get_v_value_data(cwd, v_value_data):
-    data_location_list = []
-    full_data_location_list_from_csv = read_csv_1.method_read_csv_to_dicts(cwd + "\\api_methods\\v_value_header_offsets.csv")
 
-    for data_location_from_csv in full_data_location_list_from_csv:
-        v_info = {}
+def _is_timestamp_field(field):
+    return "Timestamp" in field or "Password Last Set" in field or "Account Expiration" in field
+
+
+def compile_v_value_header_layout(full_data_location_list_from_csv):
+    """Compiles the rows of v_value_header_offsets.csv into a single struct.Struct.
+
+    Timestamps are 8-byte values stored directly at their header offset; every
+    other field is an (offset, length) pair of 4-byte integers pointing into the
+    data area. Gaps between the fields become pad bytes, so one unpack_from call
+    reads the whole header.
+
+    Returns:
+        tuple: The compiled struct.Struct and, in CSV order, one
+               (field name, header offset, is timestamp, index into the
+               unpacked tuple) entry per field.
+    """
+    fields = []
+    for csv_index, data_location_from_csv in enumerate(full_data_location_list_from_csv):
         h_offset_str = data_location_from_csv['Header Offset'].replace("0x","")
-        v_info['address_address'] = int(h_offset_str, 16)
-        v_info['field'] = data_location_from_csv['Data Field']
+        field = data_location_from_csv['Data Field']
+        is_timestamp = _is_timestamp_field(field)
+        fields.append((int(h_offset_str, 16), "Q" if is_timestamp else "LL", csv_index, field, is_timestamp))
+
+    layout_format = "<"
+    position = 0
+    tuple_index = 0
+    tuple_index_by_csv_index = {}
+    for offset, code, csv_index, _, _ in sorted(fields):
+        if offset < position:
+            raise ValueError(f"Overlapping V value header fields at offset {offset}")
+        if offset > position:
+            layout_format += f"{offset - position}x"
+        layout_format += code
+        position = offset + struct.calcsize("<" + code)
+        tuple_index_by_csv_index[csv_index] = tuple_index
+        tuple_index += len(code)
+
+    field_list = [(field, offset, is_timestamp, tuple_index_by_csv_index[csv_index])
+                  for offset, _, csv_index, field, is_timestamp in fields]
+    return struct.Struct(layout_format), field_list
+
+
+V_VALUE_HEADER_STRUCT, V_VALUE_FIELDS = compile_v_value_header_layout(
+    read_csv_1.method_read_csv_to_dicts(str(V_VALUE_HEADER_OFFSETS_CSV)))
+
+
+def _decode_v_value(v_value_data, header_values):
+    data_location_list = []
+    for field, header_offset, is_timestamp, tuple_index in V_VALUE_FIELDS:
+        v_info = {}
+        v_info['address_address'] = header_offset
+        v_info['field'] = field
 
         # Check if the current field is a timestamp
-        if "Timestamp" in v_info['field'] or "Password Last Set" in v_info['field'] or "Account Expiration" in v_info['field']:
+        if is_timestamp:
             # Timestamps are 8-byte values stored directly at the header offset
-            # We read them as a 64-bit unsigned long long ('<Q')
-            raw_timestamp = struct.unpack_from('<Q', v_value_data, offset=v_info['address_address'])[0]
-            v_info['actual_data'] = str(convert_windows_time(raw_timestamp))
+            v_info['actual_data'] = str(convert_windows_time(header_values[tuple_index]))
             v_info['actual_address'] = "N/A (Direct Value)"
             v_info['actual_length'] = 8 # Timestamps are 8 bytes
             v_info['length_address'] = "N/A (Direct Value)"
 
         else:
-            # This is the original logic for strings, which is correct
-            v_info['length_address'] = v_info['address_address'] + 4
-            v_info['actual_address'] = struct.unpack_from('<L', v_value_data, offset=v_info['address_address'])[0]
-            v_info['actual_length'] = struct.unpack_from("<L", v_value_data, offset=v_info['length_address'])[0]
+            v_info['length_address'] = header_offset + 4
+            v_info['actual_address'] = header_values[tuple_index]
+            v_info['actual_length'] = header_values[tuple_index + 1]
 
             if v_info['actual_length'] > 0:
-                # The data area starts at a fixed offset of 204
-                data_area_start_offset = 204
-                final_data_offset = data_area_start_offset + v_info['actual_address']
-
-                length_val = "<" + str(v_info['actual_length']) + "s"
-                raw_data = struct.unpack_from(length_val, v_value_data, offset=final_data_offset)[0]
+                final_data_offset = DATA_AREA_START_OFFSET + v_info['actual_address']
+                final_data_end = final_data_offset + v_info['actual_length']
+                if final_data_end > len(v_value_data):
+                    raise struct.error(f"V value field '{field}' points past the end of the data")
+                raw_data = bytes(v_value_data[final_data_offset:final_data_end])
                 v_info['actual_data'] = raw_data.decode('utf-16-le', errors='ignore')
             else:
                 v_info['actual_data'] = ""
 
         data_location_list.append(v_info)
     return data_location_list
+
+
+def method_get_v_value_data(cwd, v_value_data):
+    """Decodes a V value with the header layout compiled from the CSV at import.
+
+    cwd is kept for compatibility with existing callers and is not used.
+    """
+    return _decode_v_value(v_value_data, V_VALUE_HEADER_STRUCT.unpack_from(v_value_data))
+
+
+def method_decode_v_values_batch(v_value_blobs):
+    """Decodes many V values at once into columns.
+
+    Args:
+        v_value_blobs (iterable): Raw V value data, one entry per account.
+
+    Returns:
+        dict: One list per field name, each holding that field's decoded
+              text (or timestamp string) for every blob in input order.
+    """
+    columns = {field: [] for field, _, _, _ in V_VALUE_FIELDS}
+    for v_value_data in v_value_blobs:
+        for v_info in method_get_v_value_data(None, v_value_data):
+            columns[v_info['field']].append(v_info['actual_data'])
+    return columns
@@ -1,19 +1,49 @@
 import os
 import json
-from flask import Flask, request, render_template, jsonify, redirect, url_for
+import time
+import hashlib
+from urllib.parse import unquote
+from flask import Flask, Response, abort, g, request, render_template, jsonify, redirect, send_file, stream_with_context, url_for
 from werkzeug.utils import secure_filename
 
 from api_methods.get_usernames_and_rids import method_get_usernames_and_rids
 from api_methods.get_usernames_and_rids import get_username_from_rid
-from clear_folder import clear_folder_contents
 from api_methods.get_volume_information import method_get_volume_information
 from api_methods.check_partitions import method_test_partitions
 from api_methods.file_extraction import method_extract_file_from_e01
+from api_methods.hive_extraction import method_extract_registry_hives
 from api_methods.get_user_f_value_flags_with_rid import method_get_user_f_value_flags_with_rid
 from api_methods.get_user_f_value_data_with_rid import method_get_user_f_value_data_with_rid
 from api_methods.get_user_v_value_data_with_rid import method_get_user_v_value_data_with_rid
-from api_methods.collect_user_emails import method_get_user_emails
+from api_methods.get_all_users_full import method_get_all_users_full, method_get_all_users_columns
+from api_methods.collect_user_emails import (
+    iter_user_emails_page, method_get_user_email_body, method_get_user_emails_page
+)
+from api_methods.email_index import (
+    get_indexed_email, get_indexed_emails_page, is_mailbox_indexed, method_search_user_emails
+)
 from api_methods.email_ai_analysis import email_analysis
+from api_methods.email_attachments import (
+    get_blob_path, get_email_attachments, get_user_attachments, method_extract_user_attachments
+)
+from api_methods.ai_search_dir.tool_cache import tool_result_cache
+from api_methods.evidence_session import get_evidence_session
+from api_methods.evidence_store import (
+    DEFAULT_CASE_ID, create_evidence, delete_evidence, get_evidence, get_latest_evidence_id, list_cases, list_evidence,
+    mark_evidence_ready, record_evidence_segment
+)
+from api_methods.ewf_segments import method_receive_segment, validate_segment_set
+from api_methods.common import get_config_value, get_e01_path, get_evidence_dir, iter_ndjson
+from api_methods.ewf_chunk_cache import DEFAULT_CACHE_BYTES, ewf_chunk_cache
+from api_methods.job_queue import get_job_queue
+from api_methods.known_files import method_hash_partition_files
+from api_methods.metrics import (
+    finish_request_timings, http_request_seconds, render_prometheus_text, start_request_timings
+)
+from api_methods.timeline import TIMELINE_FORMATS, iter_timeline_download, method_export_timelines
+from api_methods.evidence_intake import (
+    INTAKE_HASH_ALGORITHMS, get_upload_progress, method_stream_evidence_to_disk, verify_intake_hashes
+)
 
 # Initialize the Flask application
 app = Flask(__name__)
@@ -26,29 +56,126 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
 current_dir = os.path.dirname(__file__)
 
+# Memory budget of the decompressed EWF chunk cache shared by all requests.
+ewf_chunk_cache.resize(int(get_config_value(current_dir, "ewf_chunk_cache_bytes", DEFAULT_CACHE_BYTES)))
+
+# Adds a Server-Timing header with per-stage durations to every response;
+# a single request can ask for it with '?timing=1'.
+SERVER_TIMING_HEADER = bool(get_config_value(current_dir, "server_timing_header", False))
+
+
+# --- Request Instrumentation ---
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    start_request_timings()
+
+
+@app.after_request
+def record_request_latency(response):
+    """
+    Records the latency of the request in the per-route histogram.
+    For streamed responses this is the time until the body starts streaming.
+    """
+    elapsed = time.perf_counter() - g.pop('request_started', time.perf_counter())
+    stages = finish_request_timings()
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    http_request_seconds.observe(elapsed, method=request.method, route=route, status=response.status_code)
+
+    if SERVER_TIMING_HEADER or request.args.get('timing') in ('1', 'true'):
+        timings = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages.items()]
+        timings.append(f"total;dur={elapsed * 1000:.1f}")
+        response.headers['Server-Timing'] = ", ".join(timings)
+    return response
+
+
 
 # --- Helper Functions ---
-def process_upload(filename):
+def process_upload(evidence_id, received_path, filename, intake_hashes=None, expected_hashes=None):
     """
     Processes the uploaded file after it's saved.
-    Renames the file and calls analysis methods.
+    Renames the file, records its intake hashes and compares them with the
+    hashes known for the evidence.
     """
     print("Starting post-upload processing...")
+
+    # Standardize the name for processing
+    new_path = get_e01_path(current_dir, evidence_id)
+    os.rename(received_path, new_path)
+
     file_info = {
         "fileinfo": {
             "filename": filename,
         }
     }
+    if intake_hashes:
+        try:
+            acquisition_hashes = get_evidence_session(new_path).get_stored_hashes()
+        except Exception as e:
+            print(f"[-] Could not read the acquisition hashes from the EWF header: {e}")
+            acquisition_hashes = {}
+        file_info["hashes"] = intake_hashes
+        file_info["verification"] = verify_intake_hashes(intake_hashes, acquisition_hashes, expected_hashes)
+
     # Save metadata about the upload
-    with open(os.path.join(UPLOAD_FOLDER, "upload_info.txt"), 'w') as f:
+    with open(get_evidence_dir(current_dir, evidence_id) / "upload_info.txt", 'w') as f:
         f.write(json.dumps(file_info))
 
-    # Standardize the name for processing
-    original_path = os.path.join(UPLOAD_FOLDER, filename)
-    new_path = os.path.join(UPLOAD_FOLDER, "upload.E01")
-    os.rename(original_path, new_path)
-
     print("Post-upload processing complete.")
+    return file_info
+
+def process_segmented_upload(evidence_id):
+    """
+    Processes an image uploaded as EWF segments once they have all been received.
+    Validates the segment set and records the per-segment intake hashes with
+    the acquisition hashes of the image. Returns the validation result and the
+    file info, which is None when the segment set is not complete.
+    """
+    evidence = get_evidence(current_dir, evidence_id)
+    validation = validate_segment_set(get_evidence_dir(current_dir, evidence_id), evidence.get("segment_count"))
+    if validation["status"] != "passed":
+        return validation, None
+
+    received = evidence.get("segments", {})
+    segments = [received.get(str(number)) for number in range(1, validation["segment_count"] + 1)]
+    if None in segments:
+        return {"status": "failed", "message": "A segment was stored but its hashes were not recorded; upload it again.",
+                "segment_count": validation["segment_count"]}, None
+
+    try:
+        acquisition_hashes = get_evidence_session(get_e01_path(current_dir, evidence_id)).get_stored_hashes()
+    except Exception as e:
+        return {"status": "failed", "message": f"The segments could not be opened as one image: {e}",
+                "segment_count": validation["segment_count"]}, None
+
+    statuses = {segment["verification"]["status"] for segment in segments}
+    if "failed" in statuses:
+        verification_status = "failed"
+    elif statuses == {"passed"}:
+        verification_status = "passed"
+    else:
+        verification_status = "unverified"
+
+    file_info = {
+        "fileinfo": {
+            "filename": evidence["filename"],
+            "segment_count": len(segments),
+        },
+        "segments": segments,
+        "hashes": {
+            "bytes_written": sum(segment["hashes"]["bytes_written"] for segment in segments),
+            "segment_set_sha256": hashlib.sha256(
+                "".join(segment["hashes"]["sha256"] for segment in segments).encode("ascii")).hexdigest(),
+        },
+        "verification": {
+            "status": verification_status,
+            "matches": {segment["filename"]: segment["verification"]["matches"] for segment in segments},
+            "acquisition_hashes": acquisition_hashes,
+        },
+    }
+    with open(get_evidence_dir(current_dir, evidence_id) / "upload_info.txt", 'w') as f:
+        f.write(json.dumps(file_info))
+    return validation, file_info
 
 def status_jsonify(payload):
     """
@@ -61,6 +188,70 @@ def status_jsonify(payload):
         # Return a 500 Internal Server Error for failed status
         return jsonify(payload), 500
 
+def submit_job_if_async(kind, func, **kwargs):
+    """
+    Runs func as a background job when the request has '?async=1'.
+    Returns a 202 response pointing at the job, or None to let the caller
+    run func synchronously.
+    """
+    if request.args.get('async') not in ('1', 'true'):
+        return None
+    return submit_job(kind, func, **kwargs)
+
+
+def submit_job(kind, func, **kwargs):
+    """Queues func as a background job and returns a 202 response pointing at it."""
+    job_id = get_job_queue(current_dir).submit(kind, func, **kwargs)
+    return jsonify({
+        "status": "queued",
+        "job_id": job_id,
+        "status_url": url_for('api_get_job', job_id=job_id),
+        "result_url": url_for('api_get_job_result', job_id=job_id)
+    }), 202
+
+def evidence_route(rule, **options):
+    """
+    Registers a view both at rule and scoped to one evidence image, e.g.
+    '/api/partition/1/users/full' and '/api/evidence/<evidence_id>/partition/1/users/full'.
+    The unscoped URL serves the most recently uploaded image. The view gets
+    the evidence ID as its 'evidence_id' argument.
+    """
+    if rule.startswith('/api/'):
+        scoped_rule = '/api/evidence/<evidence_id>/' + rule[len('/api/'):]
+    else:
+        scoped_rule = '/evidence/<evidence_id>' + rule
+
+    def decorator(view):
+        app.add_url_rule(scoped_rule, view_func=view, **options)
+        app.add_url_rule(rule, view_func=view, defaults={'evidence_id': None}, **options)
+        return view
+    return decorator
+
+
+@app.url_value_preprocessor
+def resolve_evidence_id(endpoint, values):
+    """
+    Replaces a missing evidence ID with the most recently uploaded image's and
+    answers 404 for IDs that are not in the evidence store.
+    """
+    if not values or 'evidence_id' not in values:
+        return
+    if values['evidence_id'] is None:
+        values['evidence_id'] = get_latest_evidence_id(current_dir)
+    elif get_evidence(current_dir, values['evidence_id']) is None:
+        abort(404)
+
+
+@app.context_processor
+def inject_evidence_urls():
+    """Gives templates the URL prefixes of the evidence image the page belongs to."""
+    evidence_id = (request.view_args or {}).get('evidence_id')
+    return {
+        "evidence_id": evidence_id,
+        "api_base": f"/api/evidence/{evidence_id}" if evidence_id else "/api",
+        "page_base": f"/evidence/{evidence_id}" if evidence_id else "",
+    }
+
 # --- Main Routes ---
 
 @app.route('/')
@@ -70,53 +261,140 @@ def index():
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    """Handles the file upload and processing."""
-    if 'file' not in request.files:
-        return jsonify({"error": "No file part in the request"}), 400
+    """
+    Handles the file upload and processing.
+    The raw file is expected as the request body with its name in the
+    X-File-Name header, so it can be streamed to disk and hashed in one pass.
+    Multipart form uploads with a 'file' field are still accepted.
+    Optional X-Expected-MD5/SHA1/SHA256 headers are checked against the intake hashes.
+    An X-Evidence-ID header stores the file in evidence created beforehand
+    with POST /api/evidence, whose upload progress can then be polled.
+    A multipart upload with several 'file' fields is stored as the segments
+    of one EWF image (E01, E02, ...).
+    """
+    if request.mimetype == 'multipart/form-data':
+        if 'file' not in request.files:
+            return jsonify({"error": "No file part in the request"}), 400
 
-    file = request.files['file']
+        if len(request.files.getlist('file')) > 1:
+            return upload_segmented_files(request.files.getlist('file'),
+                                          request.form.get('case_id') or request.headers.get('X-Case-ID'))
 
-    if file.filename == '':
-        return jsonify({"error": "No selected file"}), 400
+        file = request.files['file']
 
-    if file:
-        filename = secure_filename(file.filename)
-        try:
-            # Clear previous uploads and save the new file
-            clear_folder_contents(UPLOAD_FOLDER)
-            #return jsonify({"error": "An unknown error occurred"}), 500
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            print(f"Successfully saved file: {filename}")
-
-            # Perform post-upload processing
-            process_upload(filename=filename)
-
-            # Get the URL for the new partition dashboard
-            dashboard_url = url_for('dashboard')
-
-            return jsonify({
-                "success": True,
-                "redirect_url": dashboard_url
-            })
-        except Exception as e:
-            print(f"Error during file upload or processing: {e}")
-            return jsonify({"error": f"An error occurred: {e}"}), 500
+        if file.filename == '':
+            return jsonify({"error": "No selected file"}), 400
 
-    return jsonify({"error": "An unknown error occurred"}), 500
+        original_filename = file.filename
+        stream = file.stream
+        total_bytes = None
+        case_id = request.form.get('case_id') or request.headers.get('X-Case-ID')
+    else:
+        original_filename = unquote(request.headers.get('X-File-Name', ''))
+        if original_filename == '':
+            return jsonify({"error": "No file name supplied in the X-File-Name header"}), 400
+
+        stream = request.stream
+        total_bytes = request.content_length
+        case_id = request.headers.get('X-Case-ID')
+
+    filename = secure_filename(original_filename)
+    evidence_id = request.headers.get('X-Evidence-ID')
+    if evidence_id:
+        # Created beforehand with POST /api/evidence, so the client knows where to poll for progress.
+        evidence = get_evidence(current_dir, evidence_id)
+        if evidence is None:
+            return jsonify({"error": f"No evidence with ID {evidence_id}"}), 404
+        if evidence["status"] != "uploading" or "segment_count" in evidence:
+            return jsonify({"error": "This evidence does not expect a single-file upload."}), 409
+    else:
+        # Every upload gets its own directory in the evidence store, so images
+        # already uploaded and everything extracted from them are kept.
+        evidence = create_evidence(current_dir, filename, secure_filename(case_id or '') or DEFAULT_CASE_ID)
+        evidence_id = evidence["evidence_id"]
+    try:
+        received_path = get_evidence_dir(current_dir, evidence_id) / "upload.part"
+        intake_hashes = method_stream_evidence_to_disk(stream, str(received_path), total_bytes=total_bytes,
+                                                       progress=get_upload_progress(evidence_id))
+        print(f"Successfully saved file: {filename} ({intake_hashes['bytes_written']:,} bytes, SHA-256 {intake_hashes['sha256']})")
+
+        # Perform post-upload processing
+        expected_hashes = {name: request.headers.get(f"X-Expected-{name.upper()}") for name in INTAKE_HASH_ALGORITHMS}
+        file_info = process_upload(evidence_id, received_path, filename=filename, intake_hashes=intake_hashes,
+                                   expected_hashes=expected_hashes)
+        mark_evidence_ready(current_dir, evidence_id)
+
+        # Get the URL for the new partition dashboard
+        dashboard_url = url_for('dashboard', evidence_id=evidence_id)
+
+        return jsonify({
+            "success": True,
+            "evidence_id": evidence_id,
+            "case_id": evidence["case_id"],
+            "redirect_url": dashboard_url,
+            "hashes": file_info["hashes"],
+            "verification": file_info["verification"]
+        })
+    except Exception as e:
+        print(f"Error during file upload or processing: {e}")
+        delete_evidence(current_dir, evidence_id)
+        return jsonify({"error": f"An error occurred: {e}"}), 500
+
+
+def upload_segmented_files(files, case_id):
+    """Stores the files of a multipart upload as the segments of one EWF image."""
+    first_name = min((file.filename for file in files), key=lambda name: name.upper())
+    evidence = create_evidence(current_dir, secure_filename(first_name), secure_filename(case_id or '') or DEFAULT_CASE_ID,
+                               segment_count=len(files))
+    evidence_id = evidence["evidence_id"]
+    try:
+        for file in files:
+            segment = method_receive_segment(file.stream, get_evidence_dir(current_dir, evidence_id), file.filename)
+            if segment["status"] != "passed":
+                delete_evidence(current_dir, evidence_id)
+                return jsonify({"error": segment["message"]}), 400
+            record_evidence_segment(current_dir, evidence_id, segment)
+
+        validation, file_info = process_segmented_upload(evidence_id)
+        if file_info is None:
+            delete_evidence(current_dir, evidence_id)
+            return jsonify({"error": validation["message"]}), 400
+        mark_evidence_ready(current_dir, evidence_id)
+
+        return jsonify({
+            "success": True,
+            "evidence_id": evidence_id,
+            "case_id": evidence["case_id"],
+            "segment_count": validation["segment_count"],
+            "redirect_url": url_for('dashboard', evidence_id=evidence_id),
+            "hashes": file_info["hashes"],
+            "verification": file_info["verification"]
+        })
+    except Exception as e:
+        print(f"Error during segmented upload: {e}")
+        delete_evidence(current_dir, evidence_id)
+        return jsonify({"error": f"An error occurred: {e}"}), 500
+
+
+@app.route('/api/evidence/<evidence_id>/upload_progress')
+def api_upload_progress(evidence_id):
+    """API endpoint reporting bytes received and throughput of one evidence image's upload."""
+    if get_evidence(current_dir, evidence_id) is None:
+        abort(404)
+    return jsonify(get_upload_progress(evidence_id).snapshot())
 
 # --- Web Page Views ---
 
-@app.route('/dashboard')
-def dashboard():
+@evidence_route('/dashboard')
+def dashboard(evidence_id):
     """
     Displays the new dashboard for selecting a partition.
     This page will call the /api/check_partitions endpoint.
     """
     return render_template('dashboard.html')
 
-@app.route('/web_page_view/<int:partition_id>/profiles')
-def web_page_view_profiles(partition_id):
+@evidence_route('/web_page_view/<int:partition_id>/profiles')
+def web_page_view_profiles(partition_id, evidence_id):
     """
     Displays the user profiles for a *specific* partition.
     This page will call the /api/partition/<partition_id>/get_usernames_and_rids endpoint.
@@ -124,95 +402,511 @@ def web_page_view_profiles(partition_id):
     # Pass the partition_id to the template to make it available to the frontend JS
     return render_template('profiles.html', partition_id=partition_id)
 
-@app.route('/web_page_view/partition/<int:partition_id>/profile/<int:account_rid>')
-def profile_page(partition_id, account_rid):
+@evidence_route('/web_page_view/partition/<int:partition_id>/profile/<int:account_rid>')
+def profile_page(partition_id, account_rid, evidence_id):
     """Displays a placeholder page for a specific user profile."""
     return render_template('profile.html', account_rid=account_rid, partition_id=partition_id)
 
 # --- API Endpoints ---
 
-@app.route('/api/check_partitions')
-def api_check_partitions():
-    path = os.path.join(current_dir, UPLOAD_FOLDER, "upload.E01")
-    return status_jsonify(method_test_partitions(path))
-
-@app.route('/api/partition/<int:partition_id>/extract_SAM_registry_file')
-def api_extract_SAM_registry_file(partition_id):
-    ret = status_jsonify(method_extract_file_from_e01(current_dir, partition_id))
+@evidence_route('/api/check_partitions')
+def api_check_partitions(evidence_id):
+    """
+    Lists the partitions holding a Windows installation.
+    Repeat the 'signature' query parameter to override the artifact paths checked.
+    """
+    path = get_e01_path(current_dir, evidence_id)
+    return status_jsonify(method_test_partitions(path, signatures=request.args.getlist("signature")))
+
+@evidence_route('/api/partition/<int:partition_id>/extract_SAM_registry_file')
+def api_extract_SAM_registry_file(partition_id, evidence_id):
+    queued = submit_job_if_async("extract_file", method_extract_file_from_e01, cwd=current_dir, partition_id=partition_id,
+                                 evidence_id=evidence_id)
+    if queued:
+        return queued
+    ret = status_jsonify(method_extract_file_from_e01(current_dir, partition_id, evidence_id=evidence_id))
     return ret
 
 
-@app.route('/api/partition/<int:partition_id>/extract_Security_registry_file')
-def api_extract_Security_registry_file(partition_id):
-    ret = status_jsonify(method_extract_file_from_e01(current_dir, partition_id, "/Windows/System32/config/Security"))
+@evidence_route('/api/partition/<int:partition_id>/extract_Security_registry_file')
+def api_extract_Security_registry_file(partition_id, evidence_id):
+    queued = submit_job_if_async("extract_file", method_extract_file_from_e01, cwd=current_dir, partition_id=partition_id,
+                                 filepath="/Windows/System32/config/Security", evidence_id=evidence_id)
+    if queued:
+        return queued
+    ret = status_jsonify(method_extract_file_from_e01(current_dir, partition_id, "/Windows/System32/config/Security",
+                                                      evidence_id=evidence_id))
     return ret
 
-@app.route('/api/partition/<int:partition_id>/get_usernames_and_rids')
-def api_get_usernames_and_rids(partition_id):
+@evidence_route('/api/partition/<int:partition_id>/extract_registry_hives', methods=['POST'])
+def api_extract_registry_hives(partition_id, evidence_id):
+    """
+    API endpoint extracting SAM, SECURITY, SYSTEM, SOFTWARE and every profile's
+    NTUSER.DAT and UsrClass.dat in one pass, with a manifest of sizes and hashes.
+    """
+    queued = submit_job_if_async("extract_registry_hives", method_extract_registry_hives, cwd=current_dir,
+                                 partition_id=partition_id, evidence_id=evidence_id)
+    if queued:
+        return queued
+    return status_jsonify(method_extract_registry_hives(current_dir, partition_id, evidence_id=evidence_id))
+
+@evidence_route('/api/partition/<int:partition_id>/get_usernames_and_rids')
+def api_get_usernames_and_rids(partition_id, evidence_id):
     """
     API endpoint to get usernames for a specific partition.
     The partition_id is passed to the underlying method.
     """
     print(f"Fetching usernames for partition: {partition_id}")
-    return jsonify(method_get_usernames_and_rids(cwd=current_dir, partition_id=partition_id))
+    return jsonify(method_get_usernames_and_rids(cwd=current_dir, partition_id=partition_id, evidence_id=evidence_id))
 
 
 
-@app.route('/api/get_volume_information')
-def api_get_volume_information():
+@evidence_route('/api/get_volume_information')
+def api_get_volume_information(evidence_id):
     """API endpoint to get volume information."""
-    path = os.path.join(current_dir, UPLOAD_FOLDER, "upload.E01")
+    path = get_e01_path(current_dir, evidence_id)
     return status_jsonify(method_get_volume_information(path))
 
 
 
-@app.route('/api/partition/<int:partition_id>/get_user_f_value_data_with_rid/<int:rid>')
-def api_get_user_f_value_data_with_rid(partition_id, rid):
+@evidence_route('/api/partition/<int:partition_id>/get_user_f_value_data_with_rid/<int:rid>')
+def api_get_user_f_value_data_with_rid(partition_id, rid, evidence_id):
     """
     API endpoint to get usernames for a specific partition.
     The partition_id is passed to the underlying method.
     """
     print(f"Fetching usernames for partition: {partition_id}")
-    return jsonify(method_get_user_f_value_data_with_rid(cwd=current_dir, partition_id=partition_id, rid=rid))
+    return jsonify(method_get_user_f_value_data_with_rid(cwd=current_dir, partition_id=partition_id, rid=rid,
+                                                         evidence_id=evidence_id))
 
 
 
-@app.route('/api/partition/<int:partition_id>/get_user_f_value_flags_with_rid/<int:rid>')
-def api_get_user_f_value_flags_with_rid(partition_id, rid):
+@evidence_route('/api/partition/<int:partition_id>/get_user_f_value_flags_with_rid/<int:rid>')
+def api_get_user_f_value_flags_with_rid(partition_id, rid, evidence_id):
     """
     API endpoint to get usernames for a specific partition.
     The partition_id is passed to the underlying method.
     """
     print(f"Fetching usernames for partition: {partition_id}")
-    return jsonify(method_get_user_f_value_flags_with_rid(cwd=current_dir, partition_id=partition_id, rid=rid))
+    return jsonify(method_get_user_f_value_flags_with_rid(cwd=current_dir, partition_id=partition_id, rid=rid,
+                                                          evidence_id=evidence_id))
 
 
-@app.route('/api/partition/<int:partition_id>/get_user_v_value_data_with_rid/<int:rid>')
-def api_get_user_v_value_data_with_rid(partition_id, rid):
+@evidence_route('/api/partition/<int:partition_id>/get_user_v_value_data_with_rid/<int:rid>')
+def api_get_user_v_value_data_with_rid(partition_id, rid, evidence_id):
     """
     API endpoint to get usernames for a specific partition.
     The partition_id is passed to the underlying method.
     """
     print(f"Fetching usernames for partition: {partition_id}")
-    return jsonify(method_get_user_v_value_data_with_rid(cwd=current_dir, partition_id=partition_id, rid=rid))
+    return jsonify(method_get_user_v_value_data_with_rid(cwd=current_dir, partition_id=partition_id, rid=rid,
+                                                         evidence_id=evidence_id))
 
 
 
-@app.route('/api/partition/<int:partition_id>/get_user_emails/<int:rid>')
-def api_get_user_emails(partition_id, rid):
-    username = get_username_from_rid(partition_id=partition_id, rid=rid, cwd=current_dir)
-    ret = method_get_user_emails(cwd=current_dir, username=username, partition_id=partition_id)
-    #ret = ret[:2]
-    return jsonify(ret)
+@evidence_route('/api/partition/<int:partition_id>/users/full')
+def api_get_all_users_full(partition_id, evidence_id):
+    """
+    API endpoint returning the decoded F values, UAC flags and V values
+    of every account on a partition in one response.
+    """
+    print(f"Fetching full account data for partition: {partition_id}")
+    return status_jsonify(method_get_all_users_full(cwd=current_dir, partition_id=partition_id, evidence_id=evidence_id))
+
+
+
+@evidence_route('/api/partition/<int:partition_id>/users/columns')
+def api_get_all_users_columns(partition_id, evidence_id):
+    """API endpoint returning every account's decoded F and V values as columns."""
+    return status_jsonify(method_get_all_users_columns(cwd=current_dir, partition_id=partition_id, evidence_id=evidence_id))
 
 
-@app.route('/api/partition/<int:partition_id>/email_ai_analysis/<int:rid>')
-def email_ai_analysis(partition_id, rid):
-    username = get_username_from_rid(partition_id=partition_id, rid=rid, cwd=current_dir)
-    ret = email_analysis(cwd=current_dir, username=username, partition_id=partition_id)
+
+@evidence_route('/api/partition/<int:partition_id>/get_user_emails/<int:rid>')
+def api_get_user_emails(partition_id, rid, evidence_id):
+    """
+    API endpoint returning a user's parsed emails.
+    Accepts 'offset' and 'limit' query parameters to return one page; the
+    total count and the offset of the next page are sent as the
+    X-Total-Count and X-Next-Offset headers. With 'headers_only=1' only the
+    header block of each email is read and the bodies are left out; fetch
+    one from get_user_email_body. Mailboxes already in the email index are
+    served from it instead of being read from the image. With
+    'stream=ndjson' the emails are sent as newline-delimited JSON, each one
+    as soon as it has been read, instead of as one array.
+    """
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', None, type=int)
+    headers_only = request.args.get('headers_only') in ('1', 'true')
+    stream = request.args.get('stream') == 'ndjson'
+    username = get_username_from_rid(partition_id=partition_id, rid=rid, cwd=current_dir, evidence_id=evidence_id)
+    queued = submit_job_if_async("get_user_emails", method_get_user_emails_page, cwd=current_dir, username=username,
+                                 partition_id=partition_id, offset=offset, limit=limit, evidence_id=evidence_id,
+                                 headers_only=headers_only)
+    if queued:
+        return queued
+    page = get_indexed_emails_page(cwd=current_dir, username=username, partition_id=partition_id,
+                                   offset=offset, limit=limit, evidence_id=evidence_id, headers_only=headers_only,
+                                   stream=stream)
+    if page is None:
+        get_page = iter_user_emails_page if stream else method_get_user_emails_page
+        page = get_page(cwd=current_dir, username=username, partition_id=partition_id, offset=offset, limit=limit,
+                        evidence_id=evidence_id, headers_only=headers_only)
+    if stream:
+        response = Response(stream_with_context(iter_ndjson(page["emails"])), mimetype='application/x-ndjson')
+    else:
+        response = jsonify(page["emails"])
+    response.headers['X-Total-Count'] = str(page["total"])
+    if page["next_offset"] is not None:
+        response.headers['X-Next-Offset'] = str(page["next_offset"])
+    return response
+
+
+@evidence_route('/api/partition/<int:partition_id>/get_user_email_body/<int:rid>')
+def api_get_user_email_body(partition_id, rid, evidence_id):
+    """
+    API endpoint returning one of a user's emails with its decoded body.
+    The email is selected by the 'source_path' query parameter, as returned
+    by a header-only listing.
+    """
+    source_path = request.args.get('source_path', '')
+    username = get_username_from_rid(partition_id=partition_id, rid=rid, cwd=current_dir, evidence_id=evidence_id)
+    email = None
+    if is_mailbox_indexed(current_dir, username, partition_id, evidence_id):
+        email = get_indexed_email(current_dir, username, partition_id, source_path, evidence_id)
+    if email is None:
+        email = method_get_user_email_body(cwd=current_dir, username=username, partition_id=partition_id,
+                                           source_path=source_path, evidence_id=evidence_id)
+    if email is None:
+        return jsonify({"status": "failed", "message": f"No email of {username} at {source_path}."}), 404
+    return jsonify(dict(email, status="passed"))
+
+
+@evidence_route('/api/partition/<int:partition_id>/search_emails/<int:rid>')
+def api_search_user_emails(partition_id, rid, evidence_id):
+    """
+    API endpoint searching a user's emails in the full-text email index.
+    Query parameters: 'q' (keywords), 'sender', 'date_from' and 'date_to'
+    (YYYY-MM-DD), 'limit' and 'offset'. A mailbox that has not been indexed
+    yet is indexed in a background job, answered with a 202 pointing at it.
+    """
+    username = get_username_from_rid(partition_id=partition_id, rid=rid, cwd=current_dir, evidence_id=evidence_id)
+    search_arguments = dict(
+        cwd=current_dir, username=username, partition_id=partition_id, evidence_id=evidence_id,
+        query=request.args.get('q', ''), sender=request.args.get('sender', ''),
+        date_from=request.args.get('date_from', ''), date_to=request.args.get('date_to', ''),
+        limit=request.args.get('limit', 50, type=int), offset=request.args.get('offset', 0, type=int))
+    queued = submit_job_if_async("search_emails", method_search_user_emails, **search_arguments)
+    if queued:
+        return queued
+    result = method_search_user_emails(**search_arguments)
+    if result["status"] == "indexing":
+        result["status_url"] = url_for('api_get_job', job_id=result["job_id"])
+        return jsonify(result), 202
+    return status_jsonify(result)
+
+
+@evidence_route('/api/partition/<int:partition_id>/extract_attachments/<int:rid>', methods=['POST'])
+def api_extract_user_attachments(partition_id, rid, evidence_id):
+    """
+    API endpoint extracting the attachments of all of a user's emails into the
+    content-addressed attachment store. Each distinct file is stored once by
+    SHA-256 however many emails or images carry it.
+    """
+    username = get_username_from_rid(partition_id=partition_id, rid=rid, cwd=current_dir, evidence_id=evidence_id)
+    queued = submit_job_if_async("extract_attachments", method_extract_user_attachments, cwd=current_dir,
+                                 username=username, partition_id=partition_id, evidence_id=evidence_id)
+    if queued:
+        return queued
+    return status_jsonify(method_extract_user_attachments(cwd=current_dir, username=username,
+                                                          partition_id=partition_id, evidence_id=evidence_id))
+
+
+@evidence_route('/api/partition/<int:partition_id>/email_attachments/<int:rid>')
+def api_get_email_attachments(partition_id, rid, evidence_id):
+    """
+    API endpoint listing the attachments of one email, selected by the
+    'source_path' query parameter. Download one from /api/attachments/<sha256>.
+    """
+    username = get_username_from_rid(partition_id=partition_id, rid=rid, cwd=current_dir, evidence_id=evidence_id)
+    return attachments_jsonify(get_email_attachments(current_dir, username, partition_id,
+                                                     request.args.get('source_path', ''), evidence_id=evidence_id),
+                               partition_id, rid, evidence_id)
+
+
+@evidence_route('/api/partition/<int:partition_id>/attachments/<int:rid>')
+def api_get_user_attachments(partition_id, rid, evidence_id):
+    """
+    API endpoint listing the distinct attachments of a user's mailbox, most
+    widely sent first. Accepts 'offset' and 'limit' query parameters.
+    """
+    username = get_username_from_rid(partition_id=partition_id, rid=rid, cwd=current_dir, evidence_id=evidence_id)
+    return attachments_jsonify(get_user_attachments(current_dir, username, partition_id,
+                                                    offset=request.args.get('offset', 0, type=int),
+                                                    limit=request.args.get('limit', 100, type=int),
+                                                    evidence_id=evidence_id),
+                               partition_id, rid, evidence_id)
+
+
+def attachments_jsonify(payload, partition_id, rid, evidence_id):
+    """
+    Like status_jsonify, but answers 409 with the extraction endpoint's URL
+    while the mailbox's attachments have not been extracted.
+    """
+    if payload.get("status") == "not_extracted":
+        payload["extract_url"] = url_for('api_extract_user_attachments', partition_id=partition_id, rid=rid,
+                                         evidence_id=evidence_id)
+        return jsonify(payload), 409
+    return status_jsonify(payload)
+
+
+@app.route('/api/attachments/<sha256>')
+def api_download_attachment(sha256):
+    """
+    API endpoint downloading a stored attachment by its SHA-256.
+    The optional 'filename' query parameter names the download.
+    """
+    try:
+        blob_path = get_blob_path(current_dir, sha256.lower())
+    except ValueError as e:
+        return jsonify({"status": "failed", "message": str(e)}), 400
+    if not blob_path.is_file():
+        abort(404)
+    return send_file(blob_path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=secure_filename(request.args.get('filename', '')) or sha256.lower())
+
+
+@evidence_route('/api/partition/<int:partition_id>/email_ai_analysis/<int:rid>')
+def email_ai_analysis(partition_id, rid, evidence_id):
+    username = get_username_from_rid(partition_id=partition_id, rid=rid, cwd=current_dir, evidence_id=evidence_id)
+    queued = submit_job_if_async("email_ai_analysis", email_analysis, cwd=current_dir, username=username,
+                                 partition_id=partition_id, evidence_id=evidence_id)
+    if queued:
+        return queued
+    ret = email_analysis(cwd=current_dir, username=username, partition_id=partition_id, evidence_id=evidence_id)
     return jsonify(ret)
 
 
+@evidence_route('/api/partition/<int:partition_id>/timeline')
+def api_get_partition_timeline(partition_id, evidence_id):
+    """
+    API endpoint streaming the MACB timeline of every file in a partition as a download.
+    'format' selects 'bodyfile' (default, readable by mactime) or 'jsonl'.
+    Known-good files are left out unless 'include_known=1' is passed.
+    """
+    timeline_format = request.args.get('format', 'bodyfile')
+    if timeline_format not in TIMELINE_FORMATS:
+        return jsonify({"status": "failed", "message": f"Unknown timeline format: {timeline_format}"}), 400
+    _, extension, mimetype = TIMELINE_FORMATS[timeline_format]
+    # Problems with the image or partition must surface before the 200 goes out.
+    e01_path = get_e01_path(current_dir, evidence_id)
+    if not os.path.exists(e01_path):
+        return jsonify({"status": "failed", "message": "E01 file not found."}), 404
+    try:
+        root = get_evidence_session(e01_path).get_file_entry(partition_id, "/")
+    except Exception as e:
+        return jsonify({"status": "failed", "message": f"Partition {partition_id} cannot be opened: {e}"}), 400
+    if root is None:
+        return jsonify({"status": "failed", "message": f"Partition {partition_id} has no file system."}), 400
+    return Response(
+        stream_with_context(iter_timeline_download(
+            current_dir, partition_id, timeline_format,
+            exclude_known=request.args.get('include_known') not in ('1', 'true'), evidence_id=evidence_id)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=partition_{partition_id}_timeline.{extension}"})
+
+
+@evidence_route('/api/timelines/export', methods=['POST'])
+def api_export_timelines(evidence_id):
+    """
+    Submits a background job writing the timelines of several partitions concurrently.
+    Repeat the 'partition_id' query parameter to select partitions (all by default);
+    'format' is 'bodyfile' or 'jsonl'; 'include_known=1' keeps known-good files.
+    """
+    return submit_job(
+        "export_timelines", method_export_timelines, cwd=current_dir,
+        partition_ids=request.args.getlist('partition_id', type=int),
+        timeline_format=request.args.get('format', 'bodyfile'),
+        exclude_known=request.args.get('include_known') not in ('1', 'true'),
+        evidence_id=evidence_id)
+
+
+@evidence_route('/api/partition/<int:partition_id>/hash_files', methods=['POST'])
+def api_hash_partition_files(partition_id, evidence_id):
+    """
+    Submits a background job hashing every allocated file of a partition.
+    Once it finishes, files in the known-good hash set configured under
+    'known_hash_set_path' in config.json are left out of email, search and
+    timeline results.
+    """
+    return submit_job("hash_files", method_hash_partition_files, cwd=current_dir, partition_id=partition_id,
+                      evidence_id=evidence_id)
+
+
+@app.route('/api/evidence')
+def api_list_evidence():
+    """API endpoint listing the stored evidence images, most recent first; 'case_id' selects one case."""
+    return jsonify({"status": "passed", "evidence": list_evidence(current_dir, request.args.get('case_id'))})
+
+
+@app.route('/api/evidence', methods=['POST'])
+def api_create_evidence():
+    """
+    API endpoint creating evidence before its data is uploaded.
+    Expects JSON with 'filename' and optionally 'case_id'. With 'segment_count'
+    the image is uploaded as EWF segments: they are sent, in any order and in
+    parallel, as raw request bodies to the returned segment URL, followed by a
+    POST to the finalize URL. Without it, the file is sent to /upload with the
+    evidence ID in the X-Evidence-ID header, and its progress can be polled
+    at the returned progress URL.
+    """
+    payload = request.get_json(silent=True) or {}
+    filename = secure_filename(payload.get('filename') or '')
+    try:
+        segment_count = int(payload.get('segment_count') or 0)
+    except (TypeError, ValueError):
+        segment_count = -1
+    if filename == '' or segment_count < 0:
+        return jsonify({"status": "failed",
+                        "message": "'filename' is required and 'segment_count' must be positive."}), 400
+
+    case_id = secure_filename(payload.get('case_id') or request.headers.get('X-Case-ID') or '') or DEFAULT_CASE_ID
+    evidence = create_evidence(current_dir, filename, case_id, segment_count=segment_count or None)
+    evidence_id = evidence["evidence_id"]
+    result = {
+        "status": "passed",
+        "evidence_id": evidence_id,
+        "case_id": evidence["case_id"],
+    }
+    if segment_count:
+        result.update({
+            "segment_url": f"/api/evidence/{evidence_id}/segments/<filename>",
+            "finalize_url": url_for('api_finalize_evidence', evidence_id=evidence_id)
+        })
+    else:
+        result.update({
+            "upload_url": url_for('upload_file'),
+            "progress_url": url_for('api_upload_progress', evidence_id=evidence_id)
+        })
+    return jsonify(result), 201
+
+
+@app.route('/api/evidence/<evidence_id>/segments/<filename>', methods=['PUT'])
+def api_upload_segment(evidence_id, filename):
+    """
+    API endpoint receiving one EWF segment (e.g. 'laptop.E02') as the raw request body.
+    The segment is hashed while it is written; optional X-Expected-MD5/SHA1/SHA256
+    headers are checked against the segment's hashes.
+    """
+    evidence = get_evidence(current_dir, evidence_id)
+    if evidence["status"] != "uploading":
+        return jsonify({"status": "failed", "message": "This evidence has already been finalized."}), 409
+    if "segment_count" not in evidence:
+        return jsonify({"status": "failed", "message": "This evidence was not created for a segmented upload."}), 409
+
+    expected_hashes = {name: request.headers.get(f"X-Expected-{name.upper()}") for name in INTAKE_HASH_ALGORITHMS}
+    segment = method_receive_segment(request.stream, get_evidence_dir(current_dir, evidence_id), filename,
+                                     total_bytes=request.content_length, expected_hashes=expected_hashes)
+    if segment["status"] != "passed":
+        return jsonify(segment), 400
+    record_evidence_segment(current_dir, evidence_id, segment)
+    print(f"Received segment {filename} of {evidence_id} ({segment['hashes']['bytes_written']:,} bytes)")
+    return jsonify(segment)
+
+
+@app.route('/api/evidence/<evidence_id>/finalize', methods=['POST'])
+def api_finalize_evidence(evidence_id):
+    """
+    API endpoint completing a segmented upload.
+    Validates the segment set and makes the image available; an incomplete
+    set is reported with a 400 and more segments can still be sent.
+    """
+    evidence = get_evidence(current_dir, evidence_id)
+    if evidence["status"] != "uploading":
+        return jsonify({"status": "failed", "message": "This evidence has already been finalized."}), 409
+    if "segment_count" not in evidence:
+        return jsonify({"status": "failed", "message": "This evidence was not created for a segmented upload."}), 409
+
+    validation, file_info = process_segmented_upload(evidence_id)
+    if file_info is None:
+        return jsonify(validation), 400
+    evidence = mark_evidence_ready(current_dir, evidence_id)
+    return jsonify({
+        "success": True,
+        "evidence_id": evidence_id,
+        "case_id": evidence["case_id"],
+        "segment_count": validation["segment_count"],
+        "redirect_url": url_for('dashboard', evidence_id=evidence_id),
+        "hashes": file_info["hashes"],
+        "verification": file_info["verification"]
+    })
+
+
+@app.route('/api/evidence/<evidence_id>')
+def api_get_evidence(evidence_id):
+    """API endpoint returning the record and intake hashes of one evidence image."""
+    return jsonify({"status": "passed", "evidence": get_evidence(current_dir, evidence_id)})
+
+
+@app.route('/api/evidence/<evidence_id>', methods=['DELETE'])
+def api_delete_evidence(evidence_id):
+    """API endpoint removing an evidence image together with everything extracted from it."""
+    delete_evidence(current_dir, evidence_id)
+    tool_result_cache.clear()
+    return jsonify({"status": "passed", "evidence_id": evidence_id})
+
+
+@app.route('/api/cases')
+def api_list_cases():
+    """API endpoint listing the case IDs of the stored evidence with their number of images."""
+    return jsonify({"status": "passed", "cases": list_cases(current_dir)})
+
+
+@app.route('/api/ewf_cache_stats')
+def api_ewf_cache_stats():
+    """API endpoint reporting the hit, miss and eviction counters of the EWF chunk cache."""
+    return jsonify(ewf_chunk_cache.stats())
+
+
+@app.route('/api/metrics')
+def api_metrics():
+    """API endpoint exposing the instrumentation counters and histograms in Prometheus text format."""
+    return Response(render_prometheus_text(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/jobs')
+def api_list_jobs():
+    """API endpoint listing background jobs, most recent first."""
+    return jsonify({"status": "passed", "jobs": get_job_queue(current_dir).list_jobs()})
+
+
+@app.route('/api/jobs/<job_id>')
+def api_get_job(job_id):
+    """API endpoint reporting the status and progress of a background job."""
+    job = get_job_queue(current_dir).get_job(job_id)
+    if job is None:
+        return jsonify({"status": "failed", "message": "Unknown job."}), 404
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/result')
+def api_get_job_result(job_id):
+    """
+    API endpoint returning the result of a finished background job.
+    Responds with 409 and the job's status while it is still queued or running.
+    """
+    queue = get_job_queue(current_dir)
+    job = queue.get_job(job_id)
+    if job is None:
+        return jsonify({"status": "failed", "message": "Unknown job."}), 404
+    if job["status"] in ("queued", "running"):
+        return jsonify(job), 409
+    result = queue.get_result(job_id)
+    if result is None:
+        return jsonify({"status": "failed", "message": job["error"]}), 500
+    return jsonify(result)
+
+
 
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
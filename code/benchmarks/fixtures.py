@@ -0,0 +1,417 @@
+"""Builders for the synthetic evidence used by the benchmarks.
+
+Everything is written in pure Python so the fixtures can be generated on any
+machine: a regf SAM hive with F and V values per account, a Windows Mail
+folder tree of .eml files, and a raw MBR disk image holding one FAT16
+partition (with long file names) that contains both.
+"""
+
+import struct
+from datetime import datetime, timedelta, timezone
+
+SECTOR_SIZE = 512
+
+# 2004-08-19 12:00:00 UTC, as used for every fixture timestamp.
+FIXTURE_TIME = datetime(2004, 8, 19, 12, 0, 0, tzinfo=timezone.utc)
+
+NEVER_EXPIRES = 0x7FFFFFFFFFFFFFFF
+
+DEFAULT_ACCOUNTS = (
+    (500, "Administrator", "", "Built-in account for administering the computer/domain"),
+    (501, "Guest", "", "Built-in account for guest access to the computer/domain"),
+    (1000, "Mr. Evil", "Greg Schardt", ""),
+    (1001, "Wes Mantooth", "Wes Mantooth", "Field reporter"),
+)
+
+MAIL_DIRECTORY = "Users/{username}/AppData/Local/Microsoft/Windows Mail/Local Folders"
+
+
+def to_filetime(moment):
+    """Converts a datetime to a Windows FILETIME (100 ns intervals since 1601)."""
+    return int((moment - datetime(1601, 1, 1, tzinfo=timezone.utc)) / timedelta(microseconds=1)) * 10
+
+
+# --- regf (registry hive) writer -------------------------------------------
+
+class RegistryKey:
+    """A key of a hive under construction: its name, values and subkeys."""
+
+    def __init__(self, name):
+        self.name = name
+        self.values = []  # (name, data type, data bytes)
+        self.subkeys = []
+
+    def add_key(self, name):
+        key = RegistryKey(name)
+        self.subkeys.append(key)
+        return key
+
+    def add_value(self, name, data_type, data):
+        self.values.append((name, data_type, data))
+
+
+def _align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+class _HiveBinWriter:
+    """Allocates cells in a single hive bin. Offsets are relative to the first hive bin."""
+
+    HBIN_HEADER_SIZE = 0x20
+
+    def __init__(self):
+        self.data = bytearray(self.HBIN_HEADER_SIZE)
+
+    def allocate(self, payload):
+        offset = len(self.data)
+        cell_size = _align(len(payload) + 4, 8)
+        self.data += struct.pack("<i", -cell_size) + payload + bytes(cell_size - 4 - len(payload))
+        return offset
+
+    def patch(self, cell_offset, field_offset, fmt, *values):
+        struct.pack_into(fmt, self.data, cell_offset + 4 + field_offset, *values)
+
+
+NK_FIXED_SIZE = 0x4C
+KEY_COMP_NAME = 0x0020
+KEY_HIVE_ENTRY = 0x0004
+KEY_NO_DELETE = 0x0008
+VALUE_COMP_NAME = 0x0001
+NO_OFFSET = 0xFFFFFFFF
+
+
+def build_hive(root, timestamp=FIXTURE_TIME):
+    """Serializes a RegistryKey tree into the bytes of a regf hive file."""
+    bins = _HiveBinWriter()
+    filetime = to_filetime(timestamp)
+
+    def write_key(key, parent_offset, flags):
+        name = key.name.encode("ascii")
+        nk = bytearray(NK_FIXED_SIZE + len(name))
+        struct.pack_into("<2sHQ", nk, 0, b"nk", flags | KEY_COMP_NAME, filetime)
+        struct.pack_into("<IIIIIIIIIIIIIIIHH", nk, 0x0C,
+                         0, parent_offset, 0, 0, NO_OFFSET, NO_OFFSET, 0, NO_OFFSET, NO_OFFSET, NO_OFFSET,
+                         0, 0, 0, 0, 0, len(name), 0)
+        nk[NK_FIXED_SIZE:] = name
+        key_offset = bins.allocate(bytes(nk))
+
+        if key.values:
+            value_offsets = []
+            for value_name, data_type, data in key.values:
+                encoded_name = value_name.encode("ascii")
+                if len(data) <= 4:
+                    data_size = len(data) | 0x80000000
+                    data_field = struct.unpack("<I", data.ljust(4, b"\0"))[0]
+                else:
+                    data_size = len(data)
+                    data_field = bins.allocate(data)
+                vk = struct.pack("<2sHIIIHH", b"vk", len(encoded_name), data_size, data_field, data_type,
+                                 VALUE_COMP_NAME if encoded_name else 0, 0) + encoded_name
+                value_offsets.append(bins.allocate(vk))
+            values_list_offset = bins.allocate(struct.pack(f"<{len(value_offsets)}I", *value_offsets))
+            bins.patch(key_offset, 0x24, "<II", len(value_offsets), values_list_offset)
+            bins.patch(key_offset, 0x3C, "<II", max(len(name) * 2 for name, _, _ in key.values),
+                       max(len(data) for _, _, data in key.values))
+
+        if key.subkeys:
+            subkeys = sorted(key.subkeys, key=lambda subkey: subkey.name.upper())
+            subkey_offsets = [write_key(subkey, key_offset, 0) for subkey in subkeys]
+            lf = struct.pack("<2sH", b"lf", len(subkeys)) + b"".join(
+                struct.pack("<I4s", offset, subkey.name.encode("ascii")[:4].ljust(4, b"\0"))
+                for offset, subkey in zip(subkey_offsets, subkeys))
+            bins.patch(key_offset, 0x14, "<I", len(subkeys))
+            bins.patch(key_offset, 0x1C, "<I", bins.allocate(lf))
+            bins.patch(key_offset, 0x34, "<I", max(len(subkey.name) * 2 for subkey in subkeys))
+        return key_offset
+
+    root_offset = write_key(root, NO_OFFSET, KEY_HIVE_ENTRY | KEY_NO_DELETE)
+
+    # Pad the bin to a 4 KiB multiple with one free cell and fill in its header.
+    bin_size = _align(len(bins.data), 4096)
+    if bin_size > len(bins.data):
+        free_size = bin_size - len(bins.data)
+        bins.data += struct.pack("<i", free_size) + bytes(free_size - 4)
+    struct.pack_into("<4sII", bins.data, 0, b"hbin", 0, bin_size)
+    struct.pack_into("<Q", bins.data, 0x14, filetime)
+
+    base_block = bytearray(4096)
+    struct.pack_into("<4sIIQIIIIIII", base_block, 0, b"regf", 1, 1, filetime, 1, 3, 0, 1,
+                     root_offset, bin_size, 1)
+    base_block[0x30:0x30 + 8] = "SAM".encode("utf-16-le").ljust(8, b"\0")
+    checksum = 0
+    for (dword,) in struct.iter_unpack("<I", bytes(base_block[:0x1FC])):
+        checksum ^= dword
+    struct.pack_into("<I", base_block, 0x1FC, checksum)
+    return bytes(base_block) + bytes(bins.data)
+
+
+def build_f_value(rid, last_logon, login_count, uac_flags=0x0200):
+    """Builds an 80-byte SAM F value laid out as in f_value_offsets.csv."""
+    f_value = bytearray(80)
+    struct.pack_into("<H", f_value, 0x00, 2)
+    struct.pack_into("<Q", f_value, 0x08, to_filetime(last_logon) if last_logon else 0)
+    struct.pack_into("<Q", f_value, 0x18, to_filetime(FIXTURE_TIME - timedelta(days=30)))
+    struct.pack_into("<Q", f_value, 0x20, NEVER_EXPIRES)
+    struct.pack_into("<Q", f_value, 0x28, 0)
+    struct.pack_into("<I", f_value, 0x30, rid)
+    struct.pack_into("<I", f_value, 0x38, uac_flags)
+    struct.pack_into("<H", f_value, 0x40, 0)
+    struct.pack_into("<H", f_value, 0x42, login_count)
+    return bytes(f_value)
+
+
+def build_v_value(username, full_name="", comment="", home_directory=""):
+    """Builds a SAM V value with the header fields listed in v_value_header_offsets.csv."""
+    data_area_start = 0xCC
+    header = bytearray(data_area_start)
+    data_area = bytearray()
+    for header_offset, text in ((0x0C, username), (0x18, full_name), (0x24, comment), (0x30, home_directory)):
+        encoded = text.encode("utf-16-le")
+        struct.pack_into("<II", header, header_offset, len(data_area), len(encoded))
+        data_area += encoded + bytes(_align(len(encoded), 4) - len(encoded))
+    struct.pack_into("<QQQ", header, 0x5C, to_filetime(FIXTURE_TIME), to_filetime(FIXTURE_TIME), 0)
+    return bytes(header) + bytes(data_area)
+
+
+def build_sam_hive(accounts=DEFAULT_ACCOUNTS):
+    """Builds a SAM hive with an F and V value per account and the Users/Names index.
+
+    Args:
+        accounts (iterable): (RID, username, full name, comment) tuples.
+    """
+    root = RegistryKey("CMI-CreateHive{899121E8-11D8-41B6-ACEB-301713D5ED8C}")
+    users = root.add_key("SAM").add_key("Domains").add_key("Account").add_key("Users")
+    names = users.add_key("Names")
+    for index, (rid, username, full_name, comment) in enumerate(accounts):
+        user_key = users.add_key(f"{rid:08X}")
+        last_logon = FIXTURE_TIME + timedelta(hours=index) if rid >= 1000 else None
+        uac_flags = 0x0202 if rid == 501 else 0x0200  # Guest is disabled, as on a fresh install
+        user_key.add_value("F", 3, build_f_value(rid, last_logon, login_count=index * 3, uac_flags=uac_flags))
+        user_key.add_value("V", 3, build_v_value(username, full_name, comment))
+        # The RID is stored as the data type of the default value.
+        names.add_key(username).add_value("", rid, b"")
+    return build_hive(root)
+
+
+# --- Mail fixtures ---------------------------------------------------------
+
+def build_eml(index, username):
+    """Builds a small RFC 822 message; every tenth one is about PGP trial software."""
+    sent = FIXTURE_TIME - timedelta(days=index % 90, minutes=index)
+    topic = "PGP trial software" if index % 10 == 0 else f"Story notes #{index}"
+    body = (f"Hi,\r\n\r\nFollowing up on {topic.lower()}. Message number {index}.\r\n"
+            + "Filler line for a realistic message size.\r\n" * (index % 7 + 3)
+            + f"\r\nRegards,\r\n{username}\r\n")
+    return (f"From: {username} <{username.split()[0].lower()}@channel4.example>\r\n"
+            f"To: Ron Burgundy <ron@channel4.example>\r\n"
+            f"Subject: {topic}\r\n"
+            f"Date: {sent.strftime('%a, %d %b %Y %H:%M:%S +0000')}\r\n"
+            f"Message-ID: <{index}.{username.replace(' ', '')}@channel4.example>\r\n"
+            "MIME-Version: 1.0\r\n"
+            "Content-Type: text/plain; charset=us-ascii\r\n"
+            "\r\n" + body).encode("ascii")
+
+
+def build_mail_tree(username, email_count, folders=("Inbox", "Sent Items", "Archive/2004")):
+    """Returns {relative path: content} for a Windows Mail store spread over several folders."""
+    base = MAIL_DIRECTORY.format(username=username)
+    files = {}
+    for index in range(email_count):
+        folder = folders[index % len(folders)]
+        files[f"{base}/{folder}/{{{index:08X}-0000-0000-0000-000000000000}}.eml"] = build_eml(index, username)
+    return files
+
+
+# --- FAT16 file system and MBR disk image ----------------------------------
+
+def _fat_date_time(moment):
+    date = ((moment.year - 1980) << 9) | (moment.month << 5) | moment.day
+    time = (moment.hour << 11) | (moment.minute << 5) | (moment.second // 2)
+    return date, time
+
+
+_SHORT_NAME_CHARACTERS = set("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!#$%&'()-@^_`{}~")
+
+
+def _short_name_candidate(name):
+    base, _, extension = name.rpartition(".") if "." in name[1:] else (name, "", "")
+    clean = lambda text: "".join(c for c in text.upper() if c in _SHORT_NAME_CHARACTERS)
+    return clean(base), clean(extension)[:3]
+
+
+def _make_short_name(name, used_names):
+    """Returns the 11-byte 8.3 name of an entry and whether it needs long file name entries."""
+    base, extension = _short_name_candidate(name)
+    exact = f"{base}.{extension}" if extension else base
+    if exact == name and 0 < len(base) <= 8 and exact not in used_names:
+        used_names.add(exact)
+        return (base.ljust(8) + extension.ljust(3)).encode("ascii"), False
+    for number in range(1, 1000000):
+        suffix = f"~{number}"
+        candidate = (base or "FILE")[:8 - len(suffix)] + suffix
+        key = f"{candidate}.{extension}"
+        if key not in used_names:
+            used_names.add(key)
+            return (candidate.ljust(8) + extension.ljust(3)).encode("ascii"), True
+    raise ValueError(f"Cannot create a unique short name for {name}")
+
+
+def _short_name_checksum(short_name):
+    checksum = 0
+    for byte in short_name:
+        checksum = (((checksum & 1) << 7) + (checksum >> 1) + byte) & 0xFF
+    return checksum
+
+
+def _long_name_entries(name, short_name):
+    """Builds the long file name entries preceding a short entry, last part first."""
+    encoded = name.encode("utf-16-le") + b"\0\0"
+    encoded += b"\xff" * (-len(encoded) % 26)
+    checksum = _short_name_checksum(short_name)
+    parts = [encoded[i:i + 26] for i in range(0, len(encoded), 26)]
+    entries = []
+    for sequence, part in enumerate(parts, 1):
+        order = sequence | (0x40 if sequence == len(parts) else 0)
+        entries.append(struct.pack("<B10sBBB12sH4s", order, part[:10], 0x0F, 0, checksum, part[10:22], 0, part[22:26]))
+    return list(reversed(entries))
+
+
+def _directory_entry(short_name, attributes, first_cluster, size, moment):
+    date, time = _fat_date_time(moment)
+    return struct.pack("<11sBBBHHHHHHHI", short_name, attributes, 0, 0, time, date, date, 0, time, date,
+                       first_cluster, size)
+
+
+class Fat16Builder:
+    """Writes a FAT16 file system from a mapping of paths to file contents."""
+
+    SECTORS_PER_CLUSTER = 4
+    RESERVED_SECTORS = 1
+    ROOT_ENTRIES = 512
+
+    def __init__(self, total_sectors, hidden_sectors=0):
+        self.total_sectors = total_sectors
+        self.hidden_sectors = hidden_sectors
+        self.cluster_size = self.SECTORS_PER_CLUSTER * SECTOR_SIZE
+        self.root_dir_sectors = self.ROOT_ENTRIES * 32 // SECTOR_SIZE
+        self.fat_sectors = 1
+        while True:
+            data_sectors = total_sectors - self.RESERVED_SECTORS - 2 * self.fat_sectors - self.root_dir_sectors
+            self.cluster_count = data_sectors // self.SECTORS_PER_CLUSTER
+            needed = _align((self.cluster_count + 2) * 2, SECTOR_SIZE) // SECTOR_SIZE
+            if needed <= self.fat_sectors:
+                break
+            self.fat_sectors = needed
+        if not 4085 <= self.cluster_count < 65525:
+            raise ValueError(f"{total_sectors} sectors do not make a FAT16 volume")
+        self.fat = [0] * (self.cluster_count + 2)
+        self.fat[0], self.fat[1] = 0xFFF8, 0xFFFF
+        self.next_cluster = 2
+        self.clusters = {}
+
+    def _allocate(self, size):
+        count = max(1, _align(size, self.cluster_size) // self.cluster_size)
+        first = self.next_cluster
+        if first + count > self.cluster_count + 2:
+            raise ValueError("The fixture does not fit in the FAT16 volume")
+        for cluster in range(first, first + count):
+            self.fat[cluster] = cluster + 1 if cluster < first + count - 1 else 0xFFFF
+        self.next_cluster += count
+        return first
+
+    def _write_directory(self, tree, own_cluster, parent_cluster, moment):
+        entries = []
+        if own_cluster is not None:
+            entries.append(_directory_entry(b".          ", 0x10, own_cluster, 0, moment))
+            entries.append(_directory_entry(b"..         ", 0x10, parent_cluster or 0, 0, moment))
+        used_names = set()
+        for name, content in sorted(tree.items()):
+            short_name, needs_long_name = _make_short_name(name, used_names)
+            if needs_long_name:
+                entries.extend(_long_name_entries(name, short_name))
+            if isinstance(content, dict):
+                size = (len(content) * 4 + 3) * 32
+                cluster = self._allocate(size)
+                self._write_directory(content, cluster, own_cluster, moment)
+                entries.append(_directory_entry(short_name, 0x10, cluster, 0, moment))
+            else:
+                cluster = self._allocate(len(content)) if content else 0
+                if content:
+                    self.clusters[cluster] = content
+                entries.append(_directory_entry(short_name, 0x20, cluster, len(content), moment))
+        data = b"".join(entries)
+        if own_cluster is None:
+            if len(data) > self.ROOT_ENTRIES * 32:
+                raise ValueError("Too many entries in the root directory")
+            self.root_directory = data
+        else:
+            self.clusters[own_cluster] = data
+
+    def build(self, files, moment=FIXTURE_TIME):
+        """Returns the bytes of the volume holding files ({"dir/sub/name": bytes})."""
+        tree = {}
+        for path, content in files.items():
+            node = tree
+            parts = path.strip("/").split("/")
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+            node[parts[-1]] = content
+        self.root_directory = b""
+        self._write_directory(tree, None, None, moment)
+
+        volume = bytearray(self.total_sectors * SECTOR_SIZE)
+        boot_sector = struct.pack(
+            "<3s8sHBHBHHBHHHIIBBBI11s8s", b"\xeb\x3c\x90", b"MSWIN4.1", SECTOR_SIZE, self.SECTORS_PER_CLUSTER,
+            self.RESERVED_SECTORS, 2, self.ROOT_ENTRIES, 0 if self.total_sectors > 0xFFFF else self.total_sectors,
+            0xF8, self.fat_sectors, 63, 255, self.hidden_sectors,
+            self.total_sectors if self.total_sectors > 0xFFFF else 0, 0x80, 0, 0x29, 0x20040819,
+            b"FIXTURE    ", b"FAT16   ")
+        volume[0:len(boot_sector)] = boot_sector
+        volume[510:512] = b"\x55\xaa"
+
+        fat_bytes = struct.pack(f"<{len(self.fat)}H", *self.fat)
+        for copy in range(2):
+            start = (self.RESERVED_SECTORS + copy * self.fat_sectors) * SECTOR_SIZE
+            volume[start:start + len(fat_bytes)] = fat_bytes
+        root_start = (self.RESERVED_SECTORS + 2 * self.fat_sectors) * SECTOR_SIZE
+        volume[root_start:root_start + len(self.root_directory)] = self.root_directory
+        data_start = root_start + self.root_dir_sectors * SECTOR_SIZE
+        for cluster, content in self.clusters.items():
+            start = data_start + (cluster - 2) * self.cluster_size
+            volume[start:start + len(content)] = content
+        return bytes(volume)
+
+
+def build_mbr(partitions, disk_signature=0x20040819):
+    """Builds a master boot record for (first LBA, sector count, partition type) entries."""
+    mbr = bytearray(SECTOR_SIZE)
+    struct.pack_into("<I", mbr, 440, disk_signature)
+    for index, (first_lba, sector_count, partition_type) in enumerate(partitions):
+        struct.pack_into("<B3sB3sII", mbr, 446 + index * 16, 0x80 if index == 0 else 0,
+                         b"\xfe\xff\xff", partition_type, b"\xfe\xff\xff", first_lba, sector_count)
+    mbr[510:512] = b"\x55\xaa"
+    return bytes(mbr)
+
+
+def build_disk_image(output_path, email_count=200, accounts=DEFAULT_ACCOUNTS, mail_user="Wes Mantooth",
+                     partition_sectors=65536, first_lba=2048):
+    """Writes a raw disk image with one FAT16 partition holding a SAM hive and a mail store.
+
+    The partition contains Windows/System32/config/SAM, a Users directory per
+    account and mail_user's Windows Mail tree with email_count messages, so
+    partition detection, the SAM methods and the email methods all have data.
+
+    Returns:
+        dict: The partition number, the mail user and the number of emails.
+    """
+    files = {"Windows/System32/config/SAM": build_sam_hive(accounts)}
+    for _, username, _, _ in accounts:
+        files[f"Users/{username}/NTUSER.DAT"] = b"regf" + bytes(4092)
+    files.update(build_mail_tree(mail_user, email_count))
+
+    volume = Fat16Builder(partition_sectors, hidden_sectors=first_lba).build(files)
+    with open(output_path, "wb") as image_file:
+        image_file.write(build_mbr([(first_lba, partition_sectors, 0x06)]))
+        image_file.write(bytes((first_lba - 1) * SECTOR_SIZE))
+        image_file.write(volume)
+    return {"partition_id": 1, "mail_user": mail_user, "email_count": email_count}
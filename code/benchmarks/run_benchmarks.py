@@ -0,0 +1,191 @@
+"""Times the api_methods entry points against a generated fixture image.
+
+Run from the code directory:
+
+    python -m benchmarks.run_benchmarks --runs 5 --report benchmark_report.json
+
+Every benchmark is timed once cold (all caches and open handles dropped) and
+then --runs times warm. The report is compared with --baseline when that file
+exists; a benchmark regresses when its cold time or warm median exceeds the
+baseline by more than --threshold (a fraction) and by more than --min-delta
+seconds. The exit status is 1 when any benchmark regressed. Pass
+--update-baseline to store the report as the new baseline instead. Timings
+depend on the machine, so refresh the baseline when the hardware changes.
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from api_methods import check_partitions, collect_user_emails, known_files, sam_hive_cache
+from api_methods.ai_search_dir import tool_cache
+from api_methods.check_partitions import method_test_partitions
+from api_methods.collect_user_emails import method_get_user_emails
+from api_methods.common import get_e01_path, get_extracted_file_path
+from api_methods.email_index import ensure_user_emails_indexed, method_search_user_emails
+from api_methods.evidence_session import close_evidence_session
+from api_methods.file_extraction import method_extract_file_from_e01
+from api_methods.get_all_users_full import method_get_all_users_full
+from api_methods.get_user_f_value_data_with_rid import method_get_user_f_value_data_with_rid
+from api_methods.get_user_f_value_flags_with_rid import method_get_user_f_value_flags_with_rid
+from api_methods.get_user_v_value_data_with_rid import method_get_user_v_value_data_with_rid
+from api_methods.get_usernames_and_rids import method_get_usernames_and_rids
+from api_methods.get_volume_information import method_get_volume_information
+
+from .fixtures import build_disk_image
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+BENCHMARK_RID = 1001
+
+
+def reset_caches(cwd):
+    """Drops the open image handles and the in-process caches, as after a server restart."""
+    close_evidence_session(get_e01_path(cwd))
+    for cached_module in (check_partitions, collect_user_emails, known_files, sam_hive_cache, tool_cache):
+        cached_module.clear_caches()
+    for derived_file in ("email_index.sqlite3", "email_index.sqlite3-wal", "email_index.sqlite3-shm"):
+        (Path(cwd) / "uploads" / derived_file).unlink(missing_ok=True)
+
+
+def get_benchmarks(cwd, fixture):
+    """Returns (name, setup, call) tuples; setup runs untimed before every call."""
+    e01_path = get_e01_path(cwd)
+    partition_id = fixture["partition_id"]
+    username = fixture["mail_user"]
+    extracted_sam = get_extracted_file_path(cwd, partition_id, "/Windows/System32/config/SAM")
+    no_setup = lambda: None
+
+    return [
+        ("test_partitions", no_setup, lambda: method_test_partitions(e01_path)),
+        ("get_volume_information", no_setup, lambda: method_get_volume_information(e01_path)),
+        ("extract_file_from_e01", lambda: extracted_sam.unlink(missing_ok=True),
+         lambda: method_extract_file_from_e01(cwd, partition_id)),
+        ("get_usernames_and_rids", no_setup, lambda: method_get_usernames_and_rids(partition_id, cwd)),
+        ("get_user_f_value_data_with_rid", no_setup,
+         lambda: method_get_user_f_value_data_with_rid(cwd, partition_id, BENCHMARK_RID)),
+        ("get_user_f_value_flags_with_rid", no_setup,
+         lambda: method_get_user_f_value_flags_with_rid(cwd, partition_id, BENCHMARK_RID)),
+        ("get_user_v_value_data_with_rid", no_setup,
+         lambda: method_get_user_v_value_data_with_rid(cwd, partition_id, BENCHMARK_RID)),
+        ("get_all_users_full", no_setup, lambda: method_get_all_users_full(cwd, partition_id)),
+        ("get_user_emails", no_setup, lambda: method_get_user_emails(cwd, username, partition_id)),
+        ("search_user_emails", no_setup,
+         lambda: (ensure_user_emails_indexed(cwd, username, partition_id),
+                  method_search_user_emails(cwd, username, partition_id, query="PGP trial software"))[1]),
+    ]
+
+
+def check_result(name, result):
+    """Fails the benchmark run when an entry point reports an error instead of data."""
+    if result is None or (isinstance(result, dict) and result.get("status") == "failed"):
+        raise RuntimeError(f"Benchmark {name} returned {result!r}")
+    if isinstance(result, list) and not result:
+        raise RuntimeError(f"Benchmark {name} returned no results")
+
+
+def time_call(setup, call):
+    setup()
+    started = time.perf_counter()
+    result = call()
+    return time.perf_counter() - started, result
+
+
+def run_benchmarks(cwd, fixture, runs):
+    results = {}
+    for name, setup, call in get_benchmarks(cwd, fixture):
+        reset_caches(cwd)
+        cold_seconds, result = time_call(setup, call)
+        check_result(name, result)
+        warm_seconds = [time_call(setup, call)[0] for _ in range(runs)]
+        results[name] = {
+            "cold_seconds": cold_seconds,
+            "warm_min_seconds": min(warm_seconds),
+            "warm_median_seconds": statistics.median(warm_seconds),
+            "warm_mean_seconds": statistics.fmean(warm_seconds),
+            "warm_max_seconds": max(warm_seconds),
+            "runs": runs,
+        }
+        print(f"{name:34} cold {cold_seconds * 1000:9.2f} ms   warm median "
+              f"{results[name]['warm_median_seconds'] * 1000:9.2f} ms")
+    return results
+
+
+def compare_with_baseline(report, baseline, threshold, min_delta):
+    """Returns one message per benchmark metric that is slower than the baseline allows."""
+    regressions = []
+    for name, result in report["benchmarks"].items():
+        baseline_result = baseline.get("benchmarks", {}).get(name)
+        if not baseline_result:
+            continue
+        for metric in ("cold_seconds", "warm_median_seconds"):
+            current, previous = result[metric], baseline_result[metric]
+            if current > previous * (1 + threshold) and current - previous > min_delta:
+                regressions.append(f"{name} {metric}: {previous * 1000:.2f} ms -> {current * 1000:.2f} ms "
+                                   f"(+{(current / previous - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="warm runs per benchmark")
+    parser.add_argument("--emails", type=int, default=300, help="number of .eml files in the fixture")
+    parser.add_argument("--report", default="benchmark_report.json", help="where to write the JSON report")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="baseline report to compare with")
+    parser.add_argument("--threshold", type=float, default=0.3, help="allowed slowdown as a fraction")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="ignore slowdowns below this many seconds")
+    parser.add_argument("--update-baseline", action="store_true", help="store the report as the baseline")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep the generated fixture directory")
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix="triage-benchmark-"))
+    try:
+        (workdir / "uploads").mkdir()
+        print(f"[*] Building fixture image in {workdir}...")
+        started = time.perf_counter()
+        fixture = build_disk_image(get_e01_path(workdir), email_count=args.emails)
+        print(f"[+] Fixture built in {time.perf_counter() - started:.2f} s.")
+
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "fixture": fixture,
+            "benchmarks": run_benchmarks(str(workdir), fixture, args.runs),
+        }
+        close_evidence_session(get_e01_path(workdir))
+    finally:
+        if args.keep_workdir:
+            print(f"[*] Fixture kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    Path(args.report).write_text(json.dumps(report, indent=2))
+    print(f"[+] Report written to {args.report}")
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.write_text(json.dumps(report, indent=2))
+        print(f"[+] Baseline updated: {baseline_path}")
+        return 0
+    if not baseline_path.exists():
+        print(f"[*] No baseline at {baseline_path}; run with --update-baseline to create one.")
+        return 0
+
+    regressions = compare_with_baseline(report, json.loads(baseline_path.read_text()), args.threshold,
+                                        args.min_delta)
+    for regression in regressions:
+        print(f"[-] Regression: {regression}")
+    if not regressions:
+        print("[+] No regressions against the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
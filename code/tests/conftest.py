@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The application imports api_methods and benchmarks from the code directory.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,72 @@
+import hashlib
+from email.encoders import encode_quopri
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import pytest
+
+from api_methods.email_attachments import MAX_LINE_LENGTH, extract_attachments_from_lines, iter_lines
+
+# Quoted-printable line breaks decode to the line endings of the message, here "\n".
+REPORT = b"quarterly numbers\n" * 500
+KEY = bytes(range(256)) * 8
+
+
+def _build_message():
+    message = MIMEMultipart("mixed")
+    message["Subject"] = "PGP trial software"
+    alternative = MIMEMultipart("alternative")
+    alternative.attach(MIMEText("See attached.", "plain"))
+    alternative.attach(MIMEText("<p>See attached.</p>", "html"))
+    message.attach(alternative)
+    message.attach(MIMEApplication(REPORT, Name="report.txt", _encoder=encode_quopri))
+    message.attach(MIMEApplication(KEY, Name="key.bin"))
+    message.attach(MIMEApplication(KEY, Name="key copy.bin"))
+    for part in message.get_payload()[1:]:
+        part.add_header("Content-Disposition", "attachment", filename=part.get_param("name"))
+    return message.as_bytes()
+
+
+def _chunks(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def test_iter_lines_keeps_line_endings_across_chunks():
+    data = b"first\r\nsecond\nthird"
+    assert list(iter_lines(_chunks(data, 3))) == [b"first\r\n", b"second\n", b"third"]
+
+
+def test_iter_lines_cuts_overlong_lines():
+    lines = list(iter_lines(_chunks(b"x" * (MAX_LINE_LENGTH * 2 + 5), 4096)))
+    assert [len(line) for line in lines] == [MAX_LINE_LENGTH, MAX_LINE_LENGTH, 5]
+
+
+def test_attachments_are_decoded_and_stored_once(tmp_path):
+    message = _build_message()
+    attachments = extract_attachments_from_lines(iter_lines(_chunks(message, 1000)), tmp_path)
+
+    assert [attachment["filename"] for attachment in attachments] == ["report.txt", "key.bin", "key copy.bin"]
+    assert [attachment["part_index"] for attachment in attachments] == [3, 4, 5]
+    report, key, key_copy = attachments
+    assert report["size"] == len(REPORT) and report["sha256"] == hashlib.sha256(REPORT).hexdigest()
+    assert key["md5"] == hashlib.md5(KEY).hexdigest() and key["sha1"] == hashlib.sha1(KEY).hexdigest()
+    assert key["new"] and not key_copy["new"] and key_copy["sha256"] == key["sha256"]
+    blob_path = tmp_path / key["sha256"][:2] / key["sha256"]
+    assert blob_path.read_bytes() == KEY
+    assert not list((tmp_path / "tmp").iterdir())
+
+
+def test_message_without_attachments(tmp_path):
+    message = MIMEText("Only a body.").as_bytes()
+    assert extract_attachments_from_lines(iter_lines([message]), tmp_path) == []
+
+
+def test_failed_message_leaves_no_temporary_file(tmp_path):
+    def failing_lines():
+        yield from list(iter_lines([_build_message()]))[:40]
+        raise OSError("read error")
+
+    with pytest.raises(OSError):
+        extract_attachments_from_lines(failing_lines(), tmp_path)
+    assert not list((tmp_path / "tmp").glob("*.part"))
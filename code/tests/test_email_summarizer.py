@@ -0,0 +1,57 @@
+from api_methods.email_summarizer import (
+    CHARS_PER_TOKEN, StubSummaryModel, SummaryCache, build_batches, map_reduce_summarize
+)
+
+
+def _emails(count, size=400):
+    return [f"Subject: email {index}\n" + "x" * size for index in range(count)]
+
+
+def test_build_batches_fit_the_budget():
+    texts = _emails(20)
+    batches = build_batches(texts, token_budget=300)
+    assert [text for batch in batches for text in batch] == texts
+    assert all(sum(len(text) for text in batch) <= 300 * CHARS_PER_TOKEN for batch in batches)
+
+
+def test_build_batches_truncate_oversized_texts():
+    (batch,) = build_batches(["y" * 10000], token_budget=100)
+    assert len(batch[0]) <= 100 * CHARS_PER_TOKEN
+    assert batch[0].endswith("[...truncated...]\n")
+
+
+def test_no_texts():
+    assert map_reduce_summarize([], StubSummaryModel()) is None
+
+
+def test_single_batch_needs_one_request():
+    model = StubSummaryModel()
+    summary = map_reduce_summarize(_emails(3), model)
+    assert len(model.prompts) == 1
+    assert summary.startswith("Stub summary")
+
+
+def test_map_then_reduce():
+    model = StubSummaryModel()
+    texts = _emails(40)
+    summary = map_reduce_summarize(texts, model, token_budget=500, max_workers=3)
+    map_prompts = [prompt for prompt in model.prompts if "summaries of consecutive batches" not in prompt]
+    reduce_prompts = [prompt for prompt in model.prompts if "summaries of consecutive batches" in prompt]
+    assert len(map_prompts) == len(build_batches(texts, 500))
+    assert reduce_prompts
+    assert summary.startswith("Stub summary")
+    assert all(f"email {index}\n" in "".join(map_prompts) for index in range(40))
+
+
+def test_summaries_are_deterministic_and_cached(tmp_path):
+    cache = SummaryCache(tmp_path)
+    first_model = StubSummaryModel()
+    first = map_reduce_summarize(_emails(40), first_model, cache=cache, token_budget=500)
+
+    second_model = StubSummaryModel()
+    assert map_reduce_summarize(_emails(40), second_model, cache=cache, token_budget=500) == first
+    assert second_model.prompts == []
+
+    third_model = StubSummaryModel()
+    assert map_reduce_summarize(_emails(40), third_model, token_budget=500) == first
+    assert len(third_model.prompts) == len(first_model.prompts)
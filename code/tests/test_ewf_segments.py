@@ -0,0 +1,83 @@
+import struct
+
+import pytest
+
+from api_methods.evidence_session import EWF_SIGNATURES
+from api_methods.ewf_segments import (
+    MAX_SEGMENT_NUMBER, get_segment_extension, get_segment_storage_path, parse_segment_number,
+    read_segment_header, validate_segment_set
+)
+
+
+@pytest.mark.parametrize("filename, number", [
+    ("laptop.E01", 1), ("laptop.e02", 2), ("laptop.E99", 99), ("laptop.EAA", 100), ("laptop.EZZ", 775),
+    ("laptop.FAA", 776), ("laptop.ZZZ", MAX_SEGMENT_NUMBER), ("laptop.Ex01", 1), ("laptop.ExAA", 100),
+])
+def test_parse_segment_number(filename, number):
+    assert parse_segment_number(filename) == number
+
+
+@pytest.mark.parametrize("filename", ["laptop.E00", "laptop.F01", "laptop.dd", "laptop.E1", "laptop"])
+def test_parse_non_segment_names(filename):
+    assert parse_segment_number(filename) is None
+
+
+def test_segment_extensions_round_trip():
+    for number in range(1, MAX_SEGMENT_NUMBER + 1):
+        assert parse_segment_number(f"image.{get_segment_extension(number)}") == number
+    with pytest.raises(ValueError):
+        get_segment_extension(MAX_SEGMENT_NUMBER + 1)
+
+
+def _write_segment(evidence_dir, number, ewf2=False, header_number=None):
+    header_number = number if header_number is None else header_number
+    if ewf2:
+        header = EWF_SIGNATURES[1] + struct.pack("<HHI", 2, 1, header_number)
+    else:
+        header = EWF_SIGNATURES[0] + b"\x01" + struct.pack("<HH", header_number, 0)
+    get_segment_storage_path(evidence_dir, number).write_bytes(header + bytes(64))
+
+
+def test_read_segment_header(tmp_path):
+    _write_segment(tmp_path, 3)
+    _write_segment(tmp_path, 4, ewf2=True)
+    (tmp_path / "other.bin").write_bytes(b"not a segment")
+    assert read_segment_header(get_segment_storage_path(tmp_path, 3)) == ("EWF", 3)
+    assert read_segment_header(get_segment_storage_path(tmp_path, 4)) == ("EWF2", 4)
+    assert read_segment_header(tmp_path / "other.bin") == (None, None)
+
+
+def test_complete_segment_set(tmp_path):
+    for number in (1, 2, 3):
+        _write_segment(tmp_path, number)
+    assert validate_segment_set(tmp_path, expected_count=3) == {"status": "passed", "segment_count": 3}
+
+
+def test_segment_set_with_a_gap(tmp_path):
+    for number in (1, 3):
+        _write_segment(tmp_path, number)
+    result = validate_segment_set(tmp_path)
+    assert result["status"] == "failed" and "E02" in result["message"]
+
+
+def test_segment_set_missing_its_last_segment(tmp_path):
+    for number in (1, 2):
+        _write_segment(tmp_path, number)
+    result = validate_segment_set(tmp_path, expected_count=3)
+    assert result["status"] == "failed" and "E03" in result["message"]
+
+
+def test_segment_stored_under_the_wrong_number(tmp_path):
+    _write_segment(tmp_path, 1)
+    _write_segment(tmp_path, 2, header_number=5)
+    assert validate_segment_set(tmp_path)["status"] == "failed"
+
+
+def test_segment_set_mixing_formats(tmp_path):
+    _write_segment(tmp_path, 1)
+    _write_segment(tmp_path, 2, ewf2=True)
+    assert validate_segment_set(tmp_path)["message"] == "The segments mix EWF and EWF2 files."
+
+
+def test_empty_segment_set(tmp_path):
+    assert validate_segment_set(tmp_path)["status"] == "failed"
@@ -0,0 +1,92 @@
+import struct
+
+import pytest
+
+from api_methods.hive_reader import HBIN_START, HiveParseError, HiveReader, RegistryKeyNotFound, get_lh_hash
+from api_methods.sam_hive_cache import SAM_USERS_KEY
+from benchmarks.fixtures import DEFAULT_ACCOUNTS, build_sam_hive
+
+USER_KEY_NAMES = sorted([f"{rid:08X}" for rid, _, _, _ in DEFAULT_ACCOUNTS] + ["Names"])
+
+
+def _append_cell(hive, payload):
+    """Appends an allocated cell after the last hive bin and returns its hive offset."""
+    offset = len(hive) - HBIN_START
+    cell_size = (len(payload) + 4 + 7) // 8 * 8
+    hive += struct.pack("<i", -cell_size) + payload + bytes(cell_size - 4 - len(payload))
+    return offset
+
+
+def _rebuild_users_index(build_list):
+    """Returns a SAM hive whose Users key lists its subkeys through the index list build_list writes.
+
+    build_list gets the hive and the (offset, name) of every subkey and
+    returns the offset of the new list.
+    """
+    hive = bytearray(build_sam_hive())
+    users = HiveReader(bytes(hive)).open_key(SAM_USERS_KEY)
+    subkeys = [(subkey._offset, subkey.name()) for subkey in users.subkeys()]
+    list_offset = build_list(hive, subkeys)
+    struct.pack_into("<I", hive, HBIN_START + users._offset + 4 + 0x1C, list_offset)
+    return HiveReader(bytes(hive)).open_key(SAM_USERS_KEY)
+
+
+def _lh_list(hive, subkeys):
+    return _append_cell(hive, struct.pack("<2sH", b"lh", len(subkeys)) + b"".join(
+        struct.pack("<II", offset, get_lh_hash(name)) for offset, name in subkeys))
+
+
+def _li_list(hive, subkeys):
+    return _append_cell(hive, struct.pack(f"<2sH{len(subkeys)}I", b"li", len(subkeys),
+                                          *(offset for offset, _ in subkeys)))
+
+
+def _ri_list(hive, subkeys):
+    middle = len(subkeys) // 2
+    sublists = [_li_list(hive, subkeys[:middle]), _lh_list(hive, subkeys[middle:])]
+    return _append_cell(hive, struct.pack("<2sHII", b"ri", 2, *sublists))
+
+
+def test_lf_list_written_by_the_fixture():
+    users = HiveReader(build_sam_hive()).open_key(SAM_USERS_KEY)
+    assert [subkey.name() for subkey in users.subkeys()] == USER_KEY_NAMES
+    assert users.subkey("000003e9").name() == "000003E9"
+
+
+@pytest.mark.parametrize("build_list", [_lh_list, _li_list, _ri_list], ids=["lh", "li", "ri"])
+def test_index_lists(build_list):
+    users = _rebuild_users_index(build_list)
+    assert [subkey.name() for subkey in users.subkeys()] == USER_KEY_NAMES
+    for name in USER_KEY_NAMES:
+        assert users.subkey(name.lower()).name() == name
+    with pytest.raises(RegistryKeyNotFound):
+        users.subkey("000003E7")
+
+
+def test_unknown_index_list_signature():
+    users = _rebuild_users_index(lambda hive, subkeys: _append_cell(hive, struct.pack("<2sHI", b"xx", 1, 0)))
+    with pytest.raises(HiveParseError):
+        list(users.subkeys())
+
+
+def test_index_list_shorter_than_its_count():
+    users = _rebuild_users_index(lambda hive, subkeys: _append_cell(hive, struct.pack("<2sH", b"li", 100)))
+    with pytest.raises(HiveParseError):
+        list(users.subkeys())
+
+
+def test_ri_list_pointing_at_itself():
+    def self_referencing_list(hive, subkeys):
+        offset = len(hive) - HBIN_START
+        return _append_cell(hive, struct.pack("<2sHI", b"ri", 1, offset))
+
+    users = _rebuild_users_index(self_referencing_list)
+    with pytest.raises(HiveParseError):
+        list(users.subkeys())
+
+
+def test_user_values():
+    users = HiveReader(build_sam_hive()).open_key(SAM_USERS_KEY)
+    administrator = users.subkey("000001F4")
+    assert len(administrator.value("F").raw_data()) == 80
+    assert administrator.value("v").raw_data()[:4] == bytes(4)
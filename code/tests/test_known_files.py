@@ -0,0 +1,61 @@
+import hashlib
+
+from api_methods.known_files import BloomFilter, KnownHashSet, SortedDigestSet, load_hash_set
+
+
+def _digests(prefix, count, algorithm="sha1"):
+    return [hashlib.new(algorithm, f"{prefix}{index}".encode()).digest() for index in range(count)]
+
+
+def test_bloom_filter_has_no_false_negatives():
+    added = _digests("known", 5000)
+    bloom_filter = BloomFilter(len(added))
+    for digest in added:
+        bloom_filter.add(digest)
+    assert all(digest in bloom_filter for digest in added)
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom_filter = BloomFilter(5000, error_rate=0.01)
+    for digest in _digests("known", 5000):
+        bloom_filter.add(digest)
+    false_positives = sum(digest in bloom_filter for digest in _digests("unknown", 5000))
+    assert false_positives < 5000 * 0.03
+
+
+def test_sorted_digest_set():
+    digests = _digests("known", 100)
+    digest_set = SortedDigestSet(digests + digests[:10], width=20)
+    assert len(digest_set) == 100
+    assert all(digest in digest_set for digest in digests)
+    assert not any(digest in digest_set for digest in _digests("unknown", 100))
+    assert bytes(20) not in digest_set and b"\xff" * 20 not in digest_set
+
+
+def test_empty_sorted_digest_set():
+    digest_set = SortedDigestSet([], width=16)
+    assert len(digest_set) == 0
+    assert bytes(16) not in digest_set
+
+
+def test_known_hash_set_checks_every_algorithm():
+    md5 = hashlib.md5(b"notepad").hexdigest()
+    sha256 = hashlib.sha256(b"calc").hexdigest()
+    hash_set = KnownHashSet({"md5": [bytes.fromhex(md5)], "sha1": [], "sha256": [bytes.fromhex(sha256)]})
+    assert hash_set.algorithms == ("md5", "sha256")
+    assert len(hash_set) == 2
+    assert hash_set.contains({"md5": md5, "sha1": None})
+    assert hash_set.contains({"md5": hashlib.md5(b"other").hexdigest(), "sha256": sha256})
+    assert not hash_set.contains({"md5": hashlib.md5(b"other").hexdigest()})
+    assert not hash_set.contains({})
+
+
+def test_load_text_hash_set(tmp_path):
+    sha1 = hashlib.sha1(b"explorer").hexdigest()
+    md5 = hashlib.md5(b"explorer").hexdigest()
+    hash_set_path = tmp_path / "known.txt"
+    hash_set_path.write_text(f'"SHA-1","MD5","FileName"\n"{sha1.upper()}","{md5}","explorer.exe"\nnot a hash\n')
+    hash_set = load_hash_set(hash_set_path)
+    assert len(hash_set) == 2
+    assert hash_set.contains({"sha1": sha1})
+    assert hash_set.contains({"md5": md5})
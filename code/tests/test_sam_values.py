@@ -0,0 +1,86 @@
+import struct
+from datetime import timedelta
+
+import pytest
+
+from api_methods import f_value, f_value_flags, v_value
+from benchmarks.fixtures import FIXTURE_TIME, build_f_value, build_v_value
+
+
+def _f_fields(f_value_data):
+    return {field["field"]: field["value"] for field in f_value.method_get_f_value_data(None, f_value_data)}
+
+
+def _v_fields(v_value_data):
+    return {field["field"]: field["actual_data"] for field in v_value.method_get_v_value_data(None, v_value_data)}
+
+
+def test_f_value_layout_matches_the_csv():
+    assert f_value.F_VALUE_STRUCT.size == 0x44
+    assert [name for name, _, _ in f_value.F_VALUE_FIELDS][:2] == ["Revision", "Last Logon Timestamp"]
+
+
+def test_f_value_fields():
+    fields = _f_fields(build_f_value(1001, FIXTURE_TIME + timedelta(hours=1), login_count=6))
+    assert fields["Relative ID (RID)"] == 1001
+    assert fields["Login Count"] == 6
+    assert fields["Revision"] == 2
+    assert fields["Last Logon Timestamp"] == "2004-08-19 13:00:00"
+    assert fields["Account Expiration Timestamp"] == "Never"
+    assert fields["Last Incorrect Password Timestamp"] == "Never"
+
+
+def test_f_value_batch_matches_single_decodes():
+    blobs = [build_f_value(rid, None, login_count=rid % 7) for rid in (500, 501, 1000)]
+    columns = f_value.method_decode_f_values_batch(blobs)
+    for index, blob in enumerate(blobs):
+        assert {field: values[index] for field, values in columns.items()} == _f_fields(blob)
+
+
+def test_f_value_flags():
+    flags = f_value_flags.method_get_f_value_flags(None, build_f_value(501, None, 0, uac_flags=0x0202))
+    assert flags["rid"] == 501
+    assert flags["uac_flag_sum_decimal"] == 0x0202
+
+
+def test_truncated_f_value():
+    with pytest.raises(struct.error):
+        f_value.method_get_f_value_data(None, build_f_value(500, None, 0)[:0x40])
+
+
+def test_overlapping_f_value_fields():
+    rows = [
+        {"Field Name": "A", "Offset (Decimal)": "0", "Size (Bytes)": "4", "Data Type": "Integer"},
+        {"Field Name": "B", "Offset (Decimal)": "2", "Size (Bytes)": "2", "Data Type": "Integer"},
+    ]
+    with pytest.raises(ValueError):
+        f_value.compile_f_value_layout(rows)
+
+
+def test_v_value_fields():
+    fields = _v_fields(build_v_value("Wes Mantooth", "Wes Mantooth", "Channel 4", "C:\\Users\\Wes"))
+    assert fields["Username"] == "Wes Mantooth"
+    assert fields["User Comment"] == "Channel 4"
+    assert fields["Home Directory Path"] == "C:\\Users\\Wes"
+    assert fields["Last Login Timestamp"] == "2004-08-19 12:00:00"
+    assert fields["Account Expiration"] == "Never"
+
+
+def test_v_value_batch_matches_single_decodes():
+    blobs = [build_v_value(name) for name in ("Administrator", "Guest", "")]
+    columns = v_value.method_decode_v_values_batch(blobs)
+    assert columns["Username"] == ["Administrator", "Guest", ""]
+    assert {field: values[1] for field, values in columns.items()} == _v_fields(blobs[1])
+
+
+def test_v_value_pointing_past_its_data():
+    v_value_data = bytearray(build_v_value("Administrator"))
+    struct.pack_into("<I", v_value_data, 0x10, 0x1000)
+    with pytest.raises(struct.error):
+        v_value.method_get_v_value_data(None, bytes(v_value_data))
+
+
+def test_overlapping_v_value_header_fields():
+    rows = [{"Data Field": "Username", "Header Offset": "0x0C"}, {"Data Field": "Full Name", "Header Offset": "0x10"}]
+    with pytest.raises(ValueError):
+        v_value.compile_v_value_header_layout(rows)